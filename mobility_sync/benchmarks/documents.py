@@ -0,0 +1,70 @@
+import random
+
+import frappe
+
+# Prefix of every generated document, so a run can remove what it created
+MARKER = "mobility-sync-benchmark"
+
+
+def small_doc(index, rng):
+    """A ToDo of a few short fields."""
+    return frappe.get_doc({
+        "doctype": "ToDo",
+        "description": f"{MARKER} {index}: " + " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 20))),
+        "priority": rng.choice(["Low", "Medium", "High"]),
+        "status": "Open",
+    })
+
+
+def large_doc(index, rng, rows=200):
+    """A Contact with `rows` email and `rows` phone rows in its child tables."""
+    return frappe.get_doc({
+        "doctype": "Contact",
+        "first_name": f"{MARKER}-{index}-{rng.randrange(10 ** 9)}",
+        "email_ids": [
+            {"email_id": f"bench{index}-{row}@example.com", "is_primary": int(row == 0)}
+            for row in range(rows)
+        ],
+        "phone_nos": [
+            {"phone": f"+1555{index:04d}{row:04d}", "is_primary_phone": int(row == 0)}
+            for row in range(rows)
+        ],
+    })
+
+
+def touch(doc, rng):
+    """Change a generated document the way a busy user would, a field or a child row at a time."""
+    if doc.doctype == "ToDo":
+        doc.description = f"{MARKER} {doc.name}: " + " ".join(rng.choice(WORDS) for _ in range(10))
+        doc.priority = rng.choice(["Low", "Medium", "High"])
+    else:
+        row = rng.choice(doc.email_ids)
+        row.email_id = f"bench-{rng.randrange(10 ** 9)}@example.com"
+    return doc
+
+
+def generated_names(doctype):
+    field = "description" if doctype == "ToDo" else "first_name"
+    return frappe.get_all(doctype, filters={field: ("like", f"{MARKER}%")}, pluck="name")
+
+
+def delete_generated_docs():
+    """Remove every generated document and its child rows without firing doc events."""
+    for doctype, tables in (("ToDo", ()), ("Contact", ("Contact Email", "Contact Phone"))):
+        names = generated_names(doctype)
+        for start in range(0, len(names), 1000):
+            chunk = names[start:start + 1000]
+            for table in tables:
+                frappe.db.delete(table, {"parenttype": doctype, "parent": ("in", chunk)})
+            frappe.db.delete(doctype, {"name": ("in", chunk)})
+    frappe.db.commit()
+
+
+def get_rng(seed=None):
+    return random.Random(seed)
+
+
+WORDS = (
+    "order", "invoice", "delivery", "customer", "pending", "urgent", "review", "stock",
+    "warehouse", "payment", "route", "driver", "vehicle", "return", "update", "schedule",
+)
@@ -0,0 +1,151 @@
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from mobility_sync.sync.serializer import decompress, loads, supported_encodings
+
+
+class ReceiverStats:
+    """Counters of everything the fake receiver has seen, safe to update from its threads."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.requests = 0
+        self.documents = 0
+        self.bytes_received = 0
+        self.statuses = {}
+
+    def record(self, status, documents, size):
+        with self.lock:
+            self.requests += 1
+            self.documents += documents
+            self.bytes_received += size
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "documents": self.documents,
+                "bytes_received": self.bytes_received,
+                "statuses": dict(self.statuses),
+            }
+
+
+class FakeReceiver:
+    """
+    A local stand-in for another site's receive_doc / receive_docs endpoints.
+
+    Every request is answered after `latency_ms` (plus up to `jitter_ms`). A
+    request fails with 500 at `error_rate` and is throttled with 429 and
+    Retry-After: 1 at `throttle_rate` (both 0..1). Accepted documents are not
+    stored, only counted, so the receiver never becomes the bottleneck.
+    """
+
+    def __init__(self, latency_ms=0, jitter_ms=0, error_rate=0, throttle_rate=0, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.random = random.Random(seed)
+        self.stats = ReceiverStats()
+        self.server = None
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                receiver.handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    # --------------------------------------------------------
+    # Requests
+    # --------------------------------------------------------
+
+    def read_payload(self, request):
+        body = request.rfile.read(int(request.headers.get("Content-Length") or 0))
+        encoding = request.headers.get("Content-Encoding")
+        payload = loads(decompress(body, encoding) if encoding else body) if body else {}
+        return payload, len(body)
+
+    def respond(self, request, status, message=None, headers=None):
+        body = json.dumps({"message": message} if message is not None else {}).encode()
+        request.send_response(status)
+        request.send_header("Content-Type", "application/json")
+        request.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            request.send_header(key, value)
+        request.end_headers()
+        request.wfile.write(body)
+
+    def handle(self, request):
+        payload, size = self.read_payload(request)
+        docs = payload.get("docs")
+        documents = len(docs) if docs is not None else 1
+
+        delay = self.latency_ms + (self.random.uniform(0, self.jitter_ms) if self.jitter_ms else 0)
+        if delay:
+            time.sleep(delay / 1000)
+
+        roll = self.random.random()
+        if roll < self.throttle_rate:
+            self.stats.record(429, documents, size)
+            self.respond(request, 429, headers={"Retry-After": "1"})
+            return
+        if roll < self.throttle_rate + self.error_rate:
+            self.stats.record(500, documents, size)
+            self.respond(request, 500)
+            return
+
+        self.stats.record(200, documents, size)
+        if docs is None:
+            self.respond(request, 200, {
+                "status": "success",
+                "doctype": payload.get("doctype"),
+                "name": payload.get("name"),
+                "method": payload.get("doc_method"),
+                "accept_encoding": supported_encodings(),
+            })
+            return
+        self.respond(request, 200, {
+            "status": "success",
+            "results": [
+                {"doctype": doc.get("doctype"), "name": doc.get("name"), "method": doc.get("doc_method"), "status": "success"}
+                for doc in docs
+            ],
+            "accept_encoding": supported_encodings(),
+        })
@@ -0,0 +1,302 @@
+import json
+import math
+import os
+import time
+from contextlib import contextmanager
+
+import frappe
+from frappe.utils import now_datetime
+
+from mobility_sync.benchmarks import documents
+from mobility_sync.benchmarks.receiver import FakeReceiver
+from mobility_sync.sync import breaker
+from mobility_sync.sync.handlers import push_to_remote
+from mobility_sync.sync.outbox import DISPATCH_FLAG_KEY, dispatch_outbox
+from mobility_sync.sync.settings import is_doctype_enabled
+from mobility_sync.sync.throttle import RETRY_AFTER_KEY
+from mobility_sync.sync.tokens import ACCESS_TOKEN_CACHE_KEY, cache_access_token
+
+# App row added to Sync Settings for the length of a run, pointing at the fake receiver
+BENCHMARK_APP = "mobility-sync-benchmark"
+BENCHMARK_DOCTYPES = ("ToDo", "Contact")
+# Committed with the app, so every checkout compares against the same numbers
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), "baseline.json")
+# A scenario regresses when docs/sec drops, or p99 latency or queries per doc grow, by more than this
+DEFAULT_TOLERANCE = 0.2
+
+
+# --------------------------------------------------------
+# Setup
+# --------------------------------------------------------
+
+@contextmanager
+def benchmark_site(receiver_url):
+    """
+    Push the benchmark doctypes to the fake receiver only, for the length of the block.
+
+    The app row and doctype rows are added to Sync Settings and removed again
+    afterwards, together with every generated document. Refuses to run on a site
+    that does not allow tests, or where a benchmark doctype is already synced.
+    """
+    if not (frappe.conf.allow_tests or frappe.conf.developer_mode):
+        frappe.throw("Benchmarks change Sync Settings: enable allow_tests (or developer_mode) for this site first")
+    if enabled := [doctype for doctype in BENCHMARK_DOCTYPES if is_doctype_enabled(doctype)]:
+        frappe.throw(f"{', '.join(enabled)} already synced in Sync Settings; benchmark on a site where they are not")
+
+    settings = frappe.get_doc("Sync Settings")
+    settings.append("apps", {"app_name": BENCHMARK_APP, "provider_url": receiver_url})
+    for doctype in BENCHMARK_DOCTYPES:
+        settings.append("doctypes", {"sync_doctype": doctype, "enabled": 1, "apps": json.dumps([BENCHMARK_APP])})
+    # The benchmark app is not a Connected App; its token is seeded in the cache below
+    settings.flags.ignore_links = True
+    settings.save(ignore_permissions=True)
+    frappe.db.commit()
+    cache_access_token(BENCHMARK_APP, "benchmark-token", 0, now_datetime())
+
+    try:
+        yield
+    finally:
+        settings.reload()
+        settings.apps = [row for row in settings.apps if row.app_name != BENCHMARK_APP]
+        settings.doctypes = [
+            row for row in settings.doctypes
+            if not (row.sync_doctype in BENCHMARK_DOCTYPES and BENCHMARK_APP in (row.apps or ""))
+        ]
+        settings.flags.ignore_links = True
+        settings.save(ignore_permissions=True)
+        frappe.db.delete("Mobility Sync Outbox", {"document_type": ("in", BENCHMARK_DOCTYPES)})
+        frappe.db.delete("Mobility Sync Failed Queue", {"app_name": BENCHMARK_APP})
+        frappe.db.commit()
+        documents.delete_generated_docs()
+        reset_app_state()
+        frappe.cache().delete_value(ACCESS_TOKEN_CACHE_KEY.format(BENCHMARK_APP))
+        frappe.cache().delete_value(DISPATCH_FLAG_KEY)
+
+
+def reset_app_state():
+    """Close the benchmark app's circuit and forget any 429 so every scenario starts alike."""
+    breaker.reset_breaker(BENCHMARK_APP)
+    frappe.cache().delete_value(RETRY_AFTER_KEY.format(BENCHMARK_APP))
+
+
+def hold_dispatcher():
+    """
+    Keep commits from enqueuing a background dispatcher: the flag enqueue_dispatch
+    sets is taken up front, and the scenario runs dispatch_outbox itself.
+    """
+    cache = frappe.cache()
+    cache.set(cache.make_key(DISPATCH_FLAG_KEY), 1, ex=3600)
+
+
+# --------------------------------------------------------
+# Measuring
+# --------------------------------------------------------
+
+def count_db_queries():
+    """Statements sent by this connection so far."""
+    return int(frappe.db.sql("SHOW SESSION STATUS LIKE 'Questions'")[0][1])
+
+
+def get_redis_counters():
+    stats = frappe.cache().info("stats")
+    return {
+        "bytes": stats.get("total_net_input_bytes", 0) + stats.get("total_net_output_bytes", 0),
+        "commands": stats.get("total_commands_processed", 0),
+    }
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+def measure(name, scenario, receiver, **options):
+    """
+    Run a scenario and return its report. `scenario(receiver, start, **options)`
+    calls start() once its setup is done and returns (events, latencies): the
+    document events it caused and the seconds each one took to be pushed.
+
+    DB queries are the statements sent by this connection; Redis bytes and
+    commands are server totals, so keep other clients of the same Redis quiet.
+    """
+    counters = {}
+
+    def start():
+        receiver.stats.reset()
+        counters.update(queries=count_db_queries(), redis=get_redis_counters(), at=time.perf_counter())
+
+    reset_app_state()
+    start()
+    events, latencies = scenario(receiver=receiver, start=start, **options)
+
+    elapsed = time.perf_counter() - counters["at"]
+    # The closing SHOW STATUS statement itself is not counted
+    queries = count_db_queries() - counters["queries"] - 1
+    redis = get_redis_counters()
+    events = events or 1
+    return {
+        "scenario": name,
+        "events": events,
+        "seconds": round(elapsed, 3),
+        "docs_per_second": round(events / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 2) if latencies else None,
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2) if latencies else None,
+        "db_queries_per_doc": round(queries / events, 2),
+        "redis_bytes_per_event": round((redis["bytes"] - counters["redis"]["bytes"]) / events, 1),
+        "redis_commands_per_event": round((redis["commands"] - counters["redis"]["commands"]) / events, 2),
+        "receiver": receiver.stats.snapshot(),
+    }
+
+
+# --------------------------------------------------------
+# Scenarios
+# --------------------------------------------------------
+
+def _save_and_dispatch(docs, batch, touch=None, rng=None):
+    """
+    Save `docs` (inserting new ones, updating the rest with `touch`) through the
+    usual doc events `batch` at a time, dispatching the outbox after each batch.
+    Returns the seconds from each save until its batch was pushed.
+    """
+    latencies = []
+    for start in range(0, len(docs), batch):
+        hold_dispatcher()
+        saved_at = []
+        for doc in docs[start:start + batch]:
+            saved_at.append(time.perf_counter())
+            if doc.is_new():
+                doc.insert(ignore_permissions=True)
+            else:
+                touch(doc, rng).save(ignore_permissions=True)
+        frappe.db.commit()
+        dispatch_outbox()
+        done = time.perf_counter()
+        latencies.extend(done - at for at in saved_at)
+    return latencies
+
+
+def small_docs(receiver, start, count=1000, batch=100, seed=None, **options):
+    """Insert `count` small documents, as a steady stream of new records."""
+    rng = documents.get_rng(seed)
+    docs = [documents.small_doc(index, rng) for index in range(count)]
+    return count, _save_and_dispatch(docs, batch)
+
+
+def large_child_tables(receiver, start, count=50, rows=200, batch=10, seed=None, **options):
+    """Insert `count` documents carrying `rows` rows in each of two child tables."""
+    rng = documents.get_rng(seed)
+    docs = [documents.large_doc(index, rng, rows) for index in range(count)]
+    return count, _save_and_dispatch(docs, batch)
+
+
+def high_update_rate(receiver, start, count=100, updates=10, batch=100, seed=None, **options):
+    """
+    Update the same `count` documents `updates` times each, dispatching after
+    every `batch` saves, as when a few records change many times a second. The
+    outbox coalesces repeated changes, so the receiver sees fewer pushes than events.
+    """
+    rng = documents.get_rng(seed)
+    docs = [documents.small_doc(index, rng) for index in range(count)]
+    for doc in docs:
+        doc.insert(ignore_permissions=True)
+    frappe.db.commit()
+    dispatch_outbox()
+    start()
+
+    touched = [docs[index % count] for index in range(count * updates)]
+    return len(touched), _save_and_dispatch(touched, batch, documents.touch, rng)
+
+
+def direct_push(receiver, start, count=200, seed=None, **options):
+    """Push documents one at a time with push_to_remote, bypassing the outbox."""
+    rng = documents.get_rng(seed)
+    hold_dispatcher()
+    docs = [documents.small_doc(index, rng).insert(ignore_permissions=True) for index in range(count)]
+    frappe.db.commit()
+    frappe.db.delete("Mobility Sync Outbox", {"document_type": "ToDo"})
+    frappe.db.commit()
+    start()
+
+    latencies = []
+    for doc in docs:
+        started = time.perf_counter()
+        push_to_remote(doc.as_dict(), "on_update")
+        latencies.append(time.perf_counter() - started)
+    frappe.db.commit()
+    return count, latencies
+
+
+SCENARIOS = {
+    "small_docs": small_docs,
+    "large_child_tables": large_child_tables,
+    "high_update_rate": high_update_rate,
+    "direct_push": direct_push,
+}
+
+
+# --------------------------------------------------------
+# Baselines
+# --------------------------------------------------------
+
+def get_baseline_path(path=None):
+    return path or BASELINE_FILE
+
+
+def load_baseline(path=None):
+    path = get_baseline_path(path)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(reports, path=None):
+    """Store the reports as the baseline later runs are compared with, keeping other scenarios' entries."""
+    path = get_baseline_path(path)
+    baseline = load_baseline(path)
+    baseline.update({report["scenario"]: report for report in reports})
+    with open(path, "w") as f:
+        json.dump(baseline, f, indent=1, sort_keys=True)
+    return path
+
+
+def compare_with_baseline(report, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Return the regressions of a report against its scenario's baseline, as messages."""
+    previous = baseline.get(report["scenario"])
+    if not previous:
+        return []
+
+    regressions = []
+    if report["docs_per_second"] < previous["docs_per_second"] * (1 - tolerance):
+        regressions.append(f"docs/sec {previous['docs_per_second']} -> {report['docs_per_second']}")
+    if report["p99_ms"] and previous.get("p99_ms") and report["p99_ms"] > previous["p99_ms"] * (1 + tolerance):
+        regressions.append(f"p99 {previous['p99_ms']}ms -> {report['p99_ms']}ms")
+    if report["db_queries_per_doc"] > previous["db_queries_per_doc"] * (1 + tolerance):
+        regressions.append(f"queries/doc {previous['db_queries_per_doc']} -> {report['db_queries_per_doc']}")
+    return regressions
+
+
+# --------------------------------------------------------
+# Run
+# --------------------------------------------------------
+
+def run_benchmarks(scenarios=None, latency_ms=0, jitter_ms=0, error_rate=0, throttle_rate=0, seed=42, **options):
+    """
+    Run the scenarios (all by default) against a fresh fake receiver and return
+    their reports. `options` (count, batch, rows, updates) override the
+    scenarios' defaults.
+    """
+    unknown = set(scenarios or ()) - set(SCENARIOS)
+    if unknown:
+        frappe.throw(f"Unknown scenarios: {', '.join(sorted(unknown))}. Choose from {', '.join(SCENARIOS)}")
+
+    options = {key: value for key, value in options.items() if value is not None}
+    reports = []
+    with FakeReceiver(latency_ms, jitter_ms, error_rate, throttle_rate, seed) as receiver:
+        with benchmark_site(receiver.url):
+            for name in scenarios or SCENARIOS:
+                reports.append(measure(name, SCENARIOS[name], receiver, seed=seed, **options))
+                documents.delete_generated_docs()
+    return reports
@@ -0,0 +1,105 @@
+import click
+from frappe.commands import get_site, pass_context
+
+
+@click.command("mobility-sync-backfill")
+@click.argument("doctype")
+@click.argument("app_name")
+@click.option("--batch-size", type=int, help="Documents per request (default: Sync Settings Push Batch Size)")
+@click.option("--workers", type=int, help="Requests in flight at once (default: 2)")
+@click.option("--restart", is_flag=True, default=False, help="Start over instead of resuming from the checkpoint")
+@click.option("--background", is_flag=True, default=False, help="Enqueue on the sync queue instead of running here")
+@pass_context
+def backfill(context, doctype, app_name, batch_size=None, workers=None, restart=False, background=False):
+    """Send every existing DOCTYPE document to APP_NAME, resuming where the last run stopped."""
+    import frappe
+
+    from mobility_sync.sync.backfill import enqueue_backfill, get_backfill, run_backfill
+
+    site = get_site(context)
+    frappe.init(site=site)
+    frappe.connect()
+    try:
+        frappe.set_user("Administrator")
+        checkpoint = get_backfill(doctype, app_name, batch_size, workers, restart)
+        if background:
+            enqueue_backfill(checkpoint.name)
+            click.echo(f"Enqueued backfill {checkpoint.name}")
+            return
+
+        def progress(checkpoint):
+            click.echo(
+                f"{checkpoint.status}: {checkpoint.sent + checkpoint.failed}/{checkpoint.total} "
+                f"({checkpoint.failed} failed, {checkpoint.docs_per_second} docs/s)"
+            )
+
+        checkpoint = run_backfill(checkpoint.name, progress=progress)
+        if checkpoint.status == "Queued":
+            click.echo(f"Backfill {checkpoint.name} is queued and continues in the background")
+    finally:
+        frappe.destroy()
+
+
+@click.command("mobility-sync-benchmark")
+@click.option("--scenario", "scenarios", multiple=True, help="Scenario to run (repeatable; default: all)")
+@click.option("--count", type=int, help="Documents per scenario (default: per scenario)")
+@click.option("--batch", type=int, help="Saves between outbox dispatches")
+@click.option("--rows", type=int, help="Child rows per table in large_child_tables")
+@click.option("--updates", type=int, help="Updates per document in high_update_rate")
+@click.option("--latency-ms", type=float, default=0, help="Receiver delay per request")
+@click.option("--jitter-ms", type=float, default=0, help="Random extra receiver delay, up to this")
+@click.option("--error-rate", type=float, default=0, help="Share of requests answered with 500 (0..1)")
+@click.option("--throttle-rate", type=float, default=0, help="Share of requests answered with 429 (0..1)")
+@click.option("--seed", type=int, default=42, help="Seed of the document generator and the receiver")
+@click.option("--baseline", help="Baseline file (default: mobility_sync/benchmarks/baseline.json in the app)")
+@click.option("--save-baseline", is_flag=True, default=False, help="Store these results as the new baseline")
+@click.option("--tolerance", type=float, default=0.2, help="Allowed slowdown against the baseline (0.2 = 20%)")
+@click.option("--json", "as_json", is_flag=True, default=False, help="Print the reports as JSON")
+@pass_context
+def benchmark(context, scenarios=(), baseline=None, save_baseline=False, tolerance=0.2, as_json=False, **options):
+    """
+    Measure sync throughput against a local fake receiver and compare with the baseline.
+
+    Runs on a site with allow_tests set; exits with status 1 if a scenario regressed.
+    """
+    import json
+
+    import frappe
+
+    from mobility_sync.benchmarks.runner import compare_with_baseline, load_baseline, run_benchmarks
+    from mobility_sync.benchmarks.runner import save_baseline as store_baseline
+
+    site = get_site(context)
+    frappe.init(site=site)
+    frappe.connect()
+    try:
+        frappe.set_user("Administrator")
+        reports = run_benchmarks(scenarios, **options)
+        previous = load_baseline(baseline)
+
+        regressed = False
+        for report in reports:
+            regressions = compare_with_baseline(report, previous, tolerance)
+            regressed = regressed or bool(regressions)
+            report["regressions"] = regressions
+            if as_json:
+                continue
+            click.echo(
+                f"{report['scenario']}: {report['docs_per_second']} docs/s, "
+                f"p50 {report['p50_ms']}ms, p99 {report['p99_ms']}ms, "
+                f"{report['db_queries_per_doc']} queries/doc, {report['redis_bytes_per_event']} Redis bytes/event"
+            )
+            for regression in regressions:
+                click.secho(f"  regression: {regression}", fg="red")
+
+        if as_json:
+            click.echo(json.dumps(reports, indent=1, default=str))
+        if save_baseline:
+            click.echo(f"Baseline saved to {store_baseline(reports, baseline)}")
+        elif regressed:
+            raise SystemExit(1)
+    finally:
+        frappe.destroy()
+
+
+commands = [backfill, benchmark]
@@ -142,6 +142,14 @@ doc_events = {
         "after_insert": "mobility_sync.sync.handlers.handle_doc_event",
         "on_update": "mobility_sync.sync.handlers.handle_doc_event",
         "on_trash":   "mobility_sync.sync.handlers.handle_doc_event",
+    },
+    "OAuth Bearer Token": {
+        "on_update": "mobility_sync.sync.auth.clear_token_cache",
+        "on_trash": "mobility_sync.sync.auth.clear_token_cache",
+    },
+    "Token Cache": {
+        "on_update": "mobility_sync.sync.tokens.clear_access_token_cache",
+        "on_trash": "mobility_sync.sync.tokens.clear_access_token_cache",
     }
 }
 
@@ -150,10 +158,21 @@ doc_events = {
 
 scheduler_events = {
     "cron": {
+        "* * * * *": [
+            "mobility_sync.sync.handlers.handle_failed_queues",
+            "mobility_sync.sync.feed.schedule_pulls",
+            "mobility_sync.sync.backfill.schedule_backfills"
+        ],
         "*/5 * * * *": [
-            "mobility_sync.sync.handlers.handle_failed_queues"
+            "mobility_sync.sync.outbox.schedule_dispatch"
         ]
-    }
+    },
+    "hourly_long": [
+        "mobility_sync.sync.retention.apply_retention"
+    ],
+    "daily_long": [
+        "mobility_sync.sync.reconcile.schedule_reconciliation"
+    ]
 # 	"all": [
 # 		"mobility_sync.tasks.all"
 # 	],
@@ -179,9 +198,10 @@ scheduler_events = {
 # Overriding Methods
 # ------------------------------
 #
-# override_whitelisted_methods = {
-# 	"frappe.desk.doctype.event.event.get_events": "mobility_sync.event.get_events"
-# }
+override_whitelisted_methods = {
+	# Drops revoked bearer tokens from the token cache
+	"frappe.integrations.oauth2.revoke_token": "mobility_sync.sync.auth.revoke_token"
+}
 #
 # each overriding function accepts a `data` argument;
 # generated from the base implementation of the doctype dashboard,
@@ -202,12 +222,12 @@ scheduler_events = {
 # Request Events
 # ----------------
 # before_request = ["mobility_sync.utils.before_request"]
-# after_request = ["mobility_sync.utils.after_request"]
+after_request = ["mobility_sync.sync.metrics.flush"]
 
 # Job Events
 # ----------
 # before_job = ["mobility_sync.utils.before_job"]
-# after_job = ["mobility_sync.utils.after_job"]
+after_job = ["mobility_sync.sync.metrics.flush"]
 
 # User Data Protection
 # --------------------
@@ -0,0 +1,18 @@
+# Copyright (c) 2026, Ahmed Zaytoon and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+
+class MobilitySyncAppliedVersion(Document):
+	pass
+
+
+def on_doctype_update():
+	# One row per received document: the last version applied to it
+	frappe.db.add_unique(
+		"Mobility Sync Applied Version",
+		["document_type", "document_name"],
+		constraint_name="unique_applied_version_document",
+	)
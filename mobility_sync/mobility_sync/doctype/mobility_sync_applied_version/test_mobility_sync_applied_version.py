@@ -0,0 +1,82 @@
+# Copyright (c) 2026, Ahmed Zaytoon and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from mobility_sync.sync.api import receive_change
+from mobility_sync.sync.versions import (
+	DUPLICATE,
+	STALE,
+	check_version,
+	get_applied_versions,
+	record_applied_version,
+)
+
+KEY = ("ToDo", "applied-version-test")
+VERSION = "2026-03-01 10:00:00.000000"
+
+
+class TestMobilitySyncAppliedVersion(FrappeTestCase):
+	def tearDown(self):
+		frappe.db.rollback()
+
+	def get_applied(self, version=VERSION, change_id="change-1"):
+		record_applied_version(*KEY, version, change_id)
+		return get_applied_versions([KEY])[KEY]
+
+	def test_same_change_again_is_a_duplicate(self):
+		applied = self.get_applied()
+		self.assertEqual(check_version(applied, VERSION, "change-1"), DUPLICATE)
+
+	def test_older_change_is_stale(self):
+		applied = self.get_applied()
+		self.assertEqual(check_version(applied, "2026-03-01 09:59:59.999999", "change-2"), STALE)
+
+	def test_newer_or_concurrent_change_is_applied(self):
+		applied = self.get_applied()
+		self.assertIsNone(check_version(applied, "2026-03-01 10:00:01", "change-2"))
+		# Same timestamp, different change: both must be applied
+		self.assertIsNone(check_version(applied, VERSION, "change-2"))
+
+	def test_unversioned_changes_and_new_documents_are_applied(self):
+		applied = self.get_applied()
+		self.assertIsNone(check_version(applied, None, "change-1"))
+		self.assertIsNone(check_version(None, VERSION, "change-1"))
+
+	def test_recording_a_version_replaces_the_previous_one(self):
+		self.get_applied()
+		applied = self.get_applied("2026-03-02 08:00:00", "change-2")
+
+		self.assertEqual(applied.change_id, "change-2")
+		self.assertEqual(frappe.db.count("Mobility Sync Applied Version", {"document_name": KEY[1]}), 1)
+
+	def test_stale_or_duplicate_change_is_skipped_without_loading_the_document(self):
+		applied = self.get_applied()
+		with patch("mobility_sync.sync.api.apply_doc") as apply_doc:
+			self.assertEqual(
+				receive_change(*KEY, "on_update", {}, version=VERSION, change_id="change-1", applied=applied),
+				"skipped",
+			)
+			self.assertEqual(
+				receive_change(
+					*KEY, "on_update", {}, version="2026-02-01", change_id="change-0", applied=applied
+				),
+				"skipped",
+			)
+			# An old delta may still carry newer field values: the sender resends it in full
+			self.assertEqual(
+				receive_change(
+					*KEY,
+					"on_update",
+					{},
+					delta={"fields": []},
+					version="2026-02-01",
+					change_id="change-0",
+					applied=applied,
+				),
+				"stale",
+			)
+		apply_doc.assert_not_called()
@@ -0,0 +1,172 @@
+# Copyright (c) 2026, Ahmed Zaytoon and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+import requests
+from frappe.tests.utils import FrappeTestCase
+
+from mobility_sync.sync import backfill
+
+APP = "mobility-sync-test-app"
+
+
+def response(results):
+	resp = requests.Response()
+	resp.status_code = 200
+	resp._content = frappe.as_json({"message": {"results": results}}).encode()
+	return resp
+
+
+def succeeded(batch):
+	return response([{"status": "success"} for _envelope in batch])
+
+
+class TestMobilitySyncBackfill(FrappeTestCase):
+	def setUp(self):
+		self.envelopes = [{"doctype": "ToDo", "name": f"doc-{index}"} for index in range(6)]
+		for target, value in (
+			("get_oauth_tokens", "token"),
+			("get_target_url", "https://remote.example.com"),
+			("finish_send", False),
+		):
+			patcher = patch(f"mobility_sync.sync.backfill.{target}", return_value=value)
+			setattr(self, target, patcher.start())
+			self.addCleanup(patcher.stop)
+
+		patcher = patch(
+			"mobility_sync.sync.backfill.build_request", side_effect=lambda app, token, payload: payload
+		)
+		patcher.start()
+		self.addCleanup(patcher.stop)
+
+	def send(self, can_send, post_many):
+		with (
+			patch("mobility_sync.sync.backfill.can_send", side_effect=can_send),
+			patch("mobility_sync.sync.backfill.release_send") as release_send,
+			patch("mobility_sync.sync.sessions.post_many", side_effect=post_many) as post,
+		):
+			outcomes = backfill.send_page(APP, self.envelopes, batch_size=2, workers=3)
+		return outcomes, post, release_send
+
+	def test_closed_circuit_sends_a_full_wave(self):
+		outcomes, post, release_send = self.send(
+			[True] * 3, lambda calls, workers: [succeeded(call[2]["docs"]) for call in calls]
+		)
+
+		post.assert_called_once()
+		self.assertEqual(len(post.call_args.args[0]), 3)
+		self.assertEqual(outcomes, [(envelope, True) for envelope in self.envelopes])
+		self.assertEqual(self.finish_send.call_count, 3)
+		release_send.assert_not_called()
+
+	def test_half_open_circuit_sends_one_probe_at_a_time(self):
+		# The circuit only admits one request until the probe has answered
+		outcomes, post, _release_send = self.send(
+			[True, False, True, False, True],
+			lambda calls, workers: [succeeded(call[2]["docs"]) for call in calls],
+		)
+
+		self.assertEqual([len(call.args[0]) for call in post.call_args_list], [1, 1, 1])
+		self.assertEqual(len(outcomes), 6)
+
+	def test_slots_are_given_back_when_nothing_is_sent(self):
+		def post_many(calls, workers):
+			raise RuntimeError("session setup failed")
+
+		with (
+			patch("mobility_sync.sync.backfill.can_send", return_value=True),
+			patch("mobility_sync.sync.backfill.release_send") as release_send,
+			patch("mobility_sync.sync.sessions.post_many", side_effect=post_many),
+			self.assertRaises(RuntimeError),
+		):
+			backfill.send_page(APP, self.envelopes, batch_size=2, workers=3)
+
+		self.assertEqual(release_send.call_count, 3)
+		self.finish_send.assert_not_called()
+
+	def test_documents_without_a_result_count_as_failed(self):
+		outcomes, _post, _release_send = self.send(
+			[True] * 3, lambda calls, workers: [response([{"status": "success"}]) for _call in calls]
+		)
+
+		self.assertEqual([success for _envelope, success in outcomes], [True, False] * 3)
+
+	def test_throttled_app_stops_the_page_without_waiting(self):
+		# The first wave goes out, then the app answers 429 or its circuit opens
+		with patch("time.sleep") as sleep:
+			outcomes, post, _release_send = self.send(
+				[True, True, False], lambda calls, workers: [succeeded(call[2]["docs"]) for call in calls]
+			)
+
+		sleep.assert_not_called()
+		post.assert_called_once()
+		self.assertEqual(outcomes, [(envelope, True) for envelope in self.envelopes[:4]])
+
+
+class TestBackfillRun(FrappeTestCase):
+	def tearDown(self):
+		frappe.db.rollback()
+
+	def test_throttled_run_keeps_its_place_and_waits_for_the_scheduler(self):
+		checkpoint = frappe.get_doc(
+			{
+				"doctype": "Mobility Sync Backfill",
+				"document_type": "ToDo",
+				"app_name": APP,
+				"batch_size": 2,
+				"workers": 1,
+			}
+		).insert(ignore_permissions=True)
+		rows = [
+			frappe._dict(name=f"doc-{index}", modified=f"2026-01-01 00:00:0{index}") for index in range(4)
+		]
+
+		with (
+			patch("mobility_sync.sync.backfill.get_next_page", side_effect=[rows, []]),
+			patch(
+				"mobility_sync.sync.backfill.build_backfill_envelope",
+				side_effect=lambda doctype, name: {"doctype": doctype, "name": name},
+			),
+			# Only the first request went out before the app started throttling
+			patch(
+				"mobility_sync.sync.backfill.send_page",
+				side_effect=lambda app_name, envelopes, batch_size, workers: [
+					(envelope, True) for envelope in envelopes[:2]
+				],
+			),
+			patch("mobility_sync.sync.backfill.record_results"),
+			patch("mobility_sync.sync.backfill.enqueue_backfill") as enqueue_backfill,
+			patch.object(frappe.db, "commit"),
+		):
+			backfill.run_backfill(checkpoint.name)
+
+		checkpoint.reload()
+		self.assertEqual((checkpoint.status, checkpoint.last_name, checkpoint.sent), ("Queued", "doc-1", 2))
+		# Resumed by schedule_backfills once the app accepts pushes, not right away
+		enqueue_backfill.assert_not_called()
+
+	def test_scheduler_resumes_only_backfills_of_available_apps(self):
+		available, throttled = (
+			frappe.get_doc(
+				{"doctype": "Mobility Sync Backfill", "document_type": "ToDo", "app_name": app_name}
+			)
+			.insert(ignore_permissions=True)
+			.name
+			for app_name in (APP, "mobility-sync-throttled-app")
+		)
+
+		with (
+			patch("mobility_sync.sync.backfill.breaker.is_open", return_value=False),
+			patch(
+				"mobility_sync.sync.backfill.get_retry_after",
+				side_effect=lambda app_name: 30 if app_name == "mobility-sync-throttled-app" else 0,
+			),
+			patch("mobility_sync.sync.backfill.enqueue_sync_job") as enqueue_sync_job,
+		):
+			backfill.schedule_backfills()
+
+		names = [call.kwargs["backfill_name"] for call in enqueue_sync_job.call_args_list]
+		self.assertIn(available, names)
+		self.assertNotIn(throttled, names)
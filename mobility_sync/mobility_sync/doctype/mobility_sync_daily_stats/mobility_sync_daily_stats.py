@@ -0,0 +1,18 @@
+# Copyright (c) 2026, Ahmed Zaytoon and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+
+class MobilitySyncDailyStats(Document):
+	pass
+
+
+def on_doctype_update():
+	# One counter row per day, document type and app; the retention job upserts into it
+	frappe.db.add_unique(
+		"Mobility Sync Daily Stats",
+		["date", "document_type", "app_name"],
+		constraint_name="unique_daily_stats",
+	)
@@ -0,0 +1,13 @@
+# Copyright (c) 2026, Ahmed Zaytoon and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+
+class MobilitySyncFailedArchive(Document):
+	pass
+
+
+def on_doctype_update():
+	frappe.db.add_index("Mobility Sync Failed Archive", ["archived_on"])
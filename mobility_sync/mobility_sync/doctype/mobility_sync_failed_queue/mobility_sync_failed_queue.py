@@ -1,9 +1,22 @@
 # Copyright (c) 2025, Ahmed Zaytoon and contributors
 # For license information, please see license.txt
 
-# import frappe
+import frappe
 from frappe.model.document import Document
 
 
 class MobilitySyncFailedQueue(Document):
 	pass
+
+
+def on_doctype_update():
+	# One row per document, app and method; failures are upserted into it
+	frappe.db.add_unique(
+		"Mobility Sync Failed Queue",
+		["document_type", "document_name", "app_name", "doc_method"],
+		constraint_name="unique_failed_queue_document",
+	)
+	# Retry drainer: due rows of an app in creation order
+	frappe.db.add_index("Mobility Sync Failed Queue", ["app_name", "sync_tried", "creation"])
+	# Retention job: closed rows by age
+	frappe.db.add_index("Mobility Sync Failed Queue", ["sync_tried", "modified"])
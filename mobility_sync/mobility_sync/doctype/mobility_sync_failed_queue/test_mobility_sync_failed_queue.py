@@ -1,9 +1,193 @@
 # Copyright (c) 2025, Ahmed Zaytoon and Contributors
 # See license.txt
 
-# import frappe
+from unittest.mock import patch
+
+import frappe
 from frappe.tests.utils import FrappeTestCase
+from frappe.utils import add_to_date, now_datetime
+
+from mobility_sync.sync.failed_queue import PENDING_SET_KEY, get_origins, record_failures, record_successes
+from mobility_sync.sync.handlers import collect_due_documents, retry_batch
+
+APP = "mobility-sync-test-app"
+KEY = ("ToDo", "failed-queue-test", "on_update")
 
 
 class TestMobilitySyncFailedQueue(FrappeTestCase):
-	pass
+	def tearDown(self):
+		frappe.db.rollback()
+		frappe.cache().delete_value(PENDING_SET_KEY.format(APP))
+
+	def retry_settings(self, max_attempts):
+		settings = frappe._dict(retry_max_attempts=max_attempts, retry_base_delay=60, retry_max_delay=3600)
+		return patch("mobility_sync.sync.failed_queue.get_sync_settings", return_value=settings)
+
+	def get_rows(self):
+		return frappe.get_all(
+			"Mobility Sync Failed Queue",
+			filters={"app_name": APP, "document_name": KEY[1]},
+			fields=["attempts", "sync_tried", "retry_success", "next_attempt_at"],
+		)
+
+	def fail(self, times=1, count_attempt=True):
+		for _attempt in range(times):
+			record_failures(APP, [KEY], count_attempt=count_attempt)
+
+	def test_failures_upsert_a_single_row(self):
+		with self.retry_settings(10):
+			self.fail(3)
+
+		rows = self.get_rows()
+		self.assertEqual(len(rows), 1)
+		self.assertEqual((rows[0].attempts, rows[0].sync_tried), (3, 0))
+		self.assertGreater(rows[0].next_attempt_at, now_datetime())
+
+	def test_row_gives_up_after_exactly_max_attempts(self):
+		with self.retry_settings(3):
+			self.fail(2)
+			self.assertEqual(self.get_rows()[0].sync_tried, 0)
+
+			self.fail()
+		row = self.get_rows()[0]
+		self.assertEqual((row.attempts, row.sync_tried, row.retry_success), (3, 1, 0))
+
+	def test_single_attempt_gives_up_on_first_failure(self):
+		with self.retry_settings(1):
+			self.fail()
+		self.assertEqual(self.get_rows()[0].sync_tried, 1)
+
+	def test_zero_max_attempts_retries_forever(self):
+		with self.retry_settings(0):
+			self.fail(20)
+		row = self.get_rows()[0]
+		self.assertEqual((row.attempts, row.sync_tried), (20, 0))
+
+	def test_unsent_pushes_do_not_use_up_attempts(self):
+		with self.retry_settings(1):
+			self.fail(3, count_attempt=False)
+		row = self.get_rows()[0]
+		self.assertEqual((row.attempts, row.sync_tried), (0, 0))
+
+	def test_closed_row_is_reopened_by_a_new_failure(self):
+		with self.retry_settings(2):
+			self.fail(2)
+			self.fail()
+		row = self.get_rows()[0]
+		self.assertEqual((row.attempts, row.sync_tried), (1, 0))
+
+	def test_success_closes_the_pending_row(self):
+		with self.retry_settings(10):
+			self.fail()
+		self.assertTrue(record_successes(APP, [KEY]))
+
+		row = self.get_rows()[0]
+		self.assertEqual((row.sync_tried, row.retry_success), (1, 1))
+		# Nothing pending any more: no database work at all
+		self.assertFalse(record_successes(APP, [KEY]))
+
+	def add_row(self, name, method, minutes_ago, **values):
+		"""Queue a pending row created `minutes_ago`, so rows are drained in a known order."""
+		row = frappe.get_doc(
+			{
+				"doctype": "Mobility Sync Failed Queue",
+				"document_type": "ToDo",
+				"document_name": name,
+				"app_name": APP,
+				"doc_method": method,
+				**values,
+			}
+		).insert(ignore_permissions=True)
+		frappe.db.sql(
+			"UPDATE `tabMobility Sync Failed Queue` SET creation = %s WHERE name = %s",
+			(add_to_date(now_datetime(), minutes=-minutes_ago), row.name),
+		)
+		return row.name
+
+	def test_drainer_keeps_one_row_per_document(self):
+		insert = self.add_row("doc-a", "after_insert", 30)
+		update = self.add_row("doc-a", "on_update", 20)
+		other = self.add_row("doc-b", "on_update", 10)
+
+		documents, superseded = collect_due_documents(APP, limit=10, page_size=1)
+
+		# A pending insert absorbs later updates
+		self.assertEqual(
+			documents,
+			{("ToDo", "doc-a"): ("after_insert", insert), ("ToDo", "doc-b"): ("on_update", other)},
+		)
+		self.assertEqual(superseded, [update])
+
+	def test_pending_backfill_absorbs_later_updates(self):
+		backfill = self.add_row("doc-a", "backfill", 30)
+		update = self.add_row("doc-a", "on_update", 20)
+
+		documents, superseded = collect_due_documents(APP, limit=10)
+
+		# An update of a document the app may not have yet would be a no-op there
+		self.assertEqual(documents, {("ToDo", "doc-a"): ("backfill", backfill)})
+		self.assertEqual(superseded, [update])
+
+	def test_drainer_lets_a_deletion_replace_earlier_rows(self):
+		update = self.add_row("doc-a", "on_update", 20)
+		trash = self.add_row("doc-a", "on_trash", 10)
+
+		documents, superseded = collect_due_documents(APP, limit=10)
+
+		self.assertEqual(documents, {("ToDo", "doc-a"): ("on_trash", trash)})
+		self.assertEqual(superseded, [update])
+
+	def test_drainer_caps_documents_per_tick(self):
+		for index in range(5):
+			self.add_row(f"doc-{index}", "on_update", 50 - index)
+
+		documents, _superseded = collect_due_documents(APP, limit=3, page_size=2)
+
+		self.assertEqual(list(documents), [("ToDo", "doc-0"), ("ToDo", "doc-1"), ("ToDo", "doc-2")])
+
+	def test_drainer_skips_rows_not_due_or_closed(self):
+		self.add_row("later", "on_update", 20, next_attempt_at=add_to_date(now_datetime(), hours=1))
+		self.add_row("closed", "on_update", 10, sync_tried=1)
+		due = self.add_row("due", "on_update", 5, next_attempt_at=add_to_date(now_datetime(), minutes=-1))
+
+		documents, superseded = collect_due_documents(APP, limit=10)
+
+		self.assertEqual(documents, {("ToDo", "due"): ("on_update", due)})
+		self.assertEqual(superseded, [])
+
+	def test_retry_resends_the_same_change_along_its_path(self):
+		todo = frappe.get_doc({"doctype": "ToDo", "description": "failed queue retry"}).insert()
+		key = ("ToDo", todo.name, "on_update")
+		forwarded = {
+			"doctype": "ToDo",
+			"name": todo.name,
+			"change_id": "change-1",
+			"sync_path": ["site-b.example.com"],
+		}
+		with self.retry_settings(10):
+			record_failures(APP, [key], origins=get_origins([forwarded]))
+
+		with (
+			patch("mobility_sync.sync.handlers.push_batches") as push_batches,
+			patch.object(frappe.db, "commit"),
+		):
+			retry_batch(APP, [list(key)])
+
+		envelope = push_batches.call_args.args[0][APP][0]
+		# Deduplicated by the receiver and still never sent back to site-b
+		self.assertEqual((envelope["change_id"], envelope["sync_path"]), ("change-1", ["site-b.example.com"]))
+
+	def test_retry_of_a_local_change_starts_from_this_site(self):
+		todo = frappe.get_doc({"doctype": "ToDo", "description": "failed queue retry"}).insert()
+		key = ("ToDo", todo.name, "on_update")
+		with self.retry_settings(10):
+			record_failures(APP, [key])
+
+		with (
+			patch("mobility_sync.sync.handlers.push_batches") as push_batches,
+			patch("mobility_sync.sync.outbox.get_site_origin", return_value="site-a.example.com"),
+			patch.object(frappe.db, "commit"),
+		):
+			retry_batch(APP, [list(key)])
+
+		self.assertEqual(push_batches.call_args.args[0][APP][0]["sync_path"], ["site-a.example.com"])
@@ -0,0 +1,18 @@
+# Copyright (c) 2026, Ahmed Zaytoon and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+
+class MobilitySyncOutbox(Document):
+	pass
+
+
+def on_doctype_update():
+	# One pending row per document; repeated events are coalesced into it
+	frappe.db.add_unique(
+		"Mobility Sync Outbox",
+		["document_type", "document_name"],
+		constraint_name="unique_outbox_document",
+	)
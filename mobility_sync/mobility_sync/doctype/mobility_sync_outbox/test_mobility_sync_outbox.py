@@ -0,0 +1,162 @@
+# Copyright (c) 2026, Ahmed Zaytoon and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from mobility_sync.sync.outbox import (
+	DISPATCH_LOCK_KEY,
+	dispatch_outbox,
+	get_changes,
+	merge_changes,
+	record_change,
+)
+
+APP = "mobility-sync-test-app"
+
+
+class TestMobilitySyncOutbox(FrappeTestCase):
+	def tearDown(self):
+		frappe.db.rollback()
+
+	def get_contact_being_saved(self):
+		"""A Contact with two email rows, loaded the way on_update sees it (with its state before save)."""
+		contact = frappe.get_doc(
+			{
+				"doctype": "Contact",
+				"first_name": "Outbox Delta",
+				"email_ids": [{"email_id": "one@example.com"}, {"email_id": "two@example.com"}],
+			}
+		).insert(ignore_permissions=True)
+		doc = frappe.get_doc("Contact", contact.name)
+		doc._doc_before_save = frappe.get_doc("Contact", contact.name)
+		return doc
+
+	def test_changes_list_changed_fields_and_rows(self):
+		doc = self.get_contact_being_saved()
+		doc.last_name = "Changed"
+		doc.email_ids[0].email_id = "first@example.com"
+		changed_row = doc.email_ids[0].name
+		removed_row = doc.email_ids[1].name
+		doc.remove(doc.email_ids[1])
+		doc.append("phone_nos", {"phone": "+15550100"}).name = "new-phone-row"
+
+		self.assertEqual(
+			get_changes(doc),
+			{
+				"fields": ["last_name"],
+				"tables": {
+					"email_ids": {"changed": [changed_row], "removed": [removed_row]},
+					"phone_nos": {"changed": ["new-phone-row"], "removed": []},
+				},
+			},
+		)
+
+	def test_unchanged_document_has_an_empty_change_set(self):
+		doc = self.get_contact_being_saved()
+		self.assertEqual(get_changes(doc), {"fields": [], "tables": {}})
+
+	def test_unknown_base_version_sends_the_full_document(self):
+		doc = self.get_contact_being_saved()
+		doc._doc_before_save = None
+		self.assertIsNone(get_changes(doc))
+
+	def test_merge_unions_fields_and_rows(self):
+		pending = {
+			"fields": ["last_name"],
+			"tables": {"email_ids": {"changed": ["a", "b"], "removed": ["c"]}},
+		}
+		changes = {
+			"fields": ["first_name"],
+			"tables": {
+				"email_ids": {"changed": ["c", "d"], "removed": ["b"]},
+				"phone_nos": {"changed": ["p"], "removed": []},
+			},
+		}
+
+		self.assertEqual(
+			merge_changes(pending, changes),
+			{
+				"fields": ["first_name", "last_name"],
+				"tables": {
+					# A row removed later is gone; one changed after its removal is back
+					"email_ids": {"changed": ["a", "c", "d"], "removed": ["b"]},
+					"phone_nos": {"changed": ["p"], "removed": []},
+				},
+			},
+		)
+
+	def test_full_document_absorbs_any_delta(self):
+		changes = {"fields": ["last_name"], "tables": {}}
+		self.assertIsNone(merge_changes(None, changes))
+		self.assertIsNone(merge_changes(changes, None))
+
+
+class TestOutboxDispatch(FrappeTestCase):
+	def setUp(self):
+		self.todo = frappe.get_doc({"doctype": "ToDo", "description": "outbox dispatch"}).insert(
+			ignore_permissions=True
+		)
+		frappe.db.delete("Mobility Sync Outbox", {"document_type": "ToDo", "document_name": self.todo.name})
+		for target, value in (
+			("mobility_sync.sync.outbox.get_enabled_apps", [APP]),
+			("mobility_sync.sync.outbox.enqueue_dispatch", None),
+		):
+			patcher = patch(target, return_value=value)
+			patcher.start()
+			self.addCleanup(patcher.stop)
+		# dispatch_outbox commits after every page; keep the test's transaction
+		patcher = patch.object(frappe.db, "commit")
+		patcher.start()
+		self.addCleanup(patcher.stop)
+
+	def tearDown(self):
+		frappe.cache().delete_value(DISPATCH_LOCK_KEY)
+		frappe.db.rollback()
+
+	def get_rows(self):
+		return frappe.get_all(
+			"Mobility Sync Outbox",
+			filters={"document_type": "ToDo", "document_name": self.todo.name},
+			pluck="doc_method",
+		)
+
+	def test_repeated_events_share_one_row(self):
+		record_change(self.todo, "after_insert")
+		record_change(self.todo, "on_update")
+		# The pending insert absorbs the update
+		self.assertEqual(self.get_rows(), ["after_insert"])
+
+		record_change(self.todo, "on_trash")
+		self.assertEqual(self.get_rows(), ["on_trash"])
+
+	def test_row_changed_while_being_sent_stays_pending(self):
+		record_change(self.todo, "after_insert")
+		pushed = []
+
+		def push_batches(batches):
+			pushed.append([envelope["name"] for envelope in batches.get(APP, [])])
+			if len(pushed) == 1:
+				# A new event for the document while its first push is in flight
+				record_change(self.todo, "on_update")
+				self.assertEqual(self.get_rows(), ["after_insert"])
+
+		with patch("mobility_sync.sync.handlers.push_batches", side_effect=push_batches):
+			dispatch_outbox()
+
+		# Sent again on the next page instead of being lost, then removed
+		self.assertEqual(pushed, [[self.todo.name], [self.todo.name]])
+		self.assertEqual(self.get_rows(), [])
+
+	def test_only_one_dispatcher_runs_at_a_time(self):
+		record_change(self.todo, "after_insert")
+		cache = frappe.cache()
+		cache.set(cache.make_key(DISPATCH_LOCK_KEY), 1, ex=60)
+
+		with patch("mobility_sync.sync.handlers.push_batches") as push_batches:
+			dispatch_outbox()
+
+		push_batches.assert_not_called()
+		self.assertEqual(self.get_rows(), ["after_insert"])
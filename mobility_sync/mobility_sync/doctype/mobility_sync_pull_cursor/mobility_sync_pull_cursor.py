@@ -0,0 +1,17 @@
+# Copyright (c) 2026, Ahmed Zaytoon and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+
+class MobilitySyncPullCursor(Document):
+	pass
+
+
+def on_doctype_update():
+	frappe.db.add_unique(
+		"Mobility Sync Pull Cursor",
+		["app_name", "document_type"],
+		constraint_name="unique_pull_cursor",
+	)
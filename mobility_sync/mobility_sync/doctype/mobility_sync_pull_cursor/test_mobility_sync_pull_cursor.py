@@ -0,0 +1,137 @@
+# Copyright (c) 2026, Ahmed Zaytoon and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import add_to_date, now_datetime
+
+from mobility_sync.sync.feed import (
+	MAX_PULL_ATTEMPTS,
+	PULL_ATTEMPTS_KEY,
+	START_POSITION,
+	apply_feed_page,
+	decode_cursor,
+	encode_cursor,
+	get_feed_page,
+	pull_changes,
+)
+
+APP = "mobility-sync-test-app"
+
+
+def envelope(name, version, deleted_at=None):
+	return {
+		"doctype": "ToDo",
+		"name": name,
+		"doc_method": "on_trash" if deleted_at else "backfill",
+		"data": {},
+		"version": version,
+		"deleted_at": deleted_at,
+	}
+
+
+class TestMobilitySyncPullCursor(FrappeTestCase):
+	def tearDown(self):
+		frappe.cache().delete_keys(PULL_ATTEMPTS_KEY.format(""))
+		frappe.db.rollback()
+
+	def test_cursor_round_trip(self):
+		position = {"changes": ["2026-03-01 10:00:00", "a"], "tombstones": ["2026-03-01 09:00:00", "b"]}
+		self.assertEqual(decode_cursor(encode_cursor(position)), position)
+		self.assertEqual(decode_cursor(None), {"changes": START_POSITION, "tombstones": START_POSITION})
+		self.assertRaises(frappe.ValidationError, decode_cursor, "not-a-cursor")
+
+	def add_todo(self, modified):
+		todo = frappe.get_doc({"doctype": "ToDo", "description": "feed test"}).insert(ignore_permissions=True)
+		frappe.db.sql("UPDATE `tabToDo` SET modified = %s WHERE name = %s", (modified, todo.name))
+		return todo.name
+
+	def test_pages_continue_from_their_cursor(self):
+		names = [self.add_todo(f"2001-01-01 10:00:0{index}") for index in range(3)]
+		cursor = encode_cursor({"changes": ["2001-01-01 00:00:00", ""], "tombstones": START_POSITION})
+
+		first = get_feed_page("ToDo", cursor, limit=2)
+		second = get_feed_page("ToDo", first["cursor"], limit=2)
+
+		self.assertEqual([change["name"] for change in first["changes"]], names[:2])
+		self.assertTrue(first["has_more"])
+		self.assertEqual(second["changes"][0]["name"], names[2])
+
+	def test_recent_changes_wait_for_the_safety_lag(self):
+		recent = self.add_todo(now_datetime())
+		cursor = encode_cursor(
+			{"changes": [str(add_to_date(now_datetime(), hours=-1)), ""], "tombstones": START_POSITION}
+		)
+
+		page = get_feed_page("ToDo", cursor)
+		self.assertNotIn(recent, [change["name"] for change in page["changes"]])
+
+	def test_apply_stops_at_the_first_failure(self):
+		page = {
+			"changes": [
+				envelope("a", "2026-03-01 10:00:00"),
+				envelope("b", "2026-03-01 10:02:00"),
+				envelope("c", "2026-03-01 10:03:00"),
+			],
+			"tombstones": [envelope("t", "2026-02-01", deleted_at="2026-03-01 10:01:00")],
+		}
+		attempted = []
+
+		def receive_change(doctype, name, *args):
+			attempted.append(name)
+			if name == "b":
+				raise frappe.ValidationError
+			return "success"
+
+		with patch("mobility_sync.sync.api.receive_change", side_effect=receive_change):
+			applied, stopped_at = apply_feed_page(page)
+
+		self.assertEqual((applied, attempted), (2, ["a", "t", "b"]))
+		self.assertEqual(
+			decode_cursor(stopped_at),
+			{"changes": ["2026-03-01 10:00:00", "a"], "tombstones": ["2026-03-01 10:01:00", "t"]},
+		)
+
+	def test_change_that_keeps_failing_is_skipped(self):
+		page = {
+			"changes": [
+				envelope("a", "2026-03-01 10:00:00"),
+				envelope("poison", "2026-03-01 10:01:00"),
+				envelope("c", "2026-03-01 10:02:00"),
+			],
+			"tombstones": [],
+		}
+
+		def receive_change(doctype, name, *args):
+			if name == "poison":
+				raise frappe.ValidationError
+			return "success"
+
+		with patch("mobility_sync.sync.api.receive_change", side_effect=receive_change):
+			for _attempt in range(MAX_PULL_ATTEMPTS - 1):
+				self.assertEqual(apply_feed_page(page)[0], 1)
+			applied, stopped_at = apply_feed_page(page)
+
+		# The change behind it is applied and the page's own cursor is kept
+		self.assertEqual((applied, stopped_at), (2, None))
+		self.assertTrue(frappe.db.exists("Error Log", {"method": "Sync Pull Change Skipped (ToDo)"}))
+
+	def test_fully_applied_page_keeps_its_own_cursor(self):
+		page = {"changes": [envelope("a", "2026-03-01 10:00:00")], "tombstones": []}
+		with patch("mobility_sync.sync.api.receive_change", return_value="skipped"):
+			self.assertEqual(apply_feed_page(page), (0, None))
+
+	def test_pull_saves_the_cursor_of_the_failed_change(self):
+		page = {"changes": [], "tombstones": [], "cursor": "page-cursor", "has_more": True}
+		with (
+			patch("mobility_sync.sync.feed.fetch_feed_page", return_value=page) as fetch,
+			patch("mobility_sync.sync.feed.apply_feed_page", return_value=(3, "stopped-cursor")),
+			patch.object(frappe.db, "commit"),
+		):
+			pull_changes(APP, "ToDo")
+
+		fetch.assert_called_once()
+		cursor = frappe.get_doc("Mobility Sync Pull Cursor", {"app_name": APP, "document_type": "ToDo"})
+		self.assertEqual((cursor.cursor, cursor.pulled), ("stopped-cursor", 3))
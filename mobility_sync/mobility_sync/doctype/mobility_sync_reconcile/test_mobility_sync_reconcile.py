@@ -0,0 +1,96 @@
+# Copyright (c) 2026, Ahmed Zaytoon and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import get_datetime
+
+from mobility_sync.sync.api import check_doctype_access
+from mobility_sync.sync.feed import record_tombstone
+from mobility_sync.sync.reconcile import REPUSH_METHOD, compare_leaves
+
+OLDER = get_datetime("2026-03-01 09:00:00")
+VERSION = get_datetime("2026-03-01 10:00:00")
+NEWER = "2026-03-01 11:00:00"
+
+
+class TestMobilitySyncReconcile(FrappeTestCase):
+	def tearDown(self):
+		frappe.db.rollback()
+
+	def compare(self, local, remote):
+		reconcile = frappe._dict(
+			document_type="ToDo",
+			app_name="mobility-sync-test-app",
+			requeued=0,
+			deletions_requeued=0,
+			remote_newer=0,
+			remote_only=0,
+		)
+		with (
+			patch("mobility_sync.sync.reconcile.get_bucket_versions", return_value=local),
+			patch("mobility_sync.sync.reconcile.call_app", return_value=remote),
+		):
+			keys = compare_leaves(reconcile, ["0a"])
+		return keys, reconcile
+
+	def test_identical_leaves_requeue_nothing(self):
+		keys, reconcile = self.compare({"same": [VERSION, 0]}, {"same": [str(VERSION), 1]})
+		self.assertEqual(keys, [])
+		self.assertEqual(reconcile.requeued, 0)
+
+	def test_missing_or_outdated_documents_are_pushed_again(self):
+		keys, reconcile = self.compare(
+			{"missing": [VERSION, 0], "outdated": [VERSION, 0]},
+			{"outdated": [str(OLDER), 1]},
+		)
+		self.assertEqual(keys, [("ToDo", "missing", REPUSH_METHOD), ("ToDo", "outdated", REPUSH_METHOD)])
+		self.assertEqual(reconcile.requeued, 2)
+
+	def test_newer_change_applied_on_the_app_is_left_alone(self):
+		keys, reconcile = self.compare({"newer": [VERSION, 0]}, {"newer": [NEWER, 1]})
+		self.assertEqual(keys, [])
+		self.assertEqual(reconcile.remote_newer, 1)
+
+	def test_newer_document_written_on_the_app_itself_is_overwritten(self):
+		# Not applied from a sync: the app's own edit, this site stays the source of truth
+		keys, _reconcile = self.compare({"edited": [VERSION, 0]}, {"edited": [NEWER, 0]})
+		self.assertEqual(keys, [("ToDo", "edited", REPUSH_METHOD)])
+
+	def test_documents_only_on_the_app_are_deleted_if_deleted_here(self):
+		record_tombstone(frappe._dict(doctype="ToDo", name="reconcile-deleted", modified=OLDER))
+
+		keys, reconcile = self.compare(
+			{}, {"reconcile-deleted": [str(OLDER), 1], "reconcile-unknown": [str(OLDER), 0]}
+		)
+
+		self.assertEqual(keys, [("ToDo", "reconcile-deleted", "on_trash")])
+		self.assertEqual((reconcile.deletions_requeued, reconcile.remote_only), (1, 1))
+
+
+class TestReconcileAccess(FrappeTestCase):
+	def setUp(self):
+		# ToDo is pull only; Contact Email is misconfigured as a synced doctype
+		patcher = patch(
+			"mobility_sync.sync.settings.get_sync_index", return_value={"ToDo": (), "Contact Email": ("app",)}
+		)
+		patcher.start()
+		self.addCleanup(patcher.stop)
+
+	def check(self, doctype, user):
+		check_doctype_access(doctype, frappe._dict(user=user))
+
+	def test_synced_readable_doctype_is_served(self):
+		self.check("ToDo", "Administrator")
+
+	def test_caller_must_be_able_to_read_the_doctype(self):
+		self.assertRaises(frappe.PermissionError, self.check, "ToDo", "Guest")
+
+	def test_doctype_not_synced_is_refused_even_when_readable(self):
+		self.assertRaises(frappe.PermissionError, self.check, "Note", "Administrator")
+
+	def test_internal_child_and_unknown_doctypes_are_refused(self):
+		for doctype in ("OAuth Bearer Token", "Contact Email", "No Such Doctype`", None):
+			self.assertRaises(frappe.PermissionError, self.check, doctype, "Administrator")
@@ -0,0 +1,20 @@
+# Copyright (c) 2026, Ahmed Zaytoon and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+
+class MobilitySyncTombstone(Document):
+	pass
+
+
+def on_doctype_update():
+	# One row per deleted document, refreshed if it is deleted again
+	frappe.db.add_unique(
+		"Mobility Sync Tombstone",
+		["document_type", "document_name"],
+		constraint_name="unique_tombstone_document",
+	)
+	# Change feed: tombstones of a doctype in (modified, document_name) order
+	frappe.db.add_index("Mobility Sync Tombstone", ["document_type", "modified", "document_name"])
@@ -4,6 +4,9 @@
 frappe.ui.form.on("Sync Settings", {
     refresh: function(frm) {
         if (!frm.is_new()) {
+            show_circuit_breakers(frm);
+            show_sync_metrics(frm);
+
             frm.add_custom_button(__("Setup Outgoing OAuth Client"), function() {
                 frappe.prompt([
                     {
@@ -72,6 +75,91 @@ frappe.ui.form.on("Sync Settings", {
     }
 });
 
+function show_circuit_breakers(frm) {
+    frappe.call({
+        method: "mobility_sync.sync.api.get_circuit_breakers",
+        callback: function(r) {
+            const colors = {closed: "green", half_open: "orange", open: "red"};
+            const labels = {closed: __("Closed"), half_open: __("Half-Open"), open: __("Open")};
+            Object.entries(r.message || {}).forEach(([app_name, breaker]) => {
+                let label = __("{0}: circuit {1}", [app_name, labels[breaker.state]]);
+                if (breaker.state !== "closed") {
+                    label += " " + __("({0} failures, probe after {1})", [
+                        breaker.failures,
+                        frappe.datetime.get_datetime_as_string(new Date(breaker.retry_at * 1000)),
+                    ]);
+                    frm.add_custom_button(app_name, function() {
+                        frappe.call({
+                            method: "mobility_sync.sync.api.reset_circuit_breaker",
+                            args: {app_name: app_name},
+                            callback: () => frm.reload_doc()
+                        });
+                    }, __("Reset Circuit"));
+                }
+                frm.dashboard.add_indicator(label, colors[breaker.state]);
+            });
+        }
+    });
+}
+
+function show_sync_metrics(frm) {
+    frappe.call({
+        method: "mobility_sync.sync.api.get_metrics_summary",
+        callback: function(r) {
+            const summary = r.message;
+            if (!summary) {
+                return;
+            }
+            const esc = frappe.utils.escape_html;
+            const value = (v) => (v === undefined || v === null) ? "-" : esc(String(v));
+
+            const app_rows = Object.entries(summary.apps).map(([app_name, app]) => `
+                <tr>
+                    <td>${esc(app_name)}</td>
+                    <td class="text-right">${value(app.requests)}</td>
+                    <td class="text-right">${value(app.errors)}</td>
+                    <td class="text-right">${value(app.avg_ms)}</td>
+                    <td class="text-right">${app.p95_seconds ? "&le; " + value(app.p95_seconds) + "s" : "-"}</td>
+                    <td class="text-right">${value(app.backlog)}</td>
+                </tr>`).join("");
+            const stage_rows = Object.entries(summary.stages).map(([stage, timing]) => `
+                <tr>
+                    <td>${esc(stage)}</td>
+                    <td class="text-right">${value(timing.count)}</td>
+                    <td class="text-right">${value(timing.avg_ms)}</td>
+                </tr>`).join("");
+            const queues = Object.entries(summary.queue_depth)
+                .map(([queue, depth]) => `${esc(queue)}: ${value(depth)}`).join(", ");
+
+            frm.dashboard.add_section(`
+                <div class="row">
+                    <div class="col-sm-7">
+                        <table class="table table-bordered table-condensed">
+                            <thead><tr>
+                                <th>${__("App")}</th><th class="text-right">${__("Requests")}</th>
+                                <th class="text-right">${__("Errors")}</th><th class="text-right">${__("Avg ms")}</th>
+                                <th class="text-right">${__("p95")}</th><th class="text-right">${__("Backlog")}</th>
+                            </tr></thead>
+                            <tbody>${app_rows || `<tr><td colspan="6" class="text-muted">${__("No requests yet")}</td></tr>`}</tbody>
+                        </table>
+                    </div>
+                    <div class="col-sm-5">
+                        <table class="table table-bordered table-condensed">
+                            <thead><tr>
+                                <th>${__("Stage")}</th><th class="text-right">${__("Calls")}</th>
+                                <th class="text-right">${__("Avg ms")}</th>
+                            </tr></thead>
+                            <tbody>${stage_rows || `<tr><td colspan="3" class="text-muted">${__("No timings yet")}</td></tr>`}</tbody>
+                        </table>
+                    </div>
+                </div>
+                <div class="text-muted small">
+                    ${__("Queue depth")}: ${queues || "-"} &middot; ${__("Outbox pending")}: ${value(summary.outbox_pending)}
+                </div>`, __("Sync Metrics"));
+        }
+    });
+}
+
 frappe.ui.form.on('Sync Settings Apps', {
     connect_app: function(frm, cdt, cdn) {
         let row = locals[cdt][cdn];
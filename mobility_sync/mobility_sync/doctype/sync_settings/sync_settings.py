@@ -4,9 +4,14 @@
 import frappe
 from frappe.model.document import Document
 
+from mobility_sync.sync.mapping import clear_mapping_plans
+from mobility_sync.sync.settings import clear_sync_index
+
 
 class SyncSettings(Document):
-	pass
+	def on_update(self):
+		clear_sync_index()
+		clear_mapping_plans()
 
 @frappe.whitelist()
 def get_fields_for_doctype(doctype, txt=None, searchfield=None, start=0, page_len=20, filters=None):
@@ -1,9 +1,31 @@
 # Copyright (c) 2025, Ahmed Zaytoon and Contributors
 # See license.txt
 
-# import frappe
+import frappe
 from frappe.tests.utils import FrappeTestCase
 
+from mobility_sync.sync.settings import clear_sync_index, get_enabled_apps, is_doctype_enabled
+
 
 class TestSyncSettings(FrappeTestCase):
-	pass
+	def tearDown(self):
+		frappe.db.rollback()
+		clear_sync_index()
+
+	def test_sync_index_is_invalidated_on_save(self):
+		settings = frappe.get_single("Sync Settings")
+		settings.set("doctypes", [{"sync_doctype": "ToDo", "enabled": 1, "apps": '["remote_app"]'}])
+		settings.flags.ignore_links = True
+		settings.save(ignore_permissions=True)
+
+		self.assertTrue(is_doctype_enabled("ToDo"))
+		self.assertEqual(get_enabled_apps("ToDo"), ("remote_app",))
+
+		settings.doctypes[0].enabled = 0
+		settings.save(ignore_permissions=True)
+
+		self.assertFalse(is_doctype_enabled("ToDo"))
+
+	def test_internal_doctypes_are_never_enabled(self):
+		self.assertFalse(is_doctype_enabled("Error Log"))
+		self.assertFalse(is_doctype_enabled("Mobility Sync Failed Queue"))
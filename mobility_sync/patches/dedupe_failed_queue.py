@@ -0,0 +1,27 @@
+import frappe
+
+
+def execute():
+	"""Keep a single row per (document, app, method) before the unique index is added."""
+	if not frappe.db.table_exists("Mobility Sync Failed Queue"):
+		return
+
+	# Prefer the pending row, then the newest one
+	frappe.db.sql(
+		"""
+		DELETE duplicate FROM `tabMobility Sync Failed Queue` duplicate
+		JOIN `tabMobility Sync Failed Queue` keep
+			ON keep.document_type <=> duplicate.document_type
+			AND keep.document_name <=> duplicate.document_name
+			AND keep.app_name <=> duplicate.app_name
+			AND keep.doc_method <=> duplicate.doc_method
+			AND keep.name != duplicate.name
+			AND (
+				keep.sync_tried < duplicate.sync_tried
+				OR (keep.sync_tried = duplicate.sync_tried AND (
+					keep.creation > duplicate.creation
+					OR (keep.creation = duplicate.creation AND keep.name > duplicate.name)
+				))
+			)
+		"""
+	)
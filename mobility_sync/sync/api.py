@@ -1,33 +1,61 @@
+import json
+
 import frappe
+from frappe.utils import cint, get_datetime, get_traceback
+from werkzeug.wrappers import Response
+
+from mobility_sync.sync import breaker, echo, metrics, reconcile, serializer
+from mobility_sync.sync.auth import validate_bearer_token
+from mobility_sync.sync.backfill import BACKFILL_METHOD, enqueue_backfill, get_backfill
+from mobility_sync.sync.fast_apply import fast_apply_doc, is_fast_apply, run_post_apply_hooks
+from mobility_sync.sync.feed import get_feed_page
+from mobility_sync.sync.links import MissingLinkError, find_missing_links
+from mobility_sync.sync.serializer import read_request_payload, supported_encodings
+from mobility_sync.sync.settings import get_sync_settings, is_doctype_enabled
+from mobility_sync.sync.throttle import receiving
+from mobility_sync.sync.versions import (
+    DUPLICATE,
+    STALE,
+    check_version,
+    get_applied_versions,
+    record_applied_version,
+)
+
+# Default/system fields that are never copied onto an existing document
+SYSTEM_FIELDS = (
+    "name", "owner", "creation", "modified", "modified_by",
+    "docstatus", "idx", "__unsaved"
+)
+
+
+def apply_delta(doc, data, delta):
+    """Patch `doc` with changed scalar fields and added/changed/removed child rows."""
+    for key, value in data.items():
+        if key not in SYSTEM_FIELDS:
+            doc.set(key, value)
+
+    for fieldname, table in (delta.get("tables") or {}).items():
+        removed = set(table.get("removed") or [])
+        rows = {row.name: row.as_dict() for row in doc.get(fieldname) or [] if row.name not in removed}
+        for row in table.get("rows") or []:
+            if row["name"] in rows:
+                rows[row["name"]].update(row)
+            else:
+                # Keep the source row name; it has to be inserted, not updated
+                rows[row["name"]] = dict(row, __islocal=1)
+        doc.set(fieldname, sorted(rows.values(), key=lambda row: row.get("idx") or 0))
+
+
+def apply_doc(doctype, name, method, data, delta=None):
+    """Apply a single pushed change to the local database (without committing)."""
+    if is_fast_apply(doctype, delta):
+        fast_apply_doc(doctype, name, method, data)
+        return
+
+    if method == BACKFILL_METHOD:
+        # Initial sync: the document may or may not exist here yet
+        method = "on_update" if frappe.db.exists(doctype, name) else "after_insert"
 
-@frappe.whitelist(allow_guest=True)
-def receive_doc(doctype, name, doc_method, data):
-    """Validate OAuth2 Bearer token manually and sync doc."""
-    # 1. Extract token
-    method = doc_method
-    auth_header = frappe.get_request_header("Authorization")
-    if not auth_header or not auth_header.startswith("Bearer "):
-        frappe.throw("Missing or invalid Authorization header", frappe.PermissionError)
-
-    token = auth_header.split(" ")[1]
-
-    # 2. Check token in DB (Token Cache → OAuth Bearer Token doctype)
-    token_info = frappe.db.get_value(
-        "OAuth Bearer Token",
-        {"access_token": token, "status": "Active"},
-        ["client", "user", "scopes", "expires_in"],
-        as_dict=True
-    )
-
-    if not token_info:
-        frappe.throw("Invalid or expired access token", frappe.PermissionError)
-
-    # 3. Optional: check expiry
-    from frappe.utils import now_datetime
-    if token_info.expires and token_info.expires < now_datetime():
-        frappe.throw("Access token expired", frappe.PermissionError)
-
-    # 5. Process doc
     data = frappe._dict(data)
     if method == "after_insert":
         if not frappe.db.exists(doctype, name):
@@ -39,23 +67,306 @@ def receive_doc(doctype, name, doc_method, data):
         if frappe.db.exists(doctype, name):
             doc = frappe.get_doc(doctype, name)
 
-            # Exclude default/system fields
-            system_fields = [
-                "name", "owner", "creation", "modified", "modified_by",
-                "docstatus", "idx", "__unsaved"
-            ]
-
-            for key, value in data.items():
-                if key not in system_fields:
-                    setattr(doc, key, value)
+            if delta:
+                apply_delta(doc, data, delta)
+            else:
+                for key, value in data.items():
+                    if key not in SYSTEM_FIELDS:
+                        setattr(doc, key, value)
 
             doc.save(ignore_permissions=True)
     elif method == "on_trash":
         if frappe.db.exists(doctype, name):
             frappe.delete_doc(doctype, name, ignore_permissions=True, force=True)
 
-    frappe.db.commit()
-    return {"status": "success", "method": method, "doctype": doctype, "name": name}
+
+def receive_change(doctype, name, method, data, delta=None, change_id=None, sync_path=None, version=None, applied=None):
+    """
+    Apply a pushed change unless it already passed through this site, was
+    applied before, or is older than the version last applied to the document
+    (`applied`, see versions.get_applied_versions). All of that is decided
+    before the document is loaded.
+
+    Returns "success"; "skipped" for an echo, a duplicate or a stale full
+    document, which senders count as delivered; or "stale" for an out-of-order
+    delta, which the sender retries as a full document. Raises MissingLinkError
+    when the document links to documents that have not arrived yet.
+    """
+    if echo.is_echo(sync_path):
+        return "skipped"
+
+    outcome = check_version(applied, version, change_id)
+    if outcome == DUPLICATE or (outcome == STALE and not delta):
+        return "skipped"
+    if outcome == STALE:
+        # Its values may be newer than what the applied change carried for those fields
+        return "stale"
+
+    if change_id and not echo.claim_change(change_id):
+        return "skipped"
+
+    try:
+        with echo.inbound_change(doctype, name, change_id, sync_path):
+            try:
+                apply_doc(doctype, name, method, data, delta)
+            except frappe.LinkValidationError:
+                if missing := find_missing_links(doctype, data or {}):
+                    raise MissingLinkError(missing)
+                raise
+        record_applied_version(doctype, name, version, change_id)
+    except Exception:
+        if change_id:
+            echo.release_change(change_id)
+        raise
+    return "success"
+
+
+@frappe.whitelist(allow_guest=True)
+def receive_doc(doctype=None, name=None, doc_method=None, data=None, delta=None, change_id=None, sync_path=None, version=None):
+    """
+    Validate OAuth2 Bearer token manually and sync doc.
+    Arguments are read from the body instead when it is gzip/zstd compressed.
+    """
+    validate_bearer_token()
+
+    with receiving():
+        if payload := read_request_payload():
+            doctype, name, doc_method = payload.get("doctype"), payload.get("name"), payload.get("doc_method")
+            data, delta = payload.get("data"), payload.get("delta")
+            change_id, sync_path, version = payload.get("change_id"), payload.get("sync_path"), payload.get("version")
+
+        if isinstance(delta, str):
+            delta = json.loads(delta)
+        if isinstance(sync_path, str):
+            sync_path = json.loads(sync_path)
+        missing = None
+        try:
+            with metrics.timer("receive_doc", doctype=doctype):
+                applied = get_applied_versions([(doctype, name)]).get((doctype, name))
+                status = receive_change(doctype, name, doc_method, data, delta, change_id, sync_path, version, applied)
+        except MissingLinkError as e:
+            # Reported, not raised: the sender pushes the missing documents and then this one again
+            frappe.db.rollback()
+            status, missing = "missing_link", e.missing
+        metrics.inc(metrics.RECEIVED_DOCUMENTS, doctype=doctype, status=status)
+
+        run_post_apply_hooks()
+        frappe.db.commit()
+    response = {
+        "status": status if status in ("stale", "missing_link") else "success",
+        "skipped": status == "skipped",
+        "method": doc_method,
+        "doctype": doctype,
+        "name": name,
+        "accept_encoding": supported_encodings(),
+    }
+    if missing:
+        response["missing"] = missing
+    return response
+
+
+@frappe.whitelist(allow_guest=True)
+def receive_docs(docs=None, chunk_size=None):
+    """
+    Validate OAuth2 Bearer token and apply an ordered batch of
+    {doctype, name, doc_method, data[, delta, change_id, sync_path, version]} envelopes.
+
+    Documents are committed every `chunk_size` items (default: Sync Settings
+    Receive Chunk Size, 0 = whole batch in one transaction). A failing document is
+    rolled back to its savepoint and reported without aborting the rest of the batch;
+    one linking to documents that do not exist here is reported as "missing_link"
+    with the `missing` [doctype, name] pairs.
+    Over `Receive Max Concurrent` pushes at once, the request fails with 429.
+    Arguments are read from the body instead when it is gzip/zstd compressed.
+    """
+    validate_bearer_token()
+
+    with receiving():
+        if payload := read_request_payload():
+            docs, chunk_size = payload.get("docs"), payload.get("chunk_size", chunk_size)
+
+        if isinstance(docs, str):
+            docs = json.loads(docs)
+
+        chunk_size = cint(chunk_size) or cint(get_sync_settings().receive_chunk_size)
+        chunk_size = chunk_size or len(docs) or 1
+
+        # Last applied version of every document in the batch, in one query
+        applied_versions = get_applied_versions([(envelope.get("doctype"), envelope.get("name")) for envelope in docs])
+
+        results = []
+        for start in range(0, len(docs), chunk_size):
+            for envelope in docs[start:start + chunk_size]:
+                envelope = frappe._dict(envelope)
+                result = {
+                    "doctype": envelope.doctype,
+                    "name": envelope.name,
+                    "method": envelope.doc_method,
+                }
+                frappe.db.savepoint("mobility_sync_receive")
+                try:
+                    key = (envelope.doctype, envelope.name)
+                    with metrics.timer("receive_change", doctype=envelope.doctype):
+                        status = receive_change(
+                            envelope.doctype, envelope.name, envelope.doc_method, envelope.data,
+                            envelope.delta, envelope.change_id, envelope.sync_path,
+                            envelope.version, applied_versions.get(key)
+                        )
+                    result["status"] = "stale" if status == "stale" else "success"
+                    if status == "skipped":
+                        result["skipped"] = True
+                    elif status == "success" and envelope.version:
+                        applied_versions[key] = frappe._dict(
+                            source_modified=get_datetime(envelope.version), change_id=envelope.change_id
+                        )
+                except MissingLinkError as e:
+                    frappe.db.rollback(save_point="mobility_sync_receive")
+                    result["status"] = status = "missing_link"
+                    result["missing"] = e.missing
+                except Exception as e:
+                    frappe.db.rollback(save_point="mobility_sync_receive")
+                    frappe.log_error(message=get_traceback(), title=f"Sync Receive Failed ({envelope.doctype})")
+                    result["status"] = status = "failed"
+                    result["error"] = str(e)
+                metrics.inc(metrics.RECEIVED_DOCUMENTS, doctype=envelope.doctype, status=status)
+                results.append(result)
+            run_post_apply_hooks()
+            frappe.db.commit()
+
+    return {"status": "success", "results": results, "accept_encoding": supported_encodings()}
+
+
+@frappe.whitelist(allow_guest=True)
+def get_change_feed(doctype, cursor=None, limit=None, encoding=None):
+    """
+    Validate OAuth2 Bearer token and return the changes of an enabled doctype
+    after `cursor`: {changes, tombstones, cursor, has_more}. Pass the returned
+    cursor to get the next page. With a supported `encoding` the page is sent
+    compressed as a binary response.
+    """
+    token_info = validate_bearer_token()
+    check_doctype_access(doctype, token_info)
+
+    page = get_feed_page(doctype, cursor, limit)
+    if encoding not in supported_encodings():
+        return page
+
+    frappe.local.response.type = "binary"
+    frappe.local.response.filename = f"changes.json.{encoding}"
+    frappe.local.response.filecontent = serializer.compress(serializer.dumps(page), encoding)
+
+
+def check_doctype_access(doctype, token_info):
+    """
+    Allow reading `doctype` through the change feed or reconciliation: it must
+    be enabled (or pull only) in Sync Settings, so its deletions are recorded as
+    tombstones, have a table of its own, and be readable by the token's user.
+    """
+    if not doctype or not is_doctype_enabled(doctype):
+        frappe.throw(f"{doctype} is not enabled in Sync Settings", frappe.PermissionError)
+    meta = frappe.get_meta(doctype)
+    if meta.istable or meta.issingle or meta.is_virtual:
+        frappe.throw(f"{doctype} cannot be synced", frappe.PermissionError)
+    if not frappe.has_permission(doctype, "read", user=token_info.user):
+        frappe.throw(f"Not permitted to read {doctype}", frappe.PermissionError)
+
+
+def read_reconcile_request(doctype, prefixes):
+    token_info = validate_bearer_token()
+    if payload := read_request_payload():
+        doctype, prefixes = payload.get("doctype"), payload.get("prefixes")
+    if isinstance(prefixes, str):
+        prefixes = json.loads(prefixes)
+    check_doctype_access(doctype, token_info)
+    if not prefixes or len({len(prefix) for prefix in prefixes}) != 1:
+        frappe.throw("Prefixes must be a non-empty list of equally long name hash prefixes")
+    return doctype, prefixes
+
+
+@frappe.whitelist(allow_guest=True, methods=["POST"])
+def get_reconcile_digests(doctype=None, prefixes=None):
+    """
+    Validate OAuth2 Bearer token and return {bucket: [count, digest]} of the
+    buckets one level below each name hash prefix, as seen by this replica.
+    """
+    doctype, prefixes = read_reconcile_request(doctype, prefixes)
+    return reconcile.get_bucket_digests(doctype, prefixes, replica=True)
+
+
+@frappe.whitelist(allow_guest=True, methods=["POST"])
+def get_reconcile_versions(doctype=None, prefixes=None):
+    """
+    Validate OAuth2 Bearer token and return {name: [version, applied]} of the
+    documents under each name hash prefix, as seen by this replica.
+    """
+    doctype, prefixes = read_reconcile_request(doctype, prefixes)
+    return reconcile.get_bucket_versions(doctype, prefixes, replica=True)
+
+
+@frappe.whitelist()
+def get_payload_stats():
+    """Payload size, compression and serialization time per outgoing app."""
+    frappe.only_for("System Manager")
+    apps = frappe.get_all("Sync Settings Apps", filters={"parent": "Sync Settings"}, pluck="app_name")
+    return {app: serializer.get_payload_stats(app) for app in apps}
+
+
+@frappe.whitelist()
+def get_circuit_breakers():
+    """Circuit breaker state of every outgoing app, for the Sync Settings form."""
+    frappe.only_for("System Manager")
+    apps = frappe.get_all("Sync Settings Apps", filters={"parent": "Sync Settings"}, pluck="app_name")
+    return {app: breaker.get_breaker_state(app) for app in apps}
+
+
+@frappe.whitelist()
+def get_metrics():
+    """Sync pipeline metrics in the Prometheus text format, for scraping with an API key of a System Manager."""
+    frappe.only_for("System Manager")
+    return Response(metrics.render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+
+@frappe.whitelist()
+def get_metrics_summary():
+    """Per-app latency and errors, stage timings and backlogs, for the Sync Settings dashboard."""
+    frappe.only_for("System Manager")
+    return metrics.get_summary()
+
+
+@frappe.whitelist(methods=["POST"])
+def reset_metrics():
+    frappe.only_for("System Manager")
+    metrics.reset_metrics()
+
+
+@frappe.whitelist(methods=["POST"])
+def reset_circuit_breaker(app_name):
+    """Close an app's circuit so pushes resume right away."""
+    frappe.only_for("System Manager")
+    breaker.reset_breaker(app_name)
+
+
+@frappe.whitelist(methods=["POST"])
+def start_backfill(document_type, app_name, batch_size=None, workers=None, restart=0):
+    """
+    Send every existing document of an enabled doctype to an app in a background
+    job, resuming an unfinished backfill unless `restart` is set. Returns the
+    Mobility Sync Backfill tracking its checkpoint and progress.
+    """
+    frappe.only_for("System Manager")
+    backfill = get_backfill(document_type, app_name, batch_size, workers, cint(restart))
+    enqueue_backfill(backfill.name)
+    return backfill.name
+
+
+@frappe.whitelist(methods=["POST"])
+def start_reconcile(document_type, app_name):
+    """
+    Compare a pushed doctype with an app in a background job and queue the
+    documents that differ. Returns the Mobility Sync Reconcile recording the result.
+    """
+    frappe.only_for("System Manager")
+    return reconcile.start_reconcile(document_type, app_name).name
 
 
 @frappe.whitelist()
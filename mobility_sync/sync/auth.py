@@ -0,0 +1,103 @@
+import hashlib
+
+import frappe
+from frappe.utils import add_to_date, cint, now_datetime
+
+from mobility_sync.sync.settings import get_sync_settings
+
+BEARER_TOKEN_CACHE_KEY = "mobility_sync:bearer_token:{}"
+DEFAULT_TOKEN_CACHE_TTL = 60
+
+
+def get_token_cache_key(token):
+    # Never keep raw access tokens in Redis
+    return BEARER_TOKEN_CACHE_KEY.format(hashlib.sha256(token.encode()).hexdigest())
+
+
+def get_token_info(token):
+    """
+    Return {client, user, scopes, expires_at} of an active bearer token, or None.
+
+    Validated tokens are cached for `Token Cache TTL` seconds, never beyond their
+    own expiry, so hot senders skip the database entirely. Revoking a token through
+    the OAuth revocation endpoint or the desk drops it from the cache (see
+    revoke_token and clear_token_cache); one revoked by any other direct database
+    write stays accepted until its cache entry expires.
+    """
+    key = get_token_cache_key(token)
+    if token_info := frappe.cache().get_value(key, expires=True):
+        return token_info
+
+    row = frappe.db.get_value(
+        "OAuth Bearer Token",
+        {"access_token": token, "status": "Active"},
+        ["client", "user", "scopes", "expiration_time", "expires_in", "creation"],
+        as_dict=True
+    )
+    if not row:
+        return None
+
+    expires_at = row.expiration_time
+    if not expires_at and row.expires_in:
+        expires_at = add_to_date(row.creation, seconds=row.expires_in)
+
+    token_info = frappe._dict(client=row.client, user=row.user, scopes=row.scopes, expires_at=expires_at)
+
+    ttl = cint(get_sync_settings().token_cache_ttl) or DEFAULT_TOKEN_CACHE_TTL
+    if expires_at:
+        ttl = min(ttl, int((expires_at - now_datetime()).total_seconds()))
+    if ttl > 0:
+        frappe.cache().set_value(key, token_info, expires_in_sec=ttl)
+
+    return token_info
+
+
+def validate_bearer_token():
+    """Validate the OAuth2 Bearer token of the current request manually."""
+    # 1. Extract token
+    auth_header = frappe.get_request_header("Authorization")
+    if not auth_header or not auth_header.startswith("Bearer "):
+        frappe.throw("Missing or invalid Authorization header", frappe.PermissionError)
+
+    token = auth_header.split(" ")[1]
+
+    # 2. Check token (cache, then OAuth Bearer Token doctype)
+    token_info = get_token_info(token)
+    if not token_info:
+        frappe.throw("Invalid or expired access token", frappe.PermissionError)
+
+    # 3. Check expiry
+    if token_info.expires_at and token_info.expires_at < now_datetime():
+        frappe.throw("Access token expired", frappe.PermissionError)
+
+    return token_info
+
+
+def clear_token_cache(doc, method=None):
+    """doc_events hook: drop a bearer token from the cache when it is revoked or deleted."""
+    if doc.get("access_token"):
+        frappe.cache().delete_value(get_token_cache_key(doc.access_token))
+
+
+def clear_revoked_token(token):
+    """Drop a revoked access token, or the access token of a revoked refresh token, from the cache."""
+    cache = frappe.cache()
+    cache.delete_value(get_token_cache_key(token))
+    if access_token := frappe.db.get_value("OAuth Bearer Token", {"refresh_token": token}, "access_token"):
+        cache.delete_value(get_token_cache_key(access_token))
+
+
+@frappe.whitelist(allow_guest=True)
+def revoke_token(*args, **kwargs):
+    """
+    Frappe's OAuth revocation endpoint (overridden in hooks). It revokes with
+    frappe.db.set_value, which fires no doc_events, so clear_token_cache never
+    sees it: the revoked token is dropped from the cache here instead.
+    """
+    from frappe.integrations.oauth2 import revoke_token as frappe_revoke_token
+
+    try:
+        return frappe_revoke_token(*args, **kwargs)
+    finally:
+        if token := frappe.form_dict.get("token"):
+            clear_revoked_token(token)
@@ -0,0 +1,282 @@
+import time
+
+import frappe
+from frappe.utils import cint, get_traceback, now_datetime, time_diff_in_seconds
+
+from mobility_sync.sync import breaker, sessions
+from mobility_sync.sync.echo import get_site_origin
+from mobility_sync.sync.failed_queue import record_results
+from mobility_sync.sync.handlers import (
+    build_request,
+    can_send,
+    finish_send,
+    get_target_url,
+    read_batch_results,
+    release_send,
+)
+from mobility_sync.sync.mapping import map_document
+from mobility_sync.sync.queues import enqueue_sync_job, get_job_timeout
+from mobility_sync.sync.settings import get_enabled_apps, get_sync_settings
+from mobility_sync.sync.throttle import get_retry_after
+from mobility_sync.sync.tokens import get_oauth_tokens
+
+# Method of backfilled envelopes: the receiver inserts or updates as needed
+BACKFILL_METHOD = "backfill"
+BACKFILL_LOCK_KEY = "mobility_sync:backfill_lock:{}"
+DEFAULT_WORKERS = 2
+START_CURSOR = ("1900-01-01", "")
+
+
+# --------------------------------------------------------
+# Checkpoints
+# --------------------------------------------------------
+
+def get_backfill(document_type, app_name, batch_size=None, workers=None, restart=False):
+    """
+    Return the checkpoint of an unfinished (or failed) backfill of `document_type`
+    to `app_name`, or a new one. With `restart`, unfinished ones are cancelled and
+    a new one starts from the beginning.
+    """
+    if app_name not in get_enabled_apps(document_type):
+        frappe.throw(f"{document_type} is not enabled for {app_name} in Sync Settings")
+
+    unfinished = frappe.get_all(
+        "Mobility Sync Backfill",
+        filters={"document_type": document_type, "app_name": app_name, "status": ("in", ["Queued", "Running", "Failed"])},
+        pluck="name",
+        order_by="creation desc"
+    )
+    if unfinished and not restart:
+        backfill = frappe.get_doc("Mobility Sync Backfill", unfinished[0])
+        backfill.status = "Queued"
+    else:
+        for name in unfinished:
+            frappe.db.set_value("Mobility Sync Backfill", name, "status", "Cancelled")
+        backfill = frappe.new_doc("Mobility Sync Backfill")
+        backfill.update({"document_type": document_type, "app_name": app_name, "status": "Queued"})
+
+    settings = get_sync_settings()
+    backfill.batch_size = cint(batch_size) or backfill.batch_size or cint(settings.batch_size) or 100
+    backfill.workers = cint(workers) or backfill.workers or DEFAULT_WORKERS
+    backfill.save(ignore_permissions=True)
+    frappe.db.commit()
+    return backfill
+
+
+def enqueue_backfill(backfill_name):
+    enqueue_sync_job("mobility_sync.sync.backfill.run_backfill", backfill_name=backfill_name)
+
+
+def schedule_backfills():
+    """
+    Scheduled every minute: resume queued backfills, e.g. those paused because
+    their app was throttled or its circuit open, once the app accepts pushes again.
+    """
+    for row in frappe.get_all("Mobility Sync Backfill", filters={"status": "Queued"}, fields=["name", "app_name"]):
+        if breaker.is_open(row.app_name) or get_retry_after(row.app_name):
+            continue
+        # Not through enqueue_backfill: a hand-over enqueued by the running job
+        # must not be deduplicated against that job itself
+        enqueue_sync_job(
+            "mobility_sync.sync.backfill.run_backfill",
+            backfill_name=row.name,
+            job_id=f"mobility_sync_backfill::{row.name}",
+            deduplicate=True
+        )
+
+
+def acquire_backfill_lock(backfill_name, refresh=False):
+    """
+    Only one run per backfill at a time. The lock is refreshed after every page,
+    so a run killed without releasing it frees it after a job timeout.
+    """
+    cache = frappe.cache()
+    key = cache.make_key(BACKFILL_LOCK_KEY.format(backfill_name))
+    return bool(cache.set(key, 1, nx=not refresh, ex=get_job_timeout()))
+
+
+def release_backfill_lock(backfill_name):
+    frappe.cache().delete_value(BACKFILL_LOCK_KEY.format(backfill_name))
+
+
+def save_checkpoint(backfill, **values):
+    backfill.db_set(values, commit=True)
+    frappe.publish_realtime(
+        "mobility_sync_backfill",
+        {
+            "name": backfill.name, "status": backfill.status, "total": backfill.total,
+            "sent": backfill.sent, "failed": backfill.failed, "docs_per_second": backfill.docs_per_second,
+        },
+        user=frappe.session.user
+    )
+
+
+# --------------------------------------------------------
+# Pages
+# --------------------------------------------------------
+
+def get_next_page(doctype, cursor, limit):
+    """Return the next (name, modified) rows after `cursor` in (modified, name) order."""
+    return frappe.db.sql(f"""
+        SELECT name, modified
+        FROM `tab{doctype}`
+        WHERE (modified, name) > (%s, %s)
+        ORDER BY modified, name
+        LIMIT %s
+    """, (cursor[0], cursor[1], limit), as_dict=True)
+
+
+def build_backfill_envelope(doctype, name):
+    doc = frappe.get_doc(doctype, name)
+    return {
+        "doctype": doctype,
+        "name": name,
+        "doc_method": BACKFILL_METHOD,
+        "data": map_document(doc.as_dict()),
+        "change_id": frappe.generate_hash(length=20),
+        "sync_path": [get_site_origin()],
+        "version": doc.modified,
+    }
+
+
+def acquire_sends(app_name, count):
+    """
+    Take up to `count` send slots of an app (see handlers.can_send) without waiting.
+    Returns how many were taken: none while the app is throttled or its circuit is
+    open, and one for a half-open circuit, which admits a single probe.
+    """
+    if not can_send(app_name):
+        return 0
+
+    taken = 1
+    while taken < count and can_send(app_name):
+        taken += 1
+    return taken
+
+
+def send_page(app_name, envelopes, batch_size, workers):
+    """
+    Send envelopes to an app in `batch_size` requests, `workers` at a time. Returns [(envelope, success)].
+
+    Send slots are taken for each wave of requests right before it goes out, so
+    a circuit that opens or an app that answers 429 holds back the next wave.
+    The outcomes then stop short: envelopes after the last sent wave are not sent.
+    """
+    access_token = get_oauth_tokens(app_name)
+    if not access_token:
+        frappe.throw(f"Access token not available for app {app_name}")
+
+    url = get_target_url(app_name, "receive_docs")
+    batches = [envelopes[start:start + batch_size] for start in range(0, len(envelopes), batch_size)]
+    outcomes = []
+    while batches:
+        slots = acquire_sends(app_name, min(workers, len(batches)))
+        if not slots:
+            break
+        wave, batches = batches[:slots], batches[slots:]
+
+        responses = []
+        try:
+            calls = [(app_name, url, build_request(app_name, access_token, {"docs": batch})) for batch in wave]
+            responses = sessions.post_many(calls, workers)
+        finally:
+            # Slots of requests that never went out
+            for _slot in range(slots - len(responses)):
+                release_send(app_name)
+
+        for batch, resp in zip(wave, responses, strict=True):
+            finish_send(app_name, resp)
+            results = read_batch_results(resp, batch, "Sync Backfill Push Failed")
+            outcomes.extend(
+                (envelope, result.get("status") == "success") for envelope, result in zip(batch, results, strict=True)
+            )
+    return outcomes
+
+
+# --------------------------------------------------------
+# Run
+# --------------------------------------------------------
+
+def run_backfill(backfill_name, progress=None):
+    """
+    Stream every document of the backfill's doctype to its app, resuming from the
+    saved (modified, name) checkpoint.
+
+    Each page holds `batch_size * workers` documents; its requests go out
+    concurrently and the checkpoint is committed after every page. Documents the
+    app rejects are queued in the failed queue and retried like live pushes. A
+    run hands over to a fresh job before its queue timeout, so interrupting it
+    loses at most one page of work. When the app is throttled or its circuit is
+    open the run stops after the documents it did send and stays Queued, for
+    schedule_backfills to resume instead of sleeping in the worker.
+    `progress(backfill)` is called after each page (the bench command prints from it).
+    """
+    backfill = frappe.get_doc("Mobility Sync Backfill", backfill_name)
+    if backfill.status not in ("Queued", "Running") or not acquire_backfill_lock(backfill_name):
+        return backfill
+
+    try:
+        _run_backfill(backfill, progress)
+    finally:
+        release_backfill_lock(backfill_name)
+
+    if backfill.flags.hand_over:
+        enqueue_backfill(backfill_name)
+    return backfill
+
+
+def _run_backfill(backfill, progress=None):
+    doctype, app_name = backfill.document_type, backfill.app_name
+    batch_size = cint(backfill.batch_size) or 100
+    workers = cint(backfill.workers) or DEFAULT_WORKERS
+    cursor = (backfill.last_modified, backfill.last_name) if backfill.last_name else START_CURSOR
+
+    started_at = backfill.started_at or now_datetime()
+    save_checkpoint(backfill, status="Running", started_at=started_at, total=frappe.db.count(doctype), error=None)
+    # progress() is only passed in the foreground, which has no job timeout
+    deadline = time.monotonic() + get_job_timeout() * 0.8 if progress is None else None
+
+    try:
+        while rows := get_next_page(doctype, cursor, batch_size * workers):
+            envelopes = [build_backfill_envelope(doctype, row.name) for row in rows]
+            outcomes = send_page(app_name, envelopes, batch_size, workers)
+            record_results(app_name, [
+                (envelope["doctype"], envelope["name"], BACKFILL_METHOD, success)
+                for envelope, success in outcomes
+            ])
+            # Envelopes follow the rows' order, so what was sent is a prefix of the page
+            throttled = len(outcomes) < len(rows)
+            if outcomes:
+                cursor = (rows[len(outcomes) - 1].modified, rows[len(outcomes) - 1].name)
+
+            sent = backfill.sent + sum(1 for _envelope, success in outcomes if success)
+            failed = backfill.failed + sum(1 for _envelope, success in outcomes if not success)
+            elapsed = time_diff_in_seconds(now_datetime(), started_at) or 1
+            save_checkpoint(
+                backfill,
+                last_modified=cursor[0], last_name=cursor[1], sent=sent, failed=failed,
+                docs_per_second=round((sent + failed) / elapsed, 2)
+            )
+            if throttled:
+                save_checkpoint(backfill, status="Queued")
+                if progress:
+                    progress(backfill)
+                return
+            if progress:
+                progress(backfill)
+
+            if deadline and time.monotonic() > deadline:
+                # run_backfill enqueues the next run once the lock is released
+                save_checkpoint(backfill, status="Queued")
+                backfill.flags.hand_over = True
+                return
+            acquire_backfill_lock(backfill.name, refresh=True)
+
+    except Exception:
+        frappe.db.rollback()
+        save_checkpoint(backfill, status="Failed", error=get_traceback())
+        raise
+
+    save_checkpoint(backfill, status="Completed", finished_at=now_datetime())
+    if progress:
+        progress(backfill)
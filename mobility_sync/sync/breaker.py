@@ -0,0 +1,126 @@
+import time
+
+import frappe
+from frappe.utils import cint, flt
+
+from mobility_sync.sync.settings import get_app_settings
+
+BREAKER_KEY = "mobility_sync:breaker:{}"
+PROBE_KEY = "mobility_sync:breaker_probe:{}"
+
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_COOLDOWN = 60
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+# --------------------------------------------------------
+# State
+# --------------------------------------------------------
+
+def get_breaker_config(app_name):
+    """Return (failure_threshold, cooldown_seconds, probe_timeout_seconds) for an app."""
+    row = get_app_settings(app_name) or frappe._dict()
+    cooldown = cint(row.breaker_cooldown) or DEFAULT_COOLDOWN
+    # A probe that never reports back (worker killed) frees the slot after a full request
+    probe_timeout = cooldown + cint(flt(row.connect_timeout) + flt(row.request_timeout)) + 30
+    return cint(row.breaker_threshold) or DEFAULT_FAILURE_THRESHOLD, cooldown, probe_timeout
+
+
+def get_breaker_state(app_name):
+    """
+    Return {"state", "failures", "opened_at", "retry_at"} of an app's breaker.
+
+    The Redis hash holds the consecutive failure count and, while the circuit is
+    not closed, the time it opened. Open turns into half-open once the cooldown
+    has passed; no background process is involved.
+    """
+    cache = frappe.cache()
+    # Raw hash commands throughout: RedisWrapper.hget/hset pickle their values
+    pipeline = cache.pipeline()
+    pipeline.hgetall(cache.make_key(BREAKER_KEY.format(app_name)))
+    data = {k.decode(): v.decode() for k, v in pipeline.execute()[0].items()}
+    failures = cint(data.get("failures"))
+    opened_at = flt(data.get("opened_at"))
+    if not opened_at:
+        return frappe._dict(state=CLOSED, failures=failures, opened_at=None, retry_at=None)
+
+    retry_at = opened_at + get_breaker_config(app_name)[1]
+    return frappe._dict(
+        state=OPEN if time.time() < retry_at else HALF_OPEN,
+        failures=failures,
+        opened_at=opened_at,
+        retry_at=retry_at,
+    )
+
+
+def is_open(app_name):
+    """True while an app's circuit is open and its cooldown has not passed yet."""
+    return get_breaker_state(app_name).state == OPEN
+
+
+def allow_request(app_name):
+    """
+    Return whether a request to the app may go out now.
+
+    Closed: always. Open: never. Half-open: only for the one caller that wins the
+    probe slot; its outcome closes or re-opens the circuit.
+    """
+    state = get_breaker_state(app_name).state
+    if state == CLOSED:
+        return True
+    if state == OPEN:
+        return False
+
+    cache = frappe.cache()
+    probe_timeout = get_breaker_config(app_name)[2]
+    return bool(cache.set(cache.make_key(PROBE_KEY.format(app_name)), 1, nx=True, ex=probe_timeout))
+
+
+# --------------------------------------------------------
+# Outcomes
+# --------------------------------------------------------
+
+def record_success(app_name):
+    """Close the circuit and reset the failure count."""
+    frappe.cache().delete_value([BREAKER_KEY.format(app_name), PROBE_KEY.format(app_name)])
+
+
+def record_failure(app_name):
+    """Count a failed request; open (or re-open) the circuit past the threshold or after a failed probe."""
+    cache = frappe.cache()
+    key = cache.make_key(BREAKER_KEY.format(app_name))
+    pipeline = cache.pipeline()
+    pipeline.hincrby(key, "failures", 1)
+    pipeline.hget(key, "opened_at")
+    failures, opened_at = pipeline.execute()
+
+    threshold = get_breaker_config(app_name)[0]
+    if not opened_at and failures < threshold:
+        return
+
+    pipeline = cache.pipeline()
+    pipeline.hset(key, "opened_at", time.time())
+    pipeline.delete(cache.make_key(PROBE_KEY.format(app_name)))
+    pipeline.execute()
+    if not opened_at:
+        frappe.log_error(
+            message=f"{failures} consecutive requests to {app_name} failed. Pushes are queued until a probe succeeds.",
+            title=f"Sync Circuit Opened ({app_name})"
+        )
+
+
+def release_probe(app_name):
+    """Free the half-open probe slot without an outcome (the probe was never sent)."""
+    frappe.cache().delete_value(PROBE_KEY.format(app_name))
+
+
+def reset_breaker(app_name):
+    record_success(app_name)
+
+
+def is_remote_failure(resp):
+    """Whether a push outcome says the remote is unhealthy, as opposed to rejecting the request."""
+    return isinstance(resp, Exception) or resp.status_code >= 500
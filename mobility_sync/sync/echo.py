@@ -0,0 +1,97 @@
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+import frappe
+
+from mobility_sync.sync.settings import get_app_settings
+
+APPLIED_CHANGE_KEY = "mobility_sync:applied_change:{}"
+
+# How long an applied change ID is remembered. Copies of a change reaching this
+# site over another path arrive within minutes, retries within the backoff cap.
+APPLIED_CHANGE_TTL = 24 * 60 * 60
+
+
+# --------------------------------------------------------
+# Origins
+# --------------------------------------------------------
+
+def normalize_origin(url):
+    """Reduce a site URL to its lowercased host[:port], the form stored in sync paths."""
+    url = (url or "").strip().lower()
+    if "//" not in url:
+        url = f"//{url}"
+    return urlparse(url).netloc
+
+
+def get_site_origin():
+    """
+    This site's identifier in sync paths: its configured `host_name`, else the
+    site name. Not get_url(), which follows the Host header of the current
+    request and so differs between requests, workers and proxies.
+    """
+    return normalize_origin(frappe.local.conf.get("host_name") or frappe.local.site)
+
+
+def get_app_origin(app_name):
+    row = get_app_settings(app_name)
+    return normalize_origin(row.provider_url) if row else None
+
+
+def is_echo(sync_path):
+    """True when a change has already passed through this site (it would loop)."""
+    return bool(sync_path) and get_site_origin() in sync_path
+
+
+def filter_apps(apps, sync_path):
+    """Drop the apps a change has already passed through, so it is never sent back."""
+    if not sync_path:
+        return apps
+    return [app for app in apps if get_app_origin(app) not in sync_path]
+
+
+# --------------------------------------------------------
+# Applied changes
+# --------------------------------------------------------
+
+def claim_change(change_id):
+    """
+    Mark a change ID as applied on this site. Returns False if it already was,
+    e.g. a copy that reached this site over a second path of a mesh.
+    """
+    cache = frappe.cache()
+    key = cache.make_key(APPLIED_CHANGE_KEY.format(change_id))
+    return bool(cache.set(key, 1, nx=True, ex=APPLIED_CHANGE_TTL))
+
+
+def release_change(change_id):
+    """Forget a claimed change ID whose apply failed, so a retry of it is not skipped."""
+    frappe.cache().delete_value(APPLIED_CHANGE_KEY.format(change_id))
+
+
+# --------------------------------------------------------
+# Inbound writes
+# --------------------------------------------------------
+
+@contextmanager
+def inbound_change(doctype, name, change_id, sync_path):
+    """Tag the doc_events fired while applying a pushed change with where it came from."""
+    previous = frappe.flags.mobility_sync_inbound
+    frappe.flags.mobility_sync_inbound = frappe._dict(
+        doctype=doctype, name=name, change_id=change_id, sync_path=list(sync_path or [])
+    )
+    try:
+        yield
+    finally:
+        frappe.flags.mobility_sync_inbound = previous
+
+
+def get_inbound_change(doc):
+    """
+    Return {change_id, sync_path} if `doc` is being written by an inbound push.
+    Other documents written as a side effect (by hooks) are local changes.
+    """
+    inbound = frappe.flags.mobility_sync_inbound
+    if inbound and inbound.doctype == doc.doctype and inbound.name == doc.name:
+        return inbound
+    return None
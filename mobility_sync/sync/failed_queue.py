@@ -0,0 +1,159 @@
+import json
+import random
+
+import frappe
+from frappe.utils import add_to_date, cint, now_datetime
+
+from mobility_sync.sync.settings import get_sync_settings
+
+# Redis set per app of documents that have a pending failed-queue row
+PENDING_SET_KEY = "mobility_sync:pending:{}"
+
+
+def get_retry_delay(attempts):
+    """Exponential backoff with equal jitter for the given (1-based) failed attempt."""
+    settings = get_sync_settings()
+    base_delay = cint(settings.retry_base_delay) or 60
+    max_delay = cint(settings.retry_max_delay) or 3600
+    delay = min(max_delay, base_delay * 2 ** min(attempts - 1, 20))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def get_pending_member(doctype, name, method):
+    return f"{doctype}\x1f{name}\x1f{method}"
+
+
+def mark_pending(app_name, keys):
+    """Remember that (doctype, name, method) keys have a pending row, so their next success updates it."""
+    if not keys:
+        return
+    # RedisWrapper.sadd prefixes the key itself, like the raw SREM in pop_pending
+    frappe.cache().sadd(PENDING_SET_KEY.format(app_name), *(get_pending_member(*key) for key in keys))
+
+
+def pop_pending(app_name, keys):
+    """Return the subset of keys that had a pending row, forgetting them."""
+    if not keys:
+        return []
+    cache = frappe.cache()
+    set_key = cache.make_key(PENDING_SET_KEY.format(app_name))
+    pipeline = cache.pipeline()
+    for key in keys:
+        pipeline.srem(set_key, get_pending_member(*key))
+    return [key for key, removed in zip(keys, pipeline.execute(), strict=True) if removed]
+
+
+def get_origins(envelopes):
+    """
+    {(doctype, name): (change_id, sync_path JSON)} of pushed envelopes, stored on
+    their failed-queue rows so a retry sends the same change along the same path.
+    """
+    return {
+        (envelope["doctype"], envelope["name"]): (
+            envelope.get("change_id"),
+            json.dumps(envelope["sync_path"]) if envelope.get("sync_path") else None,
+        )
+        for envelope in envelopes
+    }
+
+
+def record_failures(app_name, keys, count_attempt=True, origins=None):
+    """
+    Upsert the pending row of every failed (doctype, name, method) in one statement.
+
+    There is one row per (document_type, document_name, app_name, doc_method). A new
+    failure bumps `attempts` and schedules `next_attempt_at` with backoff and jitter.
+    Once `Retry Max Attempts` pushes have failed the row is closed as failed
+    (sync_tried=1, retry_success=0).
+    A closed row is reopened with attempts=1 if the document fails again.
+
+    With `count_attempt` off (the push was never sent, e.g. the app's circuit is
+    open) the row is queued or rescheduled without using up an attempt.
+
+    `origins` (see get_origins) gives the change ID and sync path of each document.
+    The latest failure's are kept; none means a change made on this site.
+    """
+    origins = origins or {}
+    settings = get_sync_settings()
+    now = now_datetime()
+    user = frappe.session.user
+    first_attempt_at = add_to_date(now, seconds=get_retry_delay(1))
+    increment = 1 if count_attempt else 0
+    max_attempts = cint(settings.retry_max_attempts)
+    # A first failure already uses up a single allowed attempt
+    closed = 1 if increment and max_attempts == 1 else 0
+
+    values = []
+    for doctype, name, method in keys:
+        values.extend((
+            frappe.generate_hash(length=10), now, now, user, user,
+            doctype, name, app_name, method, *(origins.get((doctype, name)) or (None, None)),
+            closed, increment, first_attempt_at,
+        ))
+
+    placeholders = ", ".join(["(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, 0, 0, %s, %s)"] * len(keys))
+    frappe.db.sql(f"""
+        INSERT INTO `tabMobility Sync Failed Queue`
+            (name, creation, modified, owner, modified_by,
+             document_type, document_name, app_name, doc_method, change_id, sync_path,
+             sync_tried, retry_success, superseded, attempts, next_attempt_at)
+        VALUES {placeholders}
+        ON DUPLICATE KEY UPDATE
+            change_id = VALUES(change_id),
+            sync_path = VALUES(sync_path),
+            attempts = IF(sync_tried = 0, attempts + %s, %s),
+            sync_tried = IF(%s > 0 AND %s > 0 AND attempts >= %s, 1, 0),
+            retry_success = 0,
+            superseded = 0,
+            next_attempt_at = DATE_ADD(VALUES(modified), INTERVAL FLOOR(
+                LEAST(%s, %s * POW(2, LEAST(GREATEST(attempts - 1, 0), 20))) * (0.5 + RAND() / 2)
+            ) SECOND),
+            modified = VALUES(modified),
+            modified_by = VALUES(modified_by)
+    """, (
+        *values,
+        increment, increment,
+        increment, max_attempts, max_attempts,
+        cint(settings.retry_max_delay) or 3600, cint(settings.retry_base_delay) or 60,
+    ))
+    mark_pending(app_name, keys)
+
+
+def record_successes(app_name, keys):
+    """Close the pending rows of succeeded keys in one statement; no DB work if none is pending."""
+    keys = pop_pending(app_name, keys)
+    if not keys:
+        return False
+
+    placeholders = ", ".join(["(%s, %s, %s)"] * len(keys))
+    frappe.db.sql(f"""
+        UPDATE `tabMobility Sync Failed Queue`
+        SET sync_tried = 1, retry_success = 1, modified = %s
+        WHERE app_name = %s
+            AND sync_tried = 0
+            AND (document_type, document_name, doc_method) IN ({placeholders})
+    """, (now_datetime(), app_name, *(value for key in keys for value in key)))
+    return True
+
+
+def record_results(app_name, results, origins=None):
+    """Record [(doctype, name, method, success), ...] of a push to an app and commit (see record_failures for `origins`)."""
+    failures = list(dict.fromkeys((doctype, name, method) for doctype, name, method, success in results if not success))
+    successes = list(dict.fromkeys((doctype, name, method) for doctype, name, method, success in results if success))
+
+    written = False
+    if failures:
+        record_failures(app_name, failures, origins=origins)
+        written = True
+    if successes:
+        written = record_successes(app_name, successes) or written
+    if written:
+        frappe.db.commit()
+
+
+def queue_unsent(app_name, keys, origins=None):
+    """Queue (doctype, name, method) keys that were not sent at all, without counting an attempt, and commit."""
+    keys = list(dict.fromkeys(keys))
+    if keys:
+        record_failures(app_name, keys, count_attempt=False, origins=origins)
+        frappe.db.commit()
@@ -0,0 +1,134 @@
+import json
+
+import frappe
+from frappe.utils import get_traceback, now_datetime
+
+from mobility_sync.sync.settings import get_fast_apply_index
+
+# Kept from the first write of a row when it is upserted again
+INSERT_ONLY_COLUMNS = ("name", "creation", "owner")
+
+
+def is_fast_apply(doctype, delta=None):
+    """
+    Whether a received change of `doctype` is written directly. Deltas and
+    single doctypes always go through the ORM.
+    """
+    return not delta and doctype in get_fast_apply_index() and not frappe.get_meta(doctype).issingle
+
+
+# --------------------------------------------------------
+# Rows
+# --------------------------------------------------------
+
+def to_db_value(value):
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, (dict, list)):
+        # JSON fields arrive decoded
+        return json.dumps(value)
+    return value
+
+
+def prepare_row(meta, data, **defaults):
+    """Keep the keys of `data` that are columns of the doctype's table, filling in standard fields."""
+    columns = set(meta.get_valid_columns())
+    row = {key: to_db_value(value) for key, value in data.items() if key in columns}
+    for key, value in defaults.items():
+        if row.get(key) is None:
+            row[key] = value
+    return row
+
+
+def upsert_rows(doctype, rows):
+    """
+    INSERT ... ON DUPLICATE KEY UPDATE rows into a doctype's table, one statement
+    per distinct column set. Columns missing from a row keep their current value.
+    """
+    by_columns = {}
+    for row in rows:
+        by_columns.setdefault(tuple(row), []).append(row)
+
+    for columns, group in by_columns.items():
+        updates = ", ".join(f"`{column}` = VALUES(`{column}`)" for column in columns if column not in INSERT_ONLY_COLUMNS)
+        placeholders = ", ".join(["({})".format(", ".join(["%s"] * len(columns)))] * len(group))
+        frappe.db.sql(f"""
+            INSERT INTO `tab{doctype}` ({", ".join(f"`{column}`" for column in columns)})
+            VALUES {placeholders}
+            ON DUPLICATE KEY UPDATE {updates or "`name` = `name`"}
+        """, tuple(row[column] for row in group for column in columns))
+
+
+# --------------------------------------------------------
+# Apply
+# --------------------------------------------------------
+
+def fast_apply_doc(doctype, name, method, data):
+    """
+    Write a received document and its child rows straight to the database under
+    the sender's name: an upsert of the parent, an upsert of every child table
+    present in `data` plus removal of its other rows, and a delete for on_trash.
+    Validations, controller methods and doc_events are skipped; the doctype's
+    Fast Apply Hook runs once per batch instead (see run_post_apply_hooks).
+    """
+    meta = frappe.get_meta(doctype)
+    table_fields = meta.get_table_fields()
+
+    if method == "on_trash":
+        for df in table_fields:
+            frappe.db.delete(df.options, {"parent": name, "parenttype": doctype, "parentfield": df.fieldname})
+        frappe.db.delete(doctype, {"name": name})
+    else:
+        now = now_datetime()
+        user = frappe.session.user
+        standard = {"creation": now, "modified": now, "owner": user, "modified_by": user}
+        upsert_rows(doctype, [prepare_row(meta, dict(data, name=name), docstatus=0, **standard)])
+
+        for df in table_fields:
+            if df.fieldname not in data:
+                continue
+
+            child_meta = frappe.get_meta(df.options)
+            rows = [
+                prepare_row(
+                    child_meta,
+                    dict(child, parent=name, parenttype=doctype, parentfield=df.fieldname),
+                    name=frappe.generate_hash(length=10),
+                    idx=idx,
+                    docstatus=0,
+                    **standard
+                )
+                for idx, child in enumerate(data.get(df.fieldname) or [], start=1)
+            ]
+
+            filters = {"parent": name, "parenttype": doctype, "parentfield": df.fieldname}
+            if rows:
+                filters["name"] = ("not in", [row["name"] for row in rows])
+                upsert_rows(df.options, rows)
+            frappe.db.delete(df.options, filters)
+
+    frappe.clear_document_cache(doctype, name)
+    applied = frappe.flags.mobility_sync_fast_applied
+    if applied is None:
+        applied = frappe.flags.mobility_sync_fast_applied = {}
+    applied.setdefault(doctype, []).append(name)
+
+
+def run_post_apply_hooks():
+    """
+    Call each fast-applied doctype's hook as hook(doctype, names) with the
+    documents written since the last call; meant to run before each commit.
+    A failing hook is logged and does not undo the applied documents.
+    """
+    applied = frappe.flags.mobility_sync_fast_applied or {}
+    frappe.flags.mobility_sync_fast_applied = {}
+    hooks = get_fast_apply_index()
+
+    for doctype, names in applied.items():
+        hook = hooks.get(doctype)
+        if not hook:
+            continue
+        try:
+            frappe.get_attr(hook)(doctype, list(dict.fromkeys(names)))
+        except Exception:
+            frappe.log_error(message=get_traceback(), title=f"Sync Fast Apply Hook Failed ({doctype})")
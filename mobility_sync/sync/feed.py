@@ -0,0 +1,306 @@
+import base64
+import json
+import time
+
+import frappe
+from frappe.utils import add_to_date, cint, get_datetime, get_traceback, now_datetime
+
+from mobility_sync.sync import sessions
+from mobility_sync.sync.echo import get_site_origin
+from mobility_sync.sync.fast_apply import run_post_apply_hooks
+from mobility_sync.sync.mapping import map_document
+from mobility_sync.sync.queues import enqueue_sync_job, get_job_timeout
+from mobility_sync.sync.serializer import DEFAULT_MAX_BODY_SIZE, decompress, loads, supported_encodings
+from mobility_sync.sync.settings import get_sync_settings
+from mobility_sync.sync.versions import get_applied_versions
+
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 5000
+START_POSITION = ["1900-01-01 00:00:00", ""]
+# Pages stop this many seconds before now. `modified` is set when a document is
+# saved, not when its transaction commits, so a slow transaction can still commit
+# rows older than ones a page already returned; the lag keeps them ahead of the cursor.
+FEED_SAFETY_LAG = 30
+# A pulled change failing this many runs in a row is logged and skipped, so it
+# does not hold up the changes behind it forever
+MAX_PULL_ATTEMPTS = 3
+PULL_ATTEMPTS_KEY = "mobility_sync:pull_attempts:{}"
+PULL_ATTEMPTS_TTL = 24 * 60 * 60
+
+
+# --------------------------------------------------------
+# Cursors
+# --------------------------------------------------------
+
+def encode_cursor(position):
+    """{"changes": [modified, name], "tombstones": [modified, name]} -> opaque URL-safe string."""
+    return base64.urlsafe_b64encode(json.dumps(position, default=str).encode()).decode()
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return {"changes": START_POSITION, "tombstones": START_POSITION}
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return {"changes": list(position["changes"]), "tombstones": list(position["tombstones"])}
+    except Exception:
+        frappe.throw("Invalid change feed cursor", frappe.ValidationError)
+
+
+# --------------------------------------------------------
+# Producer
+# --------------------------------------------------------
+
+def record_tombstone(doc):
+    """Log the deletion of a synced document for the change feed, within the current transaction."""
+    now = now_datetime()
+    frappe.db.sql("""
+        INSERT INTO `tabMobility Sync Tombstone`
+            (name, creation, modified, owner, modified_by,
+             document_type, document_name, document_modified)
+        VALUES (%(name)s, %(now)s, %(now)s, %(user)s, %(user)s,
+             %(doctype)s, %(docname)s, %(doc_modified)s)
+        ON DUPLICATE KEY UPDATE
+            document_modified = VALUES(document_modified),
+            modified = VALUES(modified),
+            modified_by = VALUES(modified_by)
+    """, {
+        "name": frappe.generate_hash(length=10),
+        "now": now,
+        "user": frappe.session.user,
+        "doctype": doc.doctype,
+        "docname": doc.name,
+        "doc_modified": doc.get("modified"),
+    })
+
+
+def get_feed_page(doctype, cursor=None, limit=None):
+    """
+    Return the changes of `doctype` after `cursor`: up to `limit` documents in
+    (modified, name) order as full envelopes, the tombstones of deletions in the
+    same window, the cursor to continue from, and whether more is waiting.
+    Nothing modified in the last FEED_SAFETY_LAG seconds is returned yet.
+    """
+    from mobility_sync.sync.backfill import BACKFILL_METHOD
+
+    limit = min(cint(limit) or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+    position = decode_cursor(cursor)
+    origin = get_site_origin()
+    safe_until = add_to_date(now_datetime(), seconds=-FEED_SAFETY_LAG)
+
+    rows = frappe.db.sql(f"""
+        SELECT name, modified
+        FROM `tab{doctype}`
+        WHERE (modified, name) > (%s, %s)
+            AND modified <= %s
+        ORDER BY modified, name
+        LIMIT %s
+    """, (*position["changes"], safe_until, limit + 1), as_dict=True)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    changes = []
+    for row in rows:
+        doc = frappe.get_doc(doctype, row.name)
+        changes.append({
+            "doctype": doctype,
+            "name": row.name,
+            "doc_method": BACKFILL_METHOD,
+            "data": map_document(doc.as_dict()),
+            "change_id": f"feed:{doctype}:{row.name}:{row.modified.isoformat()}",
+            "sync_path": [origin],
+            "version": row.modified,
+        })
+    if rows:
+        position["changes"] = [rows[-1].modified, rows[-1].name]
+
+    # Deletions up to the last change of this page (all of them once changes are exhausted)
+    tombstones = frappe.db.sql("""
+        SELECT document_name, document_modified, modified
+        FROM `tabMobility Sync Tombstone`
+        WHERE document_type = %s
+            AND (modified, document_name) > (%s, %s)
+            AND modified <= %s
+        ORDER BY modified, document_name
+        LIMIT %s
+    """, (doctype, *position["tombstones"], rows[-1].modified if has_more else safe_until, limit + 1), as_dict=True)
+    has_more = has_more or len(tombstones) > limit
+    tombstones = tombstones[:limit]
+    if tombstones:
+        position["tombstones"] = [tombstones[-1].modified, tombstones[-1].document_name]
+
+    return {
+        "changes": changes,
+        "tombstones": [
+            {
+                "doctype": doctype,
+                "name": row.document_name,
+                "doc_method": "on_trash",
+                "data": {"doctype": doctype, "name": row.document_name},
+                "change_id": f"feed:{doctype}:{row.document_name}:trash:{row.modified.isoformat()}",
+                "sync_path": [origin],
+                "version": row.document_modified or row.modified,
+                "deleted_at": row.modified,
+            }
+            for row in tombstones
+        ],
+        "cursor": encode_cursor(position),
+        "has_more": has_more,
+    }
+
+
+# --------------------------------------------------------
+# Consumer
+# --------------------------------------------------------
+
+def get_pull_cursor(app_name, doctype):
+    name = frappe.db.get_value("Mobility Sync Pull Cursor", {"app_name": app_name, "document_type": doctype})
+    if name:
+        return frappe.get_doc("Mobility Sync Pull Cursor", name)
+    cursor = frappe.new_doc("Mobility Sync Pull Cursor")
+    cursor.update({"app_name": app_name, "document_type": doctype})
+    cursor.insert(ignore_permissions=True)
+    return cursor
+
+
+def fetch_feed_page(app_name, doctype, cursor, page_size):
+    """Request one change feed page from an app, compressed when both sides support it."""
+    from mobility_sync.sync.handlers import can_send, finish_send, get_request_headers, get_target_url
+    from mobility_sync.sync.tokens import get_oauth_tokens
+
+    access_token = get_oauth_tokens(app_name)
+    if not access_token:
+        frappe.throw(f"Access token not available for app {app_name}")
+
+    encoding = supported_encodings()[0]
+    url = get_target_url(app_name, "get_change_feed")
+    data = json.dumps({"doctype": doctype, "cursor": cursor, "limit": page_size, "encoding": encoding})
+    headers = get_request_headers(access_token)
+
+    # Nothing may fail between taking the send slot and finish_send()
+    if not can_send(app_name):
+        return None
+    try:
+        resp = sessions.post(app_name, url, data=data, headers=headers)
+    except Exception as e:
+        finish_send(app_name, e)
+        raise
+    if finish_send(app_name, resp):
+        # 429: pull again once the app's Retry-After has passed
+        return None
+
+    resp.raise_for_status()
+    if resp.headers.get("Content-Type", "").startswith("application/octet-stream"):
+        return loads(decompress(resp.content, encoding, DEFAULT_MAX_BODY_SIZE))
+    return resp.json()["message"]
+
+
+def count_pull_failure(envelope):
+    """Count a failed apply of a pulled change. Returns True once it has failed MAX_PULL_ATTEMPTS times."""
+    cache = frappe.cache()
+    change_id = envelope.change_id or f"{envelope.doctype}:{envelope.name}:{envelope.version}"
+    key = cache.make_key(PULL_ATTEMPTS_KEY.format(change_id))
+    pipeline = cache.pipeline()
+    pipeline.incr(key)
+    pipeline.expire(key, PULL_ATTEMPTS_TTL)
+    attempts = pipeline.execute()[0]
+    if attempts < MAX_PULL_ATTEMPTS:
+        return False
+    cache.delete_value(PULL_ATTEMPTS_KEY.format(change_id))
+    return True
+
+
+def apply_feed_page(page, cursor=None):
+    """
+    Apply a page's changes and deletions in version order in one transaction,
+    stopping at the first one that fails so that it is pulled again next time.
+    A change that has failed MAX_PULL_ATTEMPTS times is logged as skipped and
+    passed over instead, so it cannot block the feed.
+
+    Returns (applied, stopped_at): how many were applied and, after a failure,
+    the cursor just past the last change and deletion that were processed
+    (`cursor` being the one the page was requested with), else None.
+    """
+    from mobility_sync.sync.api import receive_change
+
+    envelopes = sorted(
+        [*page["changes"], *page["tombstones"]],
+        key=lambda envelope: get_datetime(envelope.get("deleted_at") or envelope["version"])
+    )
+    applied_versions = get_applied_versions([(envelope["doctype"], envelope["name"]) for envelope in envelopes])
+    position = decode_cursor(cursor)
+
+    applied = 0
+    for envelope in envelopes:
+        envelope = frappe._dict(envelope)
+        frappe.db.savepoint("mobility_sync_pull")
+        try:
+            status = receive_change(
+                envelope.doctype, envelope.name, envelope.doc_method, envelope.data, None,
+                envelope.change_id, envelope.sync_path, envelope.version,
+                applied_versions.get((envelope.doctype, envelope.name))
+            )
+        except Exception:
+            frappe.db.rollback(save_point="mobility_sync_pull")
+            if not count_pull_failure(envelope):
+                frappe.log_error(message=get_traceback(), title=f"Sync Pull Apply Failed ({envelope.doctype})")
+                run_post_apply_hooks()
+                return applied, encode_cursor(position)
+            frappe.log_error(
+                message=f"{envelope.doctype} {envelope.name} ({envelope.doc_method}) failed "
+                f"{MAX_PULL_ATTEMPTS} times and was skipped:\n\n{get_traceback()}",
+                title=f"Sync Pull Change Skipped ({envelope.doctype})"
+            )
+            status = "skipped"
+
+        applied += status == "success"
+        # Each feed is sorted by the same key, so what was processed is a prefix of it
+        if envelope.deleted_at:
+            position["tombstones"] = [str(get_datetime(envelope.deleted_at)), envelope.name]
+        else:
+            position["changes"] = [str(get_datetime(envelope.version)), envelope.name]
+    run_post_apply_hooks()
+    return applied, None
+
+
+def pull_changes(app_name, doctype, page_size=None):
+    """
+    Pull an app's change feed of `doctype` page by page, committing each page
+    together with the cursor that follows it. Stops when the feed is drained,
+    a change fails to apply (the cursor stays on it until it is skipped, see
+    apply_feed_page), the app is throttled or its circuit is open, or close to
+    the job timeout.
+    """
+    deadline = time.monotonic() + get_job_timeout() * 0.8
+    cursor = get_pull_cursor(app_name, doctype)
+
+    while time.monotonic() < deadline:
+        page = fetch_feed_page(app_name, doctype, cursor.cursor, cint(page_size) or DEFAULT_PAGE_SIZE)
+        if page is None:
+            break
+
+        applied, stopped_at = apply_feed_page(page, cursor.cursor)
+        cursor.db_set({
+            "cursor": stopped_at or page["cursor"],
+            "last_pulled_at": now_datetime(),
+            "pulled": cint(cursor.pulled) + applied,
+        })
+        frappe.db.commit()
+        if stopped_at or not page["has_more"]:
+            break
+
+
+def schedule_pulls():
+    """Scheduled every minute: one pull job per enabled (app, doctype) in Sync Settings > Pulls."""
+    for row in get_sync_settings().get("pulls") or []:
+        if not row.enabled:
+            continue
+        enqueue_sync_job(
+            "mobility_sync.sync.feed.pull_changes",
+            for_app=row.app_name,
+            app_name=row.app_name,
+            doctype=row.pull_doctype,
+            page_size=row.page_size,
+            job_id=f"mobility_sync_pull::{row.app_name}::{row.pull_doctype}",
+            deduplicate=True
+        )
@@ -1,268 +1,401 @@
-import frappe
-import requests
-import time
 import json
-from frappe.utils import get_traceback
-from datetime import date, datetime, timedelta
-from frappe.utils.background_jobs import get_queue
+import traceback
+
+import frappe
+from frappe.utils import add_to_date, cint, get_traceback, now_datetime
+
+from mobility_sync.sync import breaker, metrics, sessions, throttle
+from mobility_sync.sync.echo import get_app_origin, get_site_origin
+from mobility_sync.sync.failed_queue import get_origins, mark_pending, queue_unsent, record_results
+from mobility_sync.sync.feed import record_tombstone
+from mobility_sync.sync.links import order_envelopes
+from mobility_sync.sync.mapping import map_document
+from mobility_sync.sync.outbox import coalesce_method, record_change, try_build_envelope
+from mobility_sync.sync.queues import enqueue_sync_job, get_job_timeout, is_backpressured
+from mobility_sync.sync.serializer import encode_body, remember_accepted_encodings
+from mobility_sync.sync.settings import (
+    get_app_settings,
+    get_enabled_apps,
+    get_sync_settings,
+    is_doctype_enabled,
+)
+
+# refresh_oauth_token stays importable from here for jobs enqueued before it moved
+from mobility_sync.sync.tokens import get_oauth_tokens, refresh_oauth_token
+
+# Times a batch is re-sent after the documents the receiver reported missing
+MAX_REPAIR_ROUNDS = 2
 
 
 # --------------------------------------------------------
 # Utilities
 # --------------------------------------------------------
 
-def convert_properties(doc):
-    mapping = frappe.get_all("Mobility Sync Field Mapping", {"document_type": doc.get("doctype")}, ["source_fieldname", "target_fieldname", "exclude"])
-    
-    if not mapping:
-        return doc
-
-    converted = doc.copy()
+def get_target_url(app_name, method="receive_doc"):
+    target_url = get_app_settings(app_name).provider_url.rstrip("/")
+    return f"{target_url}/api/method/mobility_sync.sync.api.{method}"
 
-    for rule in mapping:
-        source = rule.get("source_fieldname")
-        target = rule.get("target_fieldname")
-        exclude = rule.get("exclude")
+def get_request_headers(access_token, headers=None):
+    return {
+        "Authorization": f"Bearer {access_token}",
+        "Content-Type": "application/json",
+        **(headers or {})
+    }
 
-        if not source:
-            continue
+def build_request(app_name, access_token, payload):
+    """Return requests kwargs carrying the serialized (possibly compressed) payload."""
+    body, headers = encode_body(payload, app_name)
+    return {"data": body, "headers": get_request_headers(access_token, headers)}
 
-        if exclude:
-            converted.pop(source, None)
-            continue
+def update_queue_record(doc, app_name, success, doc_method="after_insert"):
+    with metrics.timer("update_queue_record", app=app_name):
+        record_results(app_name, [(doc.get("doctype"), doc.get("name"), doc_method, success)])
 
-        if target and source in converted:
-            converted[target] = converted.pop(source)
+# --------------------------------------------------------
+# Sync Push
+# --------------------------------------------------------
 
-    return converted
+def get_max_parallel_apps():
+    return cint(get_sync_settings().max_parallel_apps) or 1
 
-def convert_dates(obj):
-    if isinstance(obj, dict):
-        return {k: convert_dates(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [convert_dates(v) for v in obj]
-    elif isinstance(obj, (datetime, date)):
-        return obj.isoformat()
+def get_response_message(resp):
+    try:
+        return resp.json().get("message") or {}
+    except Exception:
+        return {}
+
+def log_push_failure(resp, title="Sync Push Failed"):
+    """Log a failed push, where `resp` is either a Response or the exception raised while sending."""
+    if isinstance(resp, Exception):
+        frappe.log_error(message = "".join(traceback.format_exception(resp)), title = f"{title} (Exception)")
     else:
-        return obj
+        frappe.log_error(message = resp.text, title = f"{title} ({resp.status_code})")
 
-def is_doctype_enabled(doctype):
-    """Check if given doctype is enabled in Sync Settings (child table)."""
-    try:
-        settings = frappe.get_single("Sync Settings")
-    except frappe.DoesNotExistError:
+def can_send(app_name):
+    """
+    Whether a request to the app may go out now: its circuit lets it through and
+    its rate limit, in-flight cap and any Retry-After allow it. Callers queue the
+    documents without counting an attempt when this is False, and call
+    finish_send() with the outcome when it is True.
+    """
+    if not breaker.allow_request(app_name):
+        return False
+    if throttle.acquire(app_name) is not None:
+        # Give back the probe slot a half-open circuit may have handed us
+        breaker.release_probe(app_name)
         return False
+    return True
+
+def release_send(app_name):
+    """Give back what can_send() took for a request that is not sent after all."""
+    throttle.release(app_name)
+    breaker.release_probe(app_name)
+
+def finish_send(app_name, resp):
+    """Release the app's in-flight slot and record the outcome. Returns True if the app asked us to back off (429)."""
+    throttle.release(app_name)
+    metrics.record_response(app_name, resp)
+    if breaker.is_remote_failure(resp):
+        breaker.record_failure(app_name)
+    else:
+        breaker.record_success(app_name)
 
-    for row in settings.get("doctypes") or []:
-        if row.sync_doctype == doctype and row.enabled:
-            return True
+    if not isinstance(resp, Exception) and resp.status_code == 429:
+        throttle.set_retry_after(app_name, throttle.parse_retry_after(resp))
+        return True
     return False
 
-def is_refresh_job_pending(app_name: str, queue_name: str = "long") -> bool:
-    job_id = f"refresh_oauth_token::{app_name}"
-    q = get_queue(queue_name)
+def push_to_remote(doc, doc_method, app_name=None):
+    """
+    Push changes of a document to the remote instances.
+    All apps are sent to concurrently (up to `Max Parallel Apps` in flight) and each
+    app's outcome is recorded in the failed queue on its own; failures are retried
+    later by handle_failed_queues with backoff instead of sleeping in the worker.
+    """
+    enabled_apps = get_enabled_apps(doc.get("doctype"))
+    if not enabled_apps:
+        return
+    doctype = doc.get("doctype")
+    with metrics.profile(f"push_to_remote {doctype}"), metrics.timer("push_to_remote", doctype=doctype):
+        _push_to_remote(doc, doc_method, [app_name] if app_name else enabled_apps)
 
-    job = q.fetch_job(job_id)
-    if not job:
-        return False
 
-    return job.get_status() in {"queued", "started", "deferred", "scheduled"}
+def _push_to_remote(doc, doc_method, apps):
+    with metrics.timer("map_document", doctype=doc.get("doctype")):
+        data = map_document(doc)
+    change_id = frappe.generate_hash(length=20)
+    sync_path = [get_site_origin()]
+    calls = []
+    for app in apps:
+        if not can_send(app):
+            # Circuit open or throttled: queue it for the retry drainer without touching the network
+            queue_unsent(app, [(doc.get("doctype"), doc.get("name"), doc_method)])
+            continue
 
-def get_apps(setting_doc):
-    if not setting_doc.get("apps"):
-        return frappe.get_all("Sync Settings Apps", fields=["app_name"], pluck="app_name")
-    return json.loads(setting_doc.get("apps"))
+        access_token = get_oauth_tokens(app)
+        if not access_token:
+            release_send(app)
+            frappe.log_error(f"Access token not available for app {app}", "Sync Push Failed")
+            update_queue_record(doc, app, False, doc_method)
+            continue
 
-def get_oauth_tokens(app_name):
+        payload = {
+            "doctype": doc.get("doctype"),
+            "name": doc.get("name"),
+            "doc_method": doc_method,
+            "data": data,
+            "change_id": change_id,
+            "sync_path": sync_path,
+            "version": doc.get("modified")
+        }
+        calls.append((app, get_target_url(app), build_request(app, access_token, payload)))
+
+    for call, resp in zip(calls, sessions.post_many(calls, get_max_parallel_apps()), strict=True):
+        if finish_send(call[0], resp):
+            queue_unsent(call[0], [(doc.get("doctype"), doc.get("name"), doc_method)])
+            continue
+        success = not isinstance(resp, Exception) and resp.status_code == 200
+        if success:
+            remember_accepted_encodings(call[0], resp)
+            message = get_response_message(resp)
+            if message.get("status") == "missing_link":
+                # Retried by the drainer together with (and after) the documents it needs
+                success = False
+                queue_missing_links(call[0], message.get("missing"))
+        else:
+            log_push_failure(resp)
+        update_queue_record(doc, call[0], success, doc_method)
+
+
+
+# --------------------------------------------------------
+# Batched Push
+# --------------------------------------------------------
+
+def push_batches(batches, repair_rounds=MAX_REPAIR_ROUNDS):
     """
-    Return a valid access_token from the Token Cache (Connected App).
-    If expired, enqueue token refresh to avoid DB locks.
+    Push {app_name: [envelope, ...]} to every app concurrently, one request per app,
+    and record each document's per-app result.
+
+    Each batch is sent in dependency order, led by the documents it links to that
+    are still waiting in the app's failed queue. Documents the app reports as
+    "missing_link" are pushed again right after the documents they are missing,
+    up to `repair_rounds` times, instead of waiting for a blind retry.
     """
-    # to be removed later
-    # settings = frappe.get_single("Sync Settings")
-    # connected_app_name = settings.incoming_connected_app
-
-    token_cache_list = frappe.get_all(
-        "Token Cache",
-        filters={"connected_app": app_name},
-        fields=["name", "access_token", "refresh_token", "expires_in", "creation"],
-        limit=1,
-        order_by="creation desc"
-    )
-
-    if not token_cache_list:
-        return None
+    with metrics.profile("push_batches"), metrics.timer("push_batches"):
+        _push_batches(batches, repair_rounds)
 
-    token_doc = frappe.get_doc("Token Cache", token_cache_list[0].name)
-    expires_in = token_doc.expires_in or 0
-    created_at = token_doc.creation
-
-    # Check expiration
-    if expires_in and (datetime.now() > created_at + timedelta(seconds=expires_in)):
-        # Enqueue token refresh in separate transaction
-        if not is_refresh_job_pending(app_name):
-            frappe.enqueue(
-                "mobility_sync.sync.handlers.refresh_oauth_token",
-                connected_app_name=app_name,
-                queue="long",
-                job_id= f"refresh_oauth_token::{app_name}",
-                timeout=120
-            )
 
-    return token_doc.get_password("access_token")
+def _push_batches(batches, repair_rounds):
+    ordered, calls = {}, []
+    for app_name, envelopes in batches.items():
+        # One app's batch failing to build must not hold back the others
+        try:
+            ordered[app_name], call = prepare_batch(app_name, envelopes)
+        except Exception:
+            frappe.log_error(message=get_traceback(), title=f"Sync Batch Push Failed ({app_name})")
+            record_batch_failure(app_name, envelopes)
+            continue
+        if call:
+            calls.append(call)
+
+    repairs = {}
+    for (app_name, _url, _kwargs), resp in zip(calls, sessions.post_many(calls, get_max_parallel_apps()), strict=True):
+        envelopes = ordered[app_name]
+        if finish_send(app_name, resp):
+            queue_unsent(app_name, get_batch_keys(envelopes), get_origins(envelopes))
+            continue
 
-def refresh_oauth_token(connected_app_name):
-    """Refresh OAuth token in a separate transaction to avoid locks."""
-    retries = 3
-    while retries > 0:
         try:
-            token_cache_list = frappe.get_all(
-                "Token Cache",
-                filters={"connected_app": connected_app_name},
-                fields=["name", "access_token", "refresh_token", "expires_in", "creation"],
-                limit=1,
-                order_by="creation desc"
-            )
-            if not token_cache_list:
-                return
+            if repair := record_batch_response(app_name, envelopes, resp, repair_rounds):
+                repairs[app_name] = repair
+        except Exception:
+            frappe.log_error(message=get_traceback(), title=f"Sync Batch Push Failed ({app_name})")
+            record_batch_failure(app_name, envelopes)
 
-            token_doc = frappe.get_doc("Token Cache", token_cache_list[0].name)
-            refresh_token = token_doc.get_password("refresh_token")
-            if not refresh_token:
-                return
+    if repairs:
+        push_batches(repairs, repair_rounds - 1)
 
-            connected_app = frappe.get_doc("Connected App", connected_app_name)
-            refresh_url = connected_app.token_uri
 
-            resp = requests.post(refresh_url, data={
-                "grant_type": "refresh_token",
-                "refresh_token": refresh_token,
-                "client_id": connected_app.client_id,
-                "client_secret": connected_app.client_secret,
-            }, timeout=30)
+def get_batch_keys(envelopes):
+    return [(envelope["doctype"], envelope["name"], envelope["doc_method"]) for envelope in envelopes]
 
-            if resp.status_code != 200:
-                frappe.log_error(message = resp.text, title = "Token Refresh Failed")
-                return
 
-            tokens = resp.json()
+def record_batch_failure(app_name, envelopes):
+    record_results(app_name, [(*key, False) for key in get_batch_keys(envelopes)], get_origins(envelopes))
 
-            # Update token cache without row locks
-            frappe.db.begin()
-            frappe.db.sql("""
-                UPDATE `tabToken Cache`
-                SET access_token=%s,
-                    refresh_token=COALESCE(%s, refresh_token),
-                    expires_in=COALESCE(%s, expires_in)
-                WHERE name=%s
-            """, (tokens.get("access_token"), tokens.get("refresh_token"),
-                  tokens.get("expires_in"), token_doc.name))
-            frappe.db.commit()
-            return
 
-        except Exception:
-            frappe.db.rollback()
-            retries -= 1
-            if retries == 0:
-                frappe.log_error(message = get_traceback(), title = "Token Refresh Failed After Retry")
-                return
+def prepare_batch(app_name, envelopes):
+    """
+    Order an app's batch and take a send slot for it. Returns (envelopes, call),
+    where call is None when the batch was queued or failed without being sent.
+
+    Changes that already passed through the app (e.g. a retried forwarded change)
+    are dropped and counted as delivered, as the app would skip them anyway.
+    """
+    origin = get_app_origin(app_name)
+    echoes = [envelope for envelope in envelopes if origin and origin in (envelope.get("sync_path") or ())]
+    if echoes:
+        record_results(app_name, [(*key, True) for key in get_batch_keys(echoes)])
+        envelopes = [envelope for envelope in envelopes if envelope not in echoes]
+        if not envelopes:
+            return envelopes, None
+
+    envelopes = order_envelopes(add_pending_dependencies(app_name, envelopes))
+    if not can_send(app_name):
+        queue_unsent(app_name, get_batch_keys(envelopes), get_origins(envelopes))
+        return envelopes, None
+
+    try:
+        access_token = get_oauth_tokens(app_name)
+        # Envelopes are already mapped by the outbox dispatcher
+        request = build_request(app_name, access_token, {"docs": envelopes}) if access_token else None
+        url = get_target_url(app_name, "receive_docs")
+    except Exception:
+        release_send(app_name)
+        raise
+
+    if not request:
+        release_send(app_name)
+        frappe.log_error(f"Access token not available for app {app_name}", "Sync Push Failed")
+        record_batch_failure(app_name, envelopes)
+        return envelopes, None
+    return envelopes, (app_name, url, request)
+
+
+def read_batch_results(resp, envelopes, title="Sync Batch Push Failed"):
+    """
+    Return one result per envelope of a receive_docs response. A failed request or
+    a body that is not the expected JSON fails the whole batch, and documents the
+    receiver returned no result for count as failed, so none of them is lost.
+    """
+    if isinstance(resp, Exception) or resp.status_code != 200:
+        log_push_failure(resp, title)
+        return [{}] * len(envelopes)
+
+    try:
+        results = (resp.json().get("message") or {}).get("results") or []
+    except (ValueError, AttributeError):
+        frappe.log_error(message=resp.text, title=f"{title} (Invalid Response)")
+        return [{}] * len(envelopes)
+
+    if len(results) != len(envelopes):
+        frappe.log_error(
+            message=f"Sent {len(envelopes)} documents, got {len(results)} results:\n{resp.text}",
+            title=f"{title} (Result Count Mismatch)"
+        )
+        results = results[:len(envelopes)] + [{}] * (len(envelopes) - len(results))
+    return results
+
+
+def record_batch_response(app_name, envelopes, resp, repair_rounds):
+    """Record the per-document outcome of a batch. Returns the repair batch to push next, if any."""
+    results = read_batch_results(resp, envelopes)
+    if not isinstance(resp, Exception) and resp.status_code == 200:
+        remember_accepted_encodings(app_name, resp)
+
+    outcomes, dependents, missing = [], [], {}
+    for envelope, result in zip(envelopes, results, strict=True):
+        if result.get("status") == "missing_link" and repair_rounds > 0:
+            dependents.append(envelope)
+            missing.update((tuple(key), None) for key in result.get("missing") or ())
+        else:
+            outcomes.append((envelope["doctype"], envelope["name"], envelope["doc_method"], result.get("status") == "success"))
+
+    repair = None
+    if dependents:
+        repair = build_repair_batch(app_name, dependents, missing)
+        if not repair:
+            outcomes.extend((envelope["doctype"], envelope["name"], envelope["doc_method"], False) for envelope in dependents)
+    record_results(app_name, outcomes, get_origins(envelopes))
+    return repair
 
-def update_queue_record(doc, app_name, success, doc_method="after_insert"):
-    if queue_record_name := frappe.db.exists(
-        "Mobility Sync Failed Queue", 
-        {
-            "document_type": doc.get("doctype"),
-            "document_name": doc.get("name"),
-            "app_name": app_name,
-            "doc_method": doc_method,
-            "sync_tried": 0
-        }):
-        queue_doc = frappe.get_doc("Mobility Sync Failed Queue", queue_record_name)
-    else:
-        queue_doc = None
-    if not success:
-        if queue_doc:
-            queue_doc.db_set("sync_tried", 1)
-            queue_doc.db_set("retry_success", 0)
-        frappe.get_doc({
-            "doctype": "Mobility Sync Failed Queue",
-            "document_type": doc.get("doctype"),
-            "document_name": doc.get("name"),
-            "app_name": app_name,
-            "doc_method": doc_method,
-            "sync_tried": 0,
-            "retry_success": 0
-        }).insert(ignore_permissions=True)
-    else:
-        if queue_doc:
-            queue_doc.db_set("sync_tried", 1)
-            queue_doc.db_set("retry_success", 1)
-    frappe.db.commit()
 
 # --------------------------------------------------------
-# Sync Push
+# Dependencies
 # --------------------------------------------------------
 
-def push_to_remote(doc, doc_method, max_retries=1, retry_delay=5, app_name=None):
-    """Push changes of a document to the remote instance asynchronously with retry."""
-    setting_name = frappe.db.get_value(
-        "Sync Settings Detail",
-        {"parent": "Sync Settings", "sync_doctype": doc.get("doctype")},
-        "name"
-    )
-    if not setting_name:
-        return
-    settings = frappe.get_doc("Sync Settings Detail", setting_name)
-    if not app_name:
-        apps = get_apps(settings)
-    else:
-        apps = [app_name]
-    for app in apps:
-        access_token = get_oauth_tokens(app)
-        if not access_token:
-            frappe.log_error(f"Access token not available for app {app}", "Sync Push Failed")
-            update_queue_record(doc, app, False, doc_method)
-            time.sleep(retry_delay)
+def add_pending_dependencies(app_name, envelopes):
+    """
+    Put the documents a batch requires that are still pending in the app's failed
+    queue at its head, in one query. They go out with their pending method, so
+    their success closes their failed-queue row.
+    """
+    in_batch = {(envelope["doctype"], envelope["name"]) for envelope in envelopes}
+    required = list(dict.fromkeys(
+        tuple(key) for envelope in envelopes for key in envelope.get("requires") or ()
+        if tuple(key) not in in_batch
+    ))
+    if not required:
+        return envelopes
+
+    placeholders = ", ".join(["(%s, %s)"] * len(required))
+    rows = frappe.db.sql(f"""
+        SELECT document_type, document_name, doc_method, change_id, sync_path
+        FROM `tabMobility Sync Failed Queue`
+        WHERE app_name = %s
+            AND sync_tried = 0
+            AND (document_type, document_name) IN ({placeholders})
+        ORDER BY creation
+    """, (app_name, *(value for key in required for value in key)), as_dict=True)
+
+    # The row whose method wins also gives the change ID and path to send
+    pending = {}
+    for row in rows:
+        key = (row.document_type, row.document_name)
+        if key not in pending or coalesce_method(pending[key].doc_method, row.doc_method) != pending[key].doc_method:
+            pending[key] = row
+
+    dependencies = []
+    for row in pending.values():
+        if row.doc_method == "on_trash":
             continue
+        envelope = try_build_envelope(frappe._dict(row, changed_fields=None))
+        if envelope:
+            dependencies.append(envelope)
+    return dependencies + envelopes
 
-        target_url = frappe.db.get_value("Sync Settings Apps", {"parent": "Sync Settings", "app_name": app}, "provider_url").rstrip("/")
-        url = f"{target_url}/api/method/mobility_sync.sync.api.receive_doc"
 
-        headers = {
-            "Authorization": f"Bearer {access_token}",
-            "Content-Type": "application/json"
-        }
-        data = convert_dates(doc)
-        data = convert_properties(data)
-        payload = {
-            "doctype": doc.get("doctype"),
-            "name": doc.get("name"),
-            "doc_method": doc_method,
-            "data": data
-        }
+def queue_missing_links(app_name, missing):
+    """Queue the documents an app reported missing that this site syncs to it."""
+    from mobility_sync.sync.backfill import BACKFILL_METHOD
 
-        retries = 0
-        success = True
-        while retries < max_retries:
-            try:
-                resp = requests.post(url, json=payload, headers=headers, timeout=30)
-                if resp.status_code == 200:
-                    success = True
-                    break  # Success
-                else:
-                    frappe.log_error(message = resp.text, title = f"Sync Push Failed ({resp.status_code})")
-                    success = False
-            except Exception:
-                frappe.log_error(message = get_traceback(), title = "Sync Push Exception")
-                success = False
+    queue_unsent(app_name, [
+        (doctype, name, BACKFILL_METHOD)
+        for doctype, name in missing or ()
+        if app_name in get_enabled_apps(doctype) and frappe.db.exists(doctype, name)
+    ])
 
-            retries += 1
-            if retries < max_retries:
-                time.sleep(retry_delay)  # Wait before next retry
-        
-        update_queue_record(doc, app, success, doc_method)
 
+def build_repair_batch(app_name, dependents, missing):
+    """
+    Return the documents an app reported missing (those this site has and syncs
+    to the app) followed by the documents that need them, or None if none of
+    the missing documents can be sent from here.
+    """
+    from mobility_sync.sync.backfill import BACKFILL_METHOD
 
+    dependencies = []
+    for doctype, name in missing:
+        if app_name not in get_enabled_apps(doctype):
+            continue
+        envelope = try_build_envelope(frappe._dict(
+            document_type=doctype, document_name=name, doc_method=BACKFILL_METHOD, changed_fields=None
+        ))
+        if envelope:
+            dependencies.append(envelope)
+
+    if not dependencies:
+        frappe.log_error(
+            message="\n".join(
+                [f"{envelope['doctype']} {envelope['name']}" for envelope in dependents]
+                + ["", "Missing on the app and not synced from this site:"]
+                + [f"{doctype} {name}" for doctype, name in missing]
+            ),
+            title=f"Sync Missing Links ({app_name})"
+        )
+        return None
+    return dependencies + dependents
 
 # --------------------------------------------------------
 # Event handler
@@ -272,38 +405,167 @@ def handle_doc_event(doc, method):
     """Hook entrypoint for doc_events"""
     if not is_doctype_enabled(doc.doctype):
         return
-    # Enqueue push to remote to avoid DB locks
-    frappe.enqueue(
-        "mobility_sync.sync.handlers.push_to_remote",
-        doc=doc.as_dict(),
-        doc_method=method,
-        queue="long",
-        timeout=300
-    )
+    with metrics.timer("handle_doc_event", doctype=doc.doctype):
+        if method == "on_trash":
+            # Deletions are served on the change feed from their tombstones
+            record_tombstone(doc)
+        if get_enabled_apps(doc.doctype):
+            # Record the change in the outbox; the dispatcher loads the document at send time
+            record_change(doc, method)
+
+def get_due_failed_rows(app_name, cursor, page_size):
+    """Return the next page of due, pending failed-queue rows of an app after `cursor` (creation, name)."""
+    return frappe.db.sql("""
+        SELECT name, creation, document_type, document_name, doc_method
+        FROM `tabMobility Sync Failed Queue`
+        WHERE app_name = %(app_name)s
+            AND sync_tried = 0
+            AND (next_attempt_at IS NULL OR next_attempt_at <= %(now)s)
+            AND (creation, name) > (%(creation)s, %(name)s)
+        ORDER BY creation, name
+        LIMIT %(page_size)s
+    """, {
+        "app_name": app_name,
+        "now": now_datetime(),
+        "creation": cursor[0],
+        "name": cursor[1],
+        "page_size": page_size,
+    }, as_dict=True)
+
+def collect_due_documents(app_name, limit, page_size=1000):
+    """
+    Page through an app's due rows and dedupe them per document.
+
+    Returns ({(doctype, name): (method, row_name)}, [superseded row names]) with at
+    most `limit` documents. The method of a document is coalesced the same way the
+    outbox does it, and only one row per document stays pending.
+    """
+    documents = {}
+    superseded = []
+    cursor = ("1900-01-01", "")
+    while rows := get_due_failed_rows(app_name, cursor, page_size):
+        for row in rows:
+            key = (row.document_type, row.document_name)
+            if key in documents:
+                method, row_name = documents[key]
+                new_method = coalesce_method(method, row.doc_method)
+                if new_method == method:
+                    superseded.append(row.name)
+                else:
+                    superseded.append(row_name)
+                    documents[key] = (new_method, row.name)
+            elif len(documents) < limit:
+                documents[key] = (row.doc_method, row.name)
+        cursor = (rows[-1].creation, rows[-1].name)
+        if len(documents) >= limit:
+            # Later duplicates of released documents are superseded on a later tick
+            break
+    return documents, superseded
 
 def handle_failed_queues():
-    """Process failed sync queues."""
-    failed_queues = frappe.get_all(
-        "Mobility Sync Failed Queue",
-        filters={"sync_tried": 0},
-        fields=["document_type", "document_name", "app_name", "doc_method"],
-        limit=0
-    )
-
-    for queue in failed_queues:
-        if frappe.db.exists(queue.document_type, queue.document_name):
-            doc = frappe.get_doc(queue.document_type, queue.document_name)
-            doc_dict = doc.as_dict()
+    """
+    Release due failed-queue rows to batched retry jobs.
+
+    Rows are read page by page with a (creation, name) cursor and deduplicated per
+    document, keeping only the latest method. Each app releases at most `Retry
+    Limit Per Tick` documents per run. Released rows are leased (next_attempt_at
+    is pushed past the job timeout) so rows whose job is still queued or running
+    are skipped by the next ticks.
+
+    Apps whose circuit is open, that asked us to back off (429), or whose sync
+    queue is over `Backpressure Queue Depth` are skipped. A half-open app gets a
+    single batch, which becomes the probe deciding whether its backlog is released.
+    """
+    settings = get_sync_settings()
+    limit = cint(settings.retry_limit_per_tick) or 500
+    batch_size = cint(settings.batch_size) or 100
+    lease_until = add_to_date(now_datetime(), seconds=2 * get_job_timeout())
+
+    for app_name in frappe.get_all("Sync Settings Apps", filters={"parent": "Sync Settings"}, pluck="app_name"):
+        state = breaker.get_breaker_state(app_name).state
+        if state == breaker.OPEN or throttle.get_retry_after(app_name) or is_backpressured(app_name):
+            continue
+
+        documents, superseded = collect_due_documents(app_name, batch_size if state == breaker.HALF_OPEN else limit)
+        if superseded:
+            frappe.db.sql("""
+                UPDATE `tabMobility Sync Failed Queue`
+                SET sync_tried = 1, superseded = 1
+                WHERE name IN %(names)s
+            """, {"names": superseded})
+        if not documents:
+            frappe.db.commit()
+            continue
+
+        frappe.db.sql("""
+            UPDATE `tabMobility Sync Failed Queue`
+            SET next_attempt_at = %(lease_until)s
+            WHERE name IN %(names)s
+        """, {"lease_until": lease_until, "names": [row_name for _method, row_name in documents.values()]})
+        frappe.db.commit()
+
+        items = [[doctype, name, method] for (doctype, name), (method, _row_name) in documents.items()]
+        # Rebuilds the pending set if Redis lost it, so the retry's success closes the row
+        mark_pending(app_name, [tuple(item) for item in items])
+        for start in range(0, len(items), batch_size):
+            enqueue_sync_job(
+                "mobility_sync.sync.handlers.retry_batch",
+                for_app=app_name,
+                app_name=app_name,
+                items=items[start:start + batch_size]
+            )
+
+def get_failed_origins(app_name, keys):
+    """Return {(doctype, name, method): (change_id, sync_path)} stored on the pending rows of `keys`."""
+    if not keys:
+        return {}
+    placeholders = ", ".join(["(%s, %s, %s)"] * len(keys))
+    rows = frappe.db.sql(f"""
+        SELECT document_type, document_name, doc_method, change_id, sync_path
+        FROM `tabMobility Sync Failed Queue`
+        WHERE app_name = %s
+            AND sync_tried = 0
+            AND (document_type, document_name, doc_method) IN ({placeholders})
+    """, (app_name, *(value for key in keys for value in key)), as_dict=True)
+    return {(row.document_type, row.document_name, row.doc_method): (row.change_id, row.sync_path) for row in rows}
+
+
+def retry_batch(app_name, items):
+    """
+    Retry [[doctype, name, method], ...] for an app, loading each document's current
+    state. A change forwarded from another site keeps its change ID and sync path,
+    so the retry is deduplicated by the receiver and never sent back to its origin.
+    """
+    keys = [tuple(item) for item in items]
+    origins = get_failed_origins(app_name, keys)
+    envelopes, failures = [], []
+    for doctype, name, method in keys:
+        change_id, sync_path = origins.get((doctype, name, method)) or (None, None)
+        envelope = try_build_envelope(frappe._dict(
+            document_type=doctype,
+            document_name=name,
+            doc_method=method,
+            changed_fields=None,
+            change_id=change_id,
+            sync_path=sync_path
+        ))
+        if envelope:
+            envelopes.append(envelope)
+        elif envelope is False:
+            failures.append((doctype, name, method, False))
         else:
-            doc_dict = frappe._dict({
-                "doctype": queue.document_type,
-                "name": queue.document_name
-            })
-        frappe.enqueue(
-            "mobility_sync.sync.handlers.push_to_remote",
-            doc=doc_dict,
-            doc_method=queue.doc_method,
-            app_name=queue.app_name,
-            queue="long",
-            timeout=300
-        )
\ No newline at end of file
+            # Deleted since it failed; a pending on_trash supersedes this row
+            frappe.db.sql("""
+                UPDATE `tabMobility Sync Failed Queue`
+                SET sync_tried = 1, superseded = 1
+                WHERE document_type = %s AND document_name = %s AND app_name = %s
+                    AND doc_method = %s AND sync_tried = 0
+            """, (doctype, name, app_name, method))
+
+    if failures:
+        record_results(app_name, failures, {
+            (doctype, name): origins.get((doctype, name, method)) for doctype, name, method, _success in failures
+        })
+    if envelopes:
+        push_batches({app_name: envelopes})
+    frappe.db.commit()
@@ -0,0 +1,97 @@
+import frappe
+
+from mobility_sync.sync.settings import is_doctype_enabled
+
+
+class MissingLinkError(frappe.LinkValidationError):
+    """A received document links to documents that do not exist here (yet)."""
+
+    def __init__(self, missing):
+        self.missing = missing
+        super().__init__("Missing links: " + ", ".join(f"{doctype} {name}" for doctype, name in missing))
+
+
+# --------------------------------------------------------
+# Links of a document
+# --------------------------------------------------------
+
+def iter_links(meta, data):
+    """Yield (doctype, name) of every Link and Dynamic Link value in `data` and its child rows."""
+    for df in meta.get_link_fields():
+        if value := data.get(df.fieldname):
+            yield df.options, value
+    for df in meta.get_dynamic_link_fields():
+        if (value := data.get(df.fieldname)) and (doctype := data.get(df.options)):
+            yield doctype, value
+
+    for df in meta.get_table_fields():
+        rows = data.get(df.fieldname) or []
+        if not rows:
+            continue
+        child_meta = frappe.get_meta(df.options)
+        for row in rows:
+            yield from iter_links(child_meta, row)
+
+
+def get_dependencies(doc):
+    """
+    Return [[doctype, name], ...] of the documents `doc` links to that are synced
+    too, so a target has to have them before it can accept `doc`.
+    """
+    dependencies = {}
+    for doctype, name in iter_links(frappe.get_meta(doc.doctype), doc.as_dict()):
+        if (doctype, name) != (doc.doctype, doc.name) and is_doctype_enabled(doctype):
+            dependencies[(doctype, name)] = None
+    return [list(key) for key in dependencies]
+
+
+def find_missing_links(doctype, data):
+    """Return [[doctype, name], ...] of the documents linked from received `data` that do not exist here."""
+    by_doctype = {}
+    for link_doctype, name in iter_links(frappe.get_meta(doctype), data):
+        by_doctype.setdefault(link_doctype, set()).add(name)
+
+    missing = []
+    for link_doctype, names in by_doctype.items():
+        meta = frappe.get_meta(link_doctype)
+        if meta.issingle or meta.is_virtual:
+            continue
+        existing = set(frappe.get_all(link_doctype, filters={"name": ("in", list(names))}, pluck="name"))
+        missing.extend([link_doctype, name] for name in sorted(names - existing))
+    return missing
+
+
+# --------------------------------------------------------
+# Ordering
+# --------------------------------------------------------
+
+def order_envelopes(envelopes):
+    """
+    Order a batch so every envelope comes after the ones it `requires` in the
+    same batch, keeping the original order otherwise. Cycles are left as they are.
+    """
+    position = {(envelope["doctype"], envelope["name"]): index for index, envelope in enumerate(envelopes)}
+    if not any(envelope.get("requires") for envelope in envelopes):
+        return envelopes
+
+    ordered, done, visiting = [], set(), set()
+    for first in range(len(envelopes)):
+        if first in done:
+            continue
+        # Iterative depth-first walk: dependency chains (e.g. trees) can be long
+        stack = [(first, iter(envelopes[first].get("requires") or ()))]
+        visiting.add(first)
+        while stack:
+            index, requires = stack[-1]
+            for doctype, name in requires:
+                dependency = position.get((doctype, name))
+                if dependency is not None and dependency not in done and dependency not in visiting:
+                    visiting.add(dependency)
+                    stack.append((dependency, iter(envelopes[dependency].get("requires") or ())))
+                    break
+            else:
+                stack.pop()
+                visiting.discard(index)
+                done.add(index)
+                ordered.append(envelopes[index])
+    return ordered
@@ -0,0 +1,93 @@
+import frappe
+
+MAPPING_PLAN_CACHE_KEY = "mobility_sync:mapping_plan"
+
+EMPTY_PLAN = {"rename": {}, "exclude": frozenset(), "tables": {}}
+
+
+# --------------------------------------------------------
+# Plans
+# --------------------------------------------------------
+
+def _compile_plan(doctype, rules_by_doctype, seen=()):
+    rename = {}
+    exclude = set()
+    for rule in rules_by_doctype.get(doctype) or []:
+        if not rule.source_fieldname:
+            continue
+        if rule.exclude:
+            exclude.add(rule.source_fieldname)
+        elif rule.target_fieldname:
+            rename[rule.source_fieldname] = rule.target_fieldname
+
+    tables = {}
+    for df in frappe.get_meta(doctype).get_table_fields():
+        if df.options in seen:
+            continue
+        child_plan = _compile_plan(df.options, rules_by_doctype, (*seen, doctype))
+        if child_plan is not EMPTY_PLAN:
+            tables[df.fieldname] = child_plan
+
+    if not (rename or exclude or tables):
+        return EMPTY_PLAN
+    # An excluded field is never renamed
+    rename = {source: target for source, target in rename.items() if source not in exclude}
+    return {"rename": rename, "exclude": frozenset(exclude), "tables": tables}
+
+
+def build_mapping_plan(doctype):
+    """
+    Compile the Field Mapping rules of a doctype, and of its child doctypes, into
+    {"rename": {source: target}, "exclude": frozenset, "tables": {table_field: plan}}.
+    """
+    rules_by_doctype = {}
+    for rule in frappe.get_all(
+        "Mobility Sync Field Mapping",
+        filters={"parent": "Sync Settings"},
+        fields=["document_type", "source_fieldname", "target_fieldname", "exclude"],
+        order_by="idx asc"
+    ):
+        rules_by_doctype.setdefault(rule.document_type, []).append(rule)
+
+    return _compile_plan(doctype, rules_by_doctype)
+
+
+def get_mapping_plan(doctype):
+    """Return the cached mapping plan of a doctype (cleared when Sync Settings is saved)."""
+    return frappe.cache().hget(MAPPING_PLAN_CACHE_KEY, doctype, generator=lambda: build_mapping_plan(doctype))
+
+
+def clear_mapping_plans():
+    frappe.cache().delete_value(MAPPING_PLAN_CACHE_KEY)
+
+
+# --------------------------------------------------------
+# Transform
+# --------------------------------------------------------
+
+def apply_plan(data, plan):
+    """
+    Rename/exclude fields and recurse into mapped child tables in a single walk.
+    Dates, Decimals etc. are left as they are for the serializer to encode natively.
+    """
+    if plan is EMPTY_PLAN or not (plan["rename"] or plan["exclude"] or plan["tables"]):
+        return data
+
+    rename = plan["rename"]
+    exclude = plan["exclude"]
+    tables = plan["tables"]
+
+    converted = {}
+    for key, value in data.items():
+        if key in exclude:
+            continue
+        if isinstance(value, list) and key in tables:
+            child_plan = tables[key]
+            value = [apply_plan(row, child_plan) if isinstance(row, dict) else row for row in value]
+        converted[rename.get(key, key)] = value
+    return converted
+
+
+def map_document(data, doctype=None):
+    """Return the wire representation of a document dict for its doctype."""
+    return apply_plan(data, get_mapping_plan(doctype or data.get("doctype")))
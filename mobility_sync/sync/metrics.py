@@ -0,0 +1,293 @@
+import cProfile
+import io
+import pstats
+import random
+import time
+from contextlib import contextmanager
+
+import frappe
+from frappe.utils import cint, flt
+
+from mobility_sync.sync.settings import get_sync_settings
+
+METRICS_CACHE_KEY = "mobility_sync:metrics"
+
+# Upper bounds (seconds) of the latency histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+STAGE_SECONDS = "mobility_sync_stage_seconds"
+HTTP_SECONDS = "mobility_sync_http_request_seconds"
+HTTP_RESPONSES = "mobility_sync_http_responses_total"
+RECEIVED_DOCUMENTS = "mobility_sync_received_documents_total"
+
+HELP = {
+    STAGE_SECONDS: ("histogram", "Time spent in each stage of the sync pipeline"),
+    HTTP_SECONDS: ("histogram", "Latency of requests to other sites"),
+    HTTP_RESPONSES: ("counter", "Responses from other sites by HTTP status (error = no response)"),
+    RECEIVED_DOCUMENTS: ("counter", "Documents received from other sites by result"),
+}
+
+
+# --------------------------------------------------------
+# Recording
+# --------------------------------------------------------
+# Observations are summed per request or job in frappe.local and written to a
+# single Redis hash in one pipeline by flush() (after_request / after_job), so
+# the hot path never waits on Redis. Fields are "<sample name>|<labels>".
+
+def _label_string(labels):
+    return ",".join(
+        '{}="{}"'.format(key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " "))
+        for key, value in sorted(labels.items())
+        if value is not None
+    )
+
+
+def _add(field, value):
+    pending = getattr(frappe.local, "mobility_sync_metrics", None)
+    if pending is None:
+        pending = frappe.local.mobility_sync_metrics = {}
+    pending[field] = pending.get(field, 0) + value
+
+
+def inc(name, value=1, **labels):
+    _add(f"{name}|{_label_string(labels)}", value)
+
+
+def observe(name, seconds, **labels):
+    """Add one observation to a histogram; the bucket counts are made cumulative on export."""
+    label_string = _label_string(labels)
+    le = next((bound for bound in BUCKETS if seconds <= bound), "+Inf")
+    _add(f"{name}_count|{label_string}", 1)
+    _add(f"{name}_sum|{label_string}", seconds)
+    _add(f"{name}_bucket|{label_string}|{le}", 1)
+
+
+@contextmanager
+def timer(stage, **labels):
+    """Time a block as a pipeline stage."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(STAGE_SECONDS, time.perf_counter() - start, stage=stage, **labels)
+
+
+def record_response(app_name, resp):
+    """Count a response (or the exception raised instead of one) and its latency."""
+    if isinstance(resp, Exception) or resp is None:
+        inc(HTTP_RESPONSES, app=app_name, status="error")
+        return
+    inc(HTTP_RESPONSES, app=app_name, status=resp.status_code)
+    observe(HTTP_SECONDS, resp.elapsed.total_seconds(), app=app_name)
+
+
+def flush(*args, **kwargs):
+    """Write the observations of this request or job to Redis (after_request / after_job hook)."""
+    pending = getattr(frappe.local, "mobility_sync_metrics", None)
+    if not pending:
+        return
+    frappe.local.mobility_sync_metrics = {}
+    try:
+        cache = frappe.cache()
+        key = cache.make_key(METRICS_CACHE_KEY)
+        pipeline = cache.pipeline()
+        for field, value in pending.items():
+            pipeline.hincrbyfloat(key, field, value)
+        pipeline.execute()
+    except Exception:
+        # Metrics are best effort and must never fail the request or job they describe
+        pass
+
+
+def reset_metrics():
+    frappe.cache().delete_value(METRICS_CACHE_KEY)
+
+
+# --------------------------------------------------------
+# Profiling
+# --------------------------------------------------------
+
+@contextmanager
+def profile(title):
+    """
+    Run a block under cProfile for `Profile Sample Rate` percent of calls and log
+    the top functions by cumulative time when it took `Profile Slow Seconds` or more.
+    """
+    settings = get_sync_settings()
+    rate = flt(settings.profile_sample_rate)
+    if rate <= 0 or random.random() * 100 >= rate:
+        yield
+        return
+
+    profiler = cProfile.Profile()
+    start = time.perf_counter()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another profiler is already active in this thread
+        yield
+        return
+    try:
+        yield
+    finally:
+        profiler.disable()
+        elapsed = time.perf_counter() - start
+        if elapsed >= (flt(settings.profile_slow_seconds) or 2):
+            out = io.StringIO()
+            pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(40)
+            frappe.log_error(
+                message=f"{title} took {elapsed:.3f}s\n\n{out.getvalue()}",
+                title=f"Sync Slow Push Profile ({title})"
+            )
+
+
+# --------------------------------------------------------
+# Export
+# --------------------------------------------------------
+
+def get_recorded_metrics():
+    """Return {sample name: {label string: value}} of everything flushed so far."""
+    cache = frappe.cache()
+    # Raw HGETALL: RedisWrapper.hgetall would unpickle the plain counters
+    pipeline = cache.pipeline()
+    pipeline.hgetall(cache.make_key(METRICS_CACHE_KEY))
+    samples = {}
+    for field, value in pipeline.execute()[0].items():
+        name, _sep, labels = field.decode().partition("|")
+        samples.setdefault(name, {})[labels] = float(value)
+    return samples
+
+
+def get_histograms(samples, name):
+    """Return {label string: (count, sum, [(le, cumulative count), ...])} of a histogram family."""
+    buckets = {}
+    for labels, value in samples.get(f"{name}_bucket", {}).items():
+        labels, _sep, le = labels.rpartition("|")
+        buckets.setdefault(labels, {})[le] = value
+
+    histograms = {}
+    for labels, count in samples.get(f"{name}_count", {}).items():
+        cumulative, series = 0, []
+        for le in (*BUCKETS, "+Inf"):
+            cumulative += buckets.get(labels, {}).get(str(le), 0)
+            series.append((le, cumulative))
+        histograms[labels] = (count, samples.get(f"{name}_sum", {}).get(labels, 0), series)
+    return histograms
+
+
+def estimate_quantile(count, series, quantile):
+    """Upper bound of the histogram bucket holding the given quantile."""
+    if not count:
+        return None
+    for le, cumulative in series:
+        if cumulative >= count * quantile:
+            return le
+    return "+Inf"
+
+
+def get_gauges():
+    """Current queue depths and backlogs: [(name, help, {label string: value})]."""
+    from frappe.utils.background_jobs import get_queue
+
+    from mobility_sync.sync import breaker
+    from mobility_sync.sync.queues import get_sync_queue
+    from mobility_sync.sync.serializer import get_payload_stats
+
+    apps = frappe.get_all("Sync Settings Apps", filters={"parent": "Sync Settings"}, pluck="app_name")
+    queues = sorted({get_sync_queue(), *(get_sync_queue(app) for app in apps)})
+    backlog = dict(frappe.db.sql("""
+        SELECT app_name, COUNT(*)
+        FROM `tabMobility Sync Failed Queue`
+        WHERE sync_tried = 0
+        GROUP BY app_name
+    """))
+    payload = {app: get_payload_stats(app) for app in apps}
+
+    return [
+        ("mobility_sync_queue_depth", "Jobs waiting in the sync queues",
+            {_label_string({"queue": queue}): get_queue(queue).count for queue in queues}),
+        ("mobility_sync_failed_queue_backlog", "Failed-queue rows waiting for a retry",
+            {_label_string({"app": app}): cint(backlog.get(app)) for app in apps}),
+        ("mobility_sync_outbox_pending", "Changes recorded in the outbox and not dispatched yet",
+            {"": frappe.db.count("Mobility Sync Outbox")}),
+        ("mobility_sync_circuit_open", "1 while an app's circuit is open or half-open",
+            {_label_string({"app": app}): int(breaker.get_breaker_state(app).state != breaker.CLOSED) for app in apps}),
+        ("mobility_sync_payload_raw_bytes", "Serialized bytes sent to each app since the stats were reset",
+            {_label_string({"app": app}): stats["raw_bytes"] for app, stats in payload.items()}),
+        ("mobility_sync_payload_wire_bytes", "Bytes on the wire (after compression) sent to each app",
+            {_label_string({"app": app}): stats["wire_bytes"] for app, stats in payload.items()}),
+    ]
+
+
+def _format_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _sample(name, labels, value):
+    return f"{name}{{{labels}}} {_format_value(value)}" if labels else f"{name} {_format_value(value)}"
+
+
+def render_prometheus():
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    samples = get_recorded_metrics()
+    lines = []
+    for name, (kind, help_text) in HELP.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+        if kind == "counter":
+            lines += [_sample(name, labels, value) for labels, value in sorted(samples.get(name, {}).items())]
+            continue
+        for labels, (count, total, series) in sorted(get_histograms(samples, name).items()):
+            for le, cumulative in series:
+                le_label = f'le="{le}"'
+                lines.append(_sample(f"{name}_bucket", f"{labels},{le_label}" if labels else le_label, cumulative))
+            lines += [_sample(f"{name}_sum", labels, total), _sample(f"{name}_count", labels, count)]
+
+    for name, help_text, values in get_gauges():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+        lines += [_sample(name, labels, value) for labels, value in sorted(values.items())]
+    return "\n".join(lines) + "\n"
+
+
+def get_summary():
+    """Per-app request counts, errors and latency, and per-stage timings, for the Sync Settings dashboard."""
+    samples = get_recorded_metrics()
+    gauges = {name: values for name, _help, values in get_gauges()}
+
+    apps = {}
+    for labels, value in samples.get(HTTP_RESPONSES, {}).items():
+        parsed = _parse_labels(labels)
+        app = apps.setdefault(parsed["app"], {"requests": 0, "errors": 0})
+        app["requests"] += int(value)
+        if parsed["status"] == "error" or cint(parsed["status"]) >= 400:
+            app["errors"] += int(value)
+    for labels, (count, total, series) in get_histograms(samples, HTTP_SECONDS).items():
+        app = apps.setdefault(_parse_labels(labels)["app"], {"requests": 0, "errors": 0})
+        app["avg_ms"] = round(total * 1000 / count, 1) if count else None
+        app["p95_seconds"] = estimate_quantile(count, series, 0.95)
+    for labels, value in gauges["mobility_sync_failed_queue_backlog"].items():
+        apps.setdefault(_parse_labels(labels)["app"], {"requests": 0, "errors": 0})["backlog"] = value
+
+    stages = {}
+    for labels, (count, total, _series) in get_histograms(samples, STAGE_SECONDS).items():
+        stage = stages.setdefault(_parse_labels(labels)["stage"], {"count": 0, "seconds": 0})
+        stage["count"] += int(count)
+        stage["seconds"] += total
+    for stage in stages.values():
+        stage["avg_ms"] = round(stage.pop("seconds") * 1000 / stage["count"], 2) if stage["count"] else None
+
+    return {
+        "apps": apps,
+        "stages": stages,
+        "queue_depth": {_parse_labels(labels)["queue"]: value for labels, value in gauges["mobility_sync_queue_depth"].items()},
+        "outbox_pending": gauges["mobility_sync_outbox_pending"][""],
+    }
+
+
+def _parse_labels(label_string):
+    labels = {}
+    for pair in label_string.split('",'):
+        if "=" in pair:
+            key, _sep, value = pair.partition('="')
+            labels[key] = value.rstrip('"')
+    return labels
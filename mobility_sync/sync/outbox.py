@@ -0,0 +1,326 @@
+import json
+
+import frappe
+from frappe.model import no_value_fields, table_fields
+from frappe.utils import cint, get_traceback, now_datetime
+
+from mobility_sync.sync import metrics
+from mobility_sync.sync.echo import filter_apps, get_inbound_change, get_site_origin
+from mobility_sync.sync.failed_queue import record_results
+from mobility_sync.sync.links import get_dependencies
+from mobility_sync.sync.mapping import EMPTY_PLAN, apply_plan, get_mapping_plan, map_document
+from mobility_sync.sync.queues import enqueue_sync_job, get_job_timeout, is_backpressured
+from mobility_sync.sync.settings import get_enabled_apps, get_sync_settings
+
+DISPATCH_FLAG_KEY = "mobility_sync:dispatch_scheduled"
+DISPATCH_LOCK_KEY = "mobility_sync:dispatch_lock"
+
+
+# --------------------------------------------------------
+# Recording
+# --------------------------------------------------------
+
+def coalesce_method(pending, method):
+    """
+    Method to keep when `method` happens to a document that still has `pending` unsent.
+    A pending insert or backfill absorbs updates: the target may not have the
+    document yet, and an update of a missing document is a no-op there.
+    """
+    from mobility_sync.sync.backfill import BACKFILL_METHOD
+
+    if pending in ("after_insert", BACKFILL_METHOD) and method == "on_update":
+        return pending
+    return method
+
+
+def get_changes(doc):
+    """
+    Diff `doc` against its state before save.
+
+    Returns {"fields": [fieldname, ...], "tables": {table_field: {"changed": [row name, ...],
+    "removed": [row name, ...]}}}, or None when the base version is unknown.
+    """
+    before = doc.get_doc_before_save()
+    if not before:
+        return None
+
+    fields = [
+        df.fieldname for df in doc.meta.fields
+        if df.fieldtype not in no_value_fields
+        and df.fieldtype not in table_fields
+        and doc.get(df.fieldname) != before.get(df.fieldname)
+    ]
+
+    tables = {}
+    for df in doc.meta.get_table_fields():
+        child_fields = [
+            child_df.fieldname for child_df in frappe.get_meta(df.options).fields
+            if child_df.fieldtype not in no_value_fields
+        ] + ["idx"]
+        old_rows = {row.name: row for row in before.get(df.fieldname) or []}
+        new_rows = doc.get(df.fieldname) or []
+
+        changed = [
+            row.name for row in new_rows
+            if row.name not in old_rows
+            or any(row.get(f) != old_rows[row.name].get(f) for f in child_fields)
+        ]
+        removed = list(old_rows.keys() - {row.name for row in new_rows})
+        if changed or removed:
+            tables[df.fieldname] = {"changed": changed, "removed": removed}
+
+    return {"fields": fields, "tables": tables}
+
+
+def merge_changes(pending, changes):
+    """Union two change sets; None (full document) absorbs everything."""
+    if pending is None or changes is None:
+        return None
+
+    merged = {
+        "fields": sorted(set(pending["fields"]) | set(changes["fields"])),
+        "tables": dict(pending["tables"]),
+    }
+    for fieldname, table in changes["tables"].items():
+        previous = merged["tables"].get(fieldname) or {"changed": [], "removed": []}
+        removed = set(previous["removed"]) | set(table["removed"])
+        changed = (set(previous["changed"]) | set(table["changed"])) - set(table["removed"])
+        merged["tables"][fieldname] = {"changed": sorted(changed), "removed": sorted(removed - changed)}
+    return merged
+
+
+def get_pending_changes(doc, method):
+    """Return the change set to store on the outbox row for this event (None = send full document)."""
+    if method != "on_update" or not cint(get_sync_settings().delta_updates):
+        return None
+
+    changes = get_changes(doc)
+    pending = frappe.db.get_value(
+        "Mobility Sync Outbox",
+        {"document_type": doc.doctype, "document_name": doc.name},
+        ["doc_method", "changed_fields"],
+        as_dict=True
+    )
+    if pending:
+        if pending.doc_method != "on_update" or not pending.changed_fields:
+            return None
+        changes = merge_changes(json.loads(pending.changed_fields), changes)
+    return changes
+
+
+def record_change(doc, method):
+    """
+    Record a change of `doc` in the outbox, within the current transaction.
+
+    Only (doctype, name, method, modified) is stored, plus the changed field and row
+    names when delta updates are enabled. Repeated events for the same document
+    update its pending row instead of adding one: an `after_insert` that has not
+    been dispatched yet absorbs later `on_update` events, and `on_trash` replaces
+    anything pending.
+
+    A change written by an inbound push keeps its change ID and records the sites
+    it passed through (plus this one) in `sync_path`, so it is never sent back to
+    them. Merged with a local change it becomes local: new ID, sent everywhere.
+    """
+    changes = get_pending_changes(doc, method)
+    inbound = get_inbound_change(doc)
+    local_change_id = frappe.generate_hash(length=20)
+    now = now_datetime()
+    # Assignments run left to right: change_id must be set before sync_path changes
+    frappe.db.sql("""
+        INSERT INTO `tabMobility Sync Outbox`
+            (name, creation, modified, owner, modified_by,
+             document_type, document_name, doc_method, document_modified, changed_fields,
+             change_id, sync_path)
+        VALUES (%(name)s, %(now)s, %(now)s, %(user)s, %(user)s,
+             %(doctype)s, %(docname)s, %(method)s, %(doc_modified)s, %(changed_fields)s,
+             %(change_id)s, %(sync_path)s)
+        ON DUPLICATE KEY UPDATE
+            change_id = IF(sync_path IS NULL OR VALUES(sync_path) IS NULL, %(local_change_id)s, VALUES(change_id)),
+            sync_path = IF(sync_path IS NULL OR VALUES(sync_path) IS NULL, NULL, VALUES(sync_path)),
+            changed_fields = IF(doc_method = 'on_update', VALUES(changed_fields), NULL),
+            doc_method = IF(doc_method = 'after_insert' AND VALUES(doc_method) = 'on_update',
+                doc_method, VALUES(doc_method)),
+            document_modified = VALUES(document_modified),
+            modified = VALUES(modified),
+            modified_by = VALUES(modified_by)
+    """, {
+        "name": frappe.generate_hash(length=10),
+        "now": now,
+        "user": frappe.session.user,
+        "doctype": doc.doctype,
+        "docname": doc.name,
+        "method": method,
+        "doc_modified": doc.get("modified"),
+        "changed_fields": json.dumps(changes) if changes is not None else None,
+        "change_id": inbound.change_id if inbound and inbound.change_id else local_change_id,
+        "local_change_id": local_change_id,
+        "sync_path": json.dumps([*inbound.sync_path, get_site_origin()]) if inbound else None,
+    })
+
+    # Only wake the dispatcher once the change is actually committed
+    frappe.db.after_commit.add(enqueue_dispatch)
+
+
+def enqueue_dispatch():
+    """
+    Schedule a dispatcher run unless one is already waiting to start.
+
+    Under backpressure (the sync queue is deeper than `Backpressure Queue Depth`)
+    changes are only buffered in the outbox; schedule_dispatch starts the
+    dispatcher again once the queue has drained.
+    """
+    if is_backpressured():
+        return
+    cache = frappe.cache()
+    # The flag is cleared when the dispatcher starts, so events arriving while it
+    # runs schedule exactly one follow-up job.
+    if cache.set(cache.make_key(DISPATCH_FLAG_KEY), 1, nx=True, ex=300):
+        enqueue_sync_job("mobility_sync.sync.outbox.dispatch_outbox")
+
+
+def schedule_dispatch():
+    """Scheduler safety net: force a dispatcher run if rows are waiting in the outbox."""
+    if frappe.db.count("Mobility Sync Outbox"):
+        frappe.cache().delete_value(DISPATCH_FLAG_KEY)
+        enqueue_dispatch()
+
+
+# --------------------------------------------------------
+# Dispatching
+# --------------------------------------------------------
+
+def build_delta(doc, changes):
+    """Split the changed parts of `doc` into mapped scalar `data` and a `delta` of child rows."""
+    plan = get_mapping_plan(doc.doctype)
+    data = {"doctype": doc.doctype, "name": doc.name}
+    for fieldname in changes["fields"]:
+        data[fieldname] = doc.get(fieldname)
+
+    tables = {}
+    for fieldname, table in changes["tables"].items():
+        if fieldname in plan["exclude"]:
+            continue
+        changed = set(table["changed"])
+        child_plan = plan["tables"].get(fieldname, EMPTY_PLAN)
+        tables[plan["rename"].get(fieldname, fieldname)] = {
+            "rows": [apply_plan(row.as_dict(), child_plan) for row in doc.get(fieldname) or [] if row.name in changed],
+            "removed": table["removed"],
+        }
+    return apply_plan(data, plan), {"tables": tables}
+
+
+def build_envelope(row):
+    """Load and map the current state of an outbox row's document (None if it no longer exists)."""
+    delta = requires = None
+    if row.doc_method == "on_trash":
+        data = {"doctype": row.document_type, "name": row.document_name}
+        version = row.get("document_modified") or now_datetime()
+    elif frappe.db.exists(row.document_type, row.document_name):
+        doc = frappe.get_doc(row.document_type, row.document_name)
+        # The state being sent, not the event: later edits are already in it
+        version = doc.modified
+        if row.doc_method == "on_update" and row.changed_fields:
+            data, delta = build_delta(doc, json.loads(row.changed_fields))
+        else:
+            with metrics.timer("map_document", doctype=row.document_type):
+                data = map_document(doc.as_dict())
+        requires = get_dependencies(doc)
+    else:
+        # Deleted after the event was recorded; its on_trash row supersedes this one
+        return None
+
+    envelope = {
+        "doctype": row.document_type,
+        "name": row.document_name,
+        "doc_method": row.doc_method,
+        "data": data,
+        "change_id": row.get("change_id") or frappe.generate_hash(length=20),
+        "sync_path": json.loads(row.sync_path) if row.get("sync_path") else [get_site_origin()],
+        "version": version,
+    }
+    if delta:
+        envelope["delta"] = delta
+    if requires:
+        # Synced documents it links to; the sender orders batches by them
+        envelope["requires"] = requires
+    return envelope
+
+
+def try_build_envelope(row):
+    """
+    build_envelope() that logs the error and returns False instead of raising,
+    so one document that can not be loaded or mapped never holds up the others.
+    """
+    try:
+        return build_envelope(row)
+    except Exception:
+        frappe.log_error(message=get_traceback(), title=f"Sync Envelope Failed ({row.document_type})")
+        return False
+
+
+def dispatch_outbox():
+    """
+    Ship pending outbox rows to their apps, `Push Batch Size` documents at a time.
+
+    A document that fails to load or map is handed to the failed queue of its
+    apps, so it never blocks the rows behind it.
+
+    Only one dispatcher runs at a time: two would read the same head rows and
+    push them twice, possibly out of order. A job that finds the lock taken
+    leaves its rows to the running one, which reschedules itself if rows
+    arrived after its last page.
+    """
+    cache = frappe.cache()
+    cache.delete_value(DISPATCH_FLAG_KEY)
+    # Expires in case a worker dies without releasing it
+    if not cache.set(cache.make_key(DISPATCH_LOCK_KEY), 1, nx=True, ex=get_job_timeout()):
+        return
+
+    try:
+        _dispatch_outbox()
+    finally:
+        cache.delete_value(DISPATCH_LOCK_KEY)
+
+    if frappe.db.count("Mobility Sync Outbox"):
+        enqueue_dispatch()
+
+
+def _dispatch_outbox():
+    from mobility_sync.sync.handlers import push_batches
+
+    batch_size = cint(get_sync_settings().batch_size) or 100
+
+    while rows := frappe.get_all(
+        "Mobility Sync Outbox",
+        fields=[
+            "name", "document_type", "document_name", "doc_method", "changed_fields",
+            "document_modified", "change_id", "sync_path", "modified"
+        ],
+        order_by="creation asc",
+        limit=batch_size
+    ):
+        batches, failed, origins = {}, {}, {}
+        for row in rows:
+            envelope = try_build_envelope(row)
+            if envelope is None:
+                continue
+            if envelope is False:
+                # Retried from the failed queue with backoff instead of blocking the head of the outbox
+                sync_path = json.loads(row.sync_path) if row.sync_path else None
+                origins[(row.document_type, row.document_name)] = (row.change_id, row.sync_path)
+                for app in filter_apps(get_enabled_apps(row.document_type), sync_path):
+                    failed.setdefault(app, []).append((row.document_type, row.document_name, row.doc_method, False))
+                continue
+            # Never back to a site the change came through
+            for app in filter_apps(get_enabled_apps(row.document_type), envelope["sync_path"]):
+                batches.setdefault(app, []).append(envelope)
+
+        for app, results in failed.items():
+            record_results(app, results, origins)
+        push_batches(batches)
+
+        # Rows touched by a newer event while we were sending stay pending
+        for row in rows:
+            frappe.db.delete("Mobility Sync Outbox", {"name": row.name, "modified": row.modified})
+        frappe.db.commit()
@@ -0,0 +1,41 @@
+import frappe
+from frappe.utils import cint
+from frappe.utils.background_jobs import get_queue, get_queue_list
+
+from mobility_sync.sync.settings import get_app_settings, get_sync_settings
+
+DEFAULT_QUEUE = "long"
+DEFAULT_JOB_TIMEOUT = 300
+
+
+def get_sync_queue(app_name=None):
+    """
+    Return the queue for sync jobs (of an app, if given).
+
+    Custom queues only exist once a bench defines them under `workers` in
+    common_site_config.json, so an unknown name falls back to the long queue
+    instead of failing the enqueue.
+    """
+    row = app_name and get_app_settings(app_name)
+    queue = (row and (row.queue or "").strip()) or (get_sync_settings().sync_queue or "").strip()
+    if queue and queue in get_queue_list():
+        return queue
+    return DEFAULT_QUEUE
+
+
+def get_job_timeout():
+    return cint(get_sync_settings().job_timeout) or DEFAULT_JOB_TIMEOUT
+
+
+def is_backpressured(app_name=None):
+    """True when the sync queue (of an app) has more waiting jobs than `Backpressure Queue Depth`."""
+    threshold = cint(get_sync_settings().backpressure_queue_depth)
+    if threshold <= 0:
+        return False
+    return get_queue(get_sync_queue(app_name)).count > threshold
+
+
+def enqueue_sync_job(method, for_app=None, **kwargs):
+    """frappe.enqueue on the sync queue (of `for_app`, if given) with the configured job timeout."""
+    kwargs.setdefault("timeout", get_job_timeout())
+    return frappe.enqueue(method, queue=get_sync_queue(for_app), **kwargs)
@@ -0,0 +1,236 @@
+import frappe
+from frappe.utils import cint, get_datetime, get_traceback, now_datetime
+
+from mobility_sync.sync import sessions
+from mobility_sync.sync.backfill import BACKFILL_METHOD
+from mobility_sync.sync.failed_queue import queue_unsent
+from mobility_sync.sync.queues import enqueue_sync_job
+from mobility_sync.sync.settings import get_enabled_apps, get_sync_index, get_sync_settings
+
+# Method requeued for documents missing or outdated on the app: inserted or updated as needed
+REPUSH_METHOD = BACKFILL_METHOD
+DEFAULT_LEAF_SIZE = 256
+# A bucket is a prefix of the MD5 of document names, split one hex digit per level
+MAX_DEPTH = 8
+# Prefixes per digest request and leaves per version request
+DIGEST_CHUNK = 256
+VERSION_CHUNK = 32
+QUEUE_CHUNK = 1000
+
+
+# --------------------------------------------------------
+# Digests
+# --------------------------------------------------------
+
+def _version_sql(doctype, replica):
+    """
+    Column and join giving each document's version. A replica compares the
+    sender's modified recorded when a change was applied, since its own
+    `modified` is the time it was written here.
+    """
+    if not replica:
+        return "t.modified", ""
+    return (
+        "COALESCE(av.source_modified, t.modified)",
+        """LEFT JOIN `tabMobility Sync Applied Version` av
+            ON av.document_type = %(doctype)s AND av.document_name = t.name""",
+    )
+
+
+def get_bucket_digests(doctype, prefixes, replica=False):
+    """
+    Split each bucket of `prefixes` (all of one length) one level down and return
+    {bucket: [count, digest]} of the non-empty ones. The digest is the XOR of a
+    64-bit hash of every (name, version) in the bucket, so it does not depend on
+    row order and is computed by the database in one scan.
+    """
+    version, join = _version_sql(doctype, replica)
+    length = len(prefixes[0])
+    rows = frappe.db.sql(f"""
+        SELECT LEFT(MD5(t.name), %(length)s + 1) AS bucket, COUNT(*) AS count,
+            BIT_XOR(CAST(CONV(LEFT(MD5(CONCAT(t.name, '|', {version})), 16), 16, 10) AS UNSIGNED)) AS digest
+        FROM `tab{doctype}` t
+        {join}
+        WHERE LEFT(MD5(t.name), %(length)s) IN %(prefixes)s
+        GROUP BY bucket
+    """, {"doctype": doctype, "length": length, "prefixes": list(prefixes)}, as_dict=True)
+    return {row.bucket: [cint(row.count), str(row.digest)] for row in rows}
+
+
+def get_bucket_versions(doctype, prefixes, replica=False):
+    """Return {name: [version, applied]} of the documents in the buckets of `prefixes`."""
+    version, join = _version_sql(doctype, replica)
+    applied = "av.name IS NOT NULL" if replica else "0"
+    rows = frappe.db.sql(f"""
+        SELECT t.name, {version} AS version, {applied} AS applied
+        FROM `tab{doctype}` t
+        {join}
+        WHERE LEFT(MD5(t.name), %(length)s) IN %(prefixes)s
+    """, {"doctype": doctype, "length": len(prefixes[0]), "prefixes": list(prefixes)}, as_dict=True)
+    return {row.name: [row.version, cint(row.applied)] for row in rows}
+
+
+# --------------------------------------------------------
+# App
+# --------------------------------------------------------
+
+def call_app(reconcile, method, payload):
+    """POST to an app's sync API and return the message, counting the bytes exchanged."""
+    from mobility_sync.sync.handlers import build_request, can_send, finish_send, get_target_url
+    from mobility_sync.sync.tokens import get_oauth_tokens
+
+    app_name = reconcile.app_name
+    access_token = get_oauth_tokens(app_name)
+    if not access_token:
+        frappe.throw(f"Access token not available for app {app_name}")
+    url = get_target_url(app_name, method)
+    request = build_request(app_name, access_token, dict(payload, doctype=reconcile.document_type))
+
+    # Nothing may fail between taking the send slot and finish_send()
+    if not can_send(app_name):
+        frappe.throw(f"{app_name} is not accepting requests (circuit open or throttled)")
+    try:
+        resp = sessions.post(app_name, url, **request)
+    except Exception as e:
+        finish_send(app_name, e)
+        raise
+    finish_send(app_name, resp)
+
+    resp.raise_for_status()
+    reconcile.bytes_exchanged += len(request.get("data") or b"") + len(resp.content)
+    return resp.json()["message"]
+
+
+# --------------------------------------------------------
+# Run
+# --------------------------------------------------------
+
+def compare_leaves(reconcile, leaves):
+    """Compare the documents of mismatched leaf buckets and return the keys to requeue."""
+    doctype = reconcile.document_type
+    local = get_bucket_versions(doctype, leaves)
+    remote = call_app(reconcile, "get_reconcile_versions", {"prefixes": leaves})
+
+    keys = []
+    for name, (version, _applied) in local.items():
+        if name not in remote:
+            keys.append((doctype, name, REPUSH_METHOD))
+            continue
+        remote_version, remote_applied = remote[name]
+        remote_version = get_datetime(remote_version)
+        if remote_version == version:
+            continue
+        if remote_applied and remote_version > version:
+            # A newer change reached the app another way; pushing ours would be stale
+            reconcile.remote_newer += 1
+        else:
+            keys.append((doctype, name, REPUSH_METHOD))
+    reconcile.requeued += len(keys)
+
+    remote_only = [name for name in remote if name not in local]
+    deleted = set(frappe.get_all(
+        "Mobility Sync Tombstone",
+        filters={"document_type": doctype, "document_name": ("in", remote_only)},
+        pluck="document_name"
+    )) if remote_only else set()
+    keys.extend((doctype, name, "on_trash") for name in deleted)
+    reconcile.deletions_requeued += len(deleted)
+    reconcile.remote_only += len(remote_only) - len(deleted)
+    return keys
+
+
+def run_reconcile(reconcile_name):
+    """
+    Find the documents of a doctype that differ between this site and an app and
+    queue them in the failed queue, from where they are pushed again.
+
+    Both sides hash (name, modified) into buckets by the MD5 prefix of the name.
+    Starting from the root, only the digests of the next level are exchanged, and
+    only for buckets whose digest differs; a bucket of at most `Reconcile Leaf
+    Size` documents is compared document by document. Verifying a doctype in sync
+    costs a single round of 16 digests.
+    """
+    reconcile = frappe.get_doc("Mobility Sync Reconcile", reconcile_name)
+    if reconcile.status != "Queued":
+        return reconcile
+
+    reconcile.db_set({"status": "Running", "started_at": now_datetime(), "error": None}, commit=True)
+    leaf_size = cint(get_sync_settings().reconcile_leaf_size) or DEFAULT_LEAF_SIZE
+    doctype = reconcile.document_type
+    for field in ("bytes_exchanged", "buckets_compared", "mismatched_buckets",
+                  "requeued", "deletions_requeued", "remote_newer", "remote_only"):
+        reconcile.set(field, 0)
+
+    try:
+        prefixes = [""]
+        while prefixes:
+            local, remote = {}, {}
+            for start in range(0, len(prefixes), DIGEST_CHUNK):
+                chunk = prefixes[start:start + DIGEST_CHUNK]
+                local.update(get_bucket_digests(doctype, chunk))
+                remote.update(call_app(reconcile, "get_reconcile_digests", {"prefixes": chunk}))
+
+            if prefixes == [""]:
+                reconcile.local_count = sum(count for count, _digest in local.values())
+                reconcile.remote_count = sum(count for count, _digest in remote.values())
+
+            buckets = sorted(set(local) | set(remote))
+            mismatched = [bucket for bucket in buckets if local.get(bucket) != remote.get(bucket)]
+            reconcile.buckets_compared += len(buckets)
+            reconcile.mismatched_buckets += len(mismatched)
+
+            leaves, prefixes = [], []
+            for bucket in mismatched:
+                size = max((local.get(bucket) or [0])[0], (remote.get(bucket) or [0])[0])
+                (leaves if size <= leaf_size or len(bucket) >= MAX_DEPTH else prefixes).append(bucket)
+
+            for start in range(0, len(leaves), VERSION_CHUNK):
+                keys = compare_leaves(reconcile, leaves[start:start + VERSION_CHUNK])
+                for key_start in range(0, len(keys), QUEUE_CHUNK):
+                    queue_unsent(reconcile.app_name, keys[key_start:key_start + QUEUE_CHUNK])
+
+    except Exception:
+        frappe.db.rollback()
+        reconcile.db_set({"status": "Failed", "finished_at": now_datetime(), "error": get_traceback()}, commit=True)
+        raise
+
+    reconcile.status = "Completed"
+    reconcile.finished_at = now_datetime()
+    reconcile.save(ignore_permissions=True)
+    frappe.db.commit()
+    return reconcile
+
+
+def start_reconcile(document_type, app_name):
+    """
+    Queue a reconciliation of a pushed doctype with an app, unless one is already
+    waiting. Returns the Mobility Sync Reconcile.
+    """
+    if app_name not in get_enabled_apps(document_type):
+        frappe.throw(f"{document_type} is not enabled for {app_name} in Sync Settings")
+
+    queued = frappe.db.get_value(
+        "Mobility Sync Reconcile", {"document_type": document_type, "app_name": app_name, "status": "Queued"}
+    )
+    if queued:
+        return frappe.get_doc("Mobility Sync Reconcile", queued)
+
+    reconcile = frappe.new_doc("Mobility Sync Reconcile")
+    reconcile.update({"document_type": document_type, "app_name": app_name, "status": "Queued"})
+    reconcile.insert(ignore_permissions=True)
+    frappe.db.commit()
+    enqueue_sync_job(
+        "mobility_sync.sync.reconcile.run_reconcile",
+        for_app=app_name,
+        reconcile_name=reconcile.name
+    )
+    return reconcile
+
+
+def schedule_reconciliation():
+    """Scheduled daily: reconcile every pushed doctype with each of its apps, if enabled in Sync Settings."""
+    if not cint(get_sync_settings().reconcile_daily):
+        return
+    for doctype, apps in get_sync_index().items():
+        for app_name in apps:
+            start_reconcile(doctype, app_name)
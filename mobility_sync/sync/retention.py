@@ -0,0 +1,170 @@
+import time
+
+import frappe
+from frappe.utils import add_days, cint, now_datetime
+
+from mobility_sync.sync.settings import get_sync_settings
+
+# Wall-clock budget of one retention run; what is left over is picked up next hour
+RETENTION_TIME_BUDGET = 10 * 60
+
+
+# --------------------------------------------------------
+# Daily counters
+# --------------------------------------------------------
+
+def add_daily_counts(counts):
+    """Add {(date, doctype, app): {"succeeded": n, "superseded": n, "abandoned": n}} to the daily counters."""
+    if not counts:
+        return
+
+    now = now_datetime()
+    user = frappe.session.user
+    values = []
+    for (date, doctype, app_name), counters in counts.items():
+        values.extend((
+            frappe.generate_hash(length=10), now, now, user, user, date, doctype, app_name,
+            counters.get("succeeded", 0), counters.get("superseded", 0), counters.get("abandoned", 0),
+        ))
+
+    placeholders = ", ".join(["(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"] * len(counts))
+    frappe.db.sql(f"""
+        INSERT INTO `tabMobility Sync Daily Stats`
+            (name, creation, modified, owner, modified_by, date, document_type, app_name,
+             succeeded, superseded, abandoned)
+        VALUES {placeholders}
+        ON DUPLICATE KEY UPDATE
+            succeeded = succeeded + VALUES(succeeded),
+            superseded = superseded + VALUES(superseded),
+            abandoned = abandoned + VALUES(abandoned),
+            modified = VALUES(modified),
+            modified_by = VALUES(modified_by)
+    """, tuple(values))
+
+
+def count_rows(rows, counter):
+    counts = {}
+    for row in rows:
+        key = (row.date, row.document_type, row.app_name)
+        name = counter(row) if callable(counter) else counter
+        counts.setdefault(key, {}).setdefault(name, 0)
+        counts[key][name] += 1
+    return counts
+
+
+# --------------------------------------------------------
+# Steps
+# --------------------------------------------------------
+
+def compact_resolved(cutoff, batch_size):
+    """
+    Fold one chunk of succeeded/superseded rows last touched before `cutoff` into
+    the daily counters and delete them. Returns the number of rows handled.
+    """
+    # SKIP LOCKED: rows a push is upserting right now are left for the next run
+    rows = frappe.db.sql("""
+        SELECT name, document_type, app_name, retry_success, DATE(modified) AS date
+        FROM `tabMobility Sync Failed Queue`
+        WHERE sync_tried = 1
+            AND (retry_success = 1 OR superseded = 1)
+            AND modified < %s
+        ORDER BY modified
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    """, (cutoff, batch_size), as_dict=True)
+    if not rows:
+        return 0
+
+    add_daily_counts(count_rows(rows, lambda row: "succeeded" if row.retry_success else "superseded"))
+    frappe.db.delete("Mobility Sync Failed Queue", {"name": ("in", [row.name for row in rows])})
+    return len(rows)
+
+
+def archive_abandoned(cutoff, batch_size):
+    """
+    Move one chunk of abandoned rows (retries exhausted) last failed before `cutoff`
+    to the Mobility Sync Failed Archive. Returns the number of rows handled.
+    """
+    rows = frappe.db.sql("""
+        SELECT name, document_type, document_name, app_name, doc_method, attempts,
+            creation, modified, DATE(modified) AS date
+        FROM `tabMobility Sync Failed Queue`
+        WHERE sync_tried = 1
+            AND retry_success = 0
+            AND superseded = 0
+            AND modified < %s
+        ORDER BY modified
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    """, (cutoff, batch_size), as_dict=True)
+    if not rows:
+        return 0
+
+    now = now_datetime()
+    user = frappe.session.user
+    frappe.db.bulk_insert(
+        "Mobility Sync Failed Archive",
+        fields=[
+            "name", "creation", "modified", "owner", "modified_by", "document_type", "document_name",
+            "app_name", "doc_method", "attempts", "first_failed_at", "last_failed_at", "archived_on",
+        ],
+        values=[
+            (
+                frappe.generate_hash(length=10), now, now, user, user, row.document_type, row.document_name,
+                row.app_name, row.doc_method, row.attempts, row.creation, row.modified, now,
+            )
+            for row in rows
+        ],
+    )
+    add_daily_counts(count_rows(rows, "abandoned"))
+    frappe.db.delete("Mobility Sync Failed Queue", {"name": ("in", [row.name for row in rows])})
+    return len(rows)
+
+
+def purge_archive(cutoff, batch_size):
+    """Delete one chunk of archived failures archived before `cutoff`. Returns the number of rows deleted."""
+    names = frappe.get_all(
+        "Mobility Sync Failed Archive",
+        filters={"archived_on": ("<", cutoff)},
+        order_by="archived_on asc",
+        limit=batch_size,
+        pluck="name"
+    )
+    if names:
+        frappe.db.delete("Mobility Sync Failed Archive", {"name": ("in", names)})
+    return len(names)
+
+
+# --------------------------------------------------------
+# Job
+# --------------------------------------------------------
+
+def apply_retention():
+    """
+    Scheduled (hourly, long queue): compact, archive and purge in chunks of
+    `Retention Batch Size` rows, committing after each chunk so no lock is held
+    for long. Stops after RETENTION_TIME_BUDGET; the next run continues from there.
+    """
+    settings = get_sync_settings()
+    batch_size = cint(settings.retention_batch_size) or 1000
+    deadline = time.monotonic() + RETENTION_TIME_BUDGET
+
+    for step, days in (
+        (compact_resolved, cint(settings.resolved_retention_days)),
+        (archive_abandoned, cint(settings.failed_retention_days)),
+        (purge_archive, cint(settings.archive_retention_days)),
+    ):
+        if days <= 0:
+            continue
+
+        cutoff = add_days(now_datetime(), -days)
+        while time.monotonic() < deadline:
+            try:
+                handled = step(cutoff, batch_size)
+                frappe.db.commit()
+            except Exception:
+                frappe.db.rollback()
+                frappe.log_error(title=f"Sync Retention Failed: {step.__name__}")
+                break
+            if handled < batch_size:
+                break
@@ -0,0 +1,196 @@
+import gzip
+import io
+import json
+import time
+import zlib
+from datetime import date, datetime, timedelta
+from datetime import time as datetime_time
+from decimal import Decimal
+
+import frappe
+from frappe.utils import cint
+
+from mobility_sync.sync.settings import get_app_settings
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+ACCEPT_ENCODING_CACHE_KEY = "mobility_sync:accept_encoding"
+PAYLOAD_STATS_CACHE_KEY = "mobility_sync:payload_stats"
+
+# Bodies smaller than this are not worth compressing
+MIN_COMPRESS_SIZE = 1024
+# Upper bound for a decompressed request body, like Frappe's own request size limit
+DEFAULT_MAX_BODY_SIZE = 25 * 1024 * 1024
+
+
+# --------------------------------------------------------
+# JSON
+# --------------------------------------------------------
+
+def _default(obj):
+    if isinstance(obj, (datetime, date, datetime_time)):
+        return obj.isoformat()
+    elif isinstance(obj, timedelta):
+        # Time fields are returned as timedelta by the database layer
+        return str(obj)
+    elif isinstance(obj, Decimal):
+        return float(obj)
+    elif isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj):
+    """Serialize to JSON bytes in one pass, with native datetime/Decimal handling."""
+    if orjson:
+        return orjson.dumps(obj, default=_default)
+    return json.dumps(obj, default=_default, separators=(",", ":")).encode()
+
+
+def loads(data):
+    if orjson:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+# --------------------------------------------------------
+# Compression
+# --------------------------------------------------------
+
+def supported_encodings():
+    """Content-Encodings this site can decode, in order of preference."""
+    return ["zstd", "gzip"] if zstandard else ["gzip"]
+
+
+def compress(body, encoding):
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(body)
+    return gzip.compress(body, compresslevel=5)
+
+
+def decompress(body, encoding, max_size=None):
+    """Decompress a request body, refusing to inflate beyond `max_size` bytes."""
+    max_size = max_size or DEFAULT_MAX_BODY_SIZE
+    if encoding == "zstd":
+        if not zstandard:
+            frappe.throw("zstd request bodies are not supported on this site", frappe.ValidationError)
+        with zstandard.ZstdDecompressor().stream_reader(io.BytesIO(body)) as reader:
+            data = reader.read(max_size + 1)
+    else:
+        decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        data = decoder.decompress(body, max_size + 1)
+
+    if len(data) > max_size:
+        frappe.throw("Request body too large", frappe.ValidationError)
+    return data
+
+
+# --------------------------------------------------------
+# Sender
+# --------------------------------------------------------
+
+def get_body_encoding(app_name):
+    """Return the compression to use for an app: its configured one, if the remote accepts it."""
+    row = get_app_settings(app_name)
+    preferred = row and row.compression
+    if not preferred or preferred == "None":
+        return None
+    if preferred == "zstd" and not zstandard:
+        preferred = "gzip"
+
+    accepted = frappe.cache().hget(ACCEPT_ENCODING_CACHE_KEY, app_name) or []
+    return preferred if preferred in accepted else None
+
+
+def remember_accepted_encodings(app_name, resp):
+    """Store the encodings a remote advertised in its response (see api.receive_docs)."""
+    try:
+        accepted = (resp.json().get("message") or {}).get("accept_encoding")
+    except Exception:
+        return
+    if accepted is not None and accepted != frappe.cache().hget(ACCEPT_ENCODING_CACHE_KEY, app_name):
+        frappe.cache().hset(ACCEPT_ENCODING_CACHE_KEY, app_name, accepted)
+
+
+def encode_body(payload, app_name):
+    """
+    Serialize (and optionally compress) a push payload for an app.
+    Returns (body, headers) ready to be passed to requests as `data` and `headers`.
+    """
+    start = time.perf_counter()
+    body = dumps(payload)
+    raw_size = len(body)
+    headers = {"Content-Type": "application/json"}
+
+    encoding = get_body_encoding(app_name)
+    if encoding and raw_size >= MIN_COMPRESS_SIZE:
+        body = compress(body, encoding)
+        # Not labelled as JSON so Frappe does not try to parse the compressed form dict
+        headers = {"Content-Type": "application/octet-stream", "Content-Encoding": encoding}
+
+    record_payload_stats(app_name, raw_size, len(body), time.perf_counter() - start)
+    return body, headers
+
+
+def record_payload_stats(app_name, raw_size, wire_size, seconds):
+    cache = frappe.cache()
+    key = cache.make_key(f"{PAYLOAD_STATS_CACHE_KEY}:{app_name}")
+    pipeline = cache.pipeline()
+    pipeline.hincrby(key, "requests", 1)
+    pipeline.hincrby(key, "raw_bytes", raw_size)
+    pipeline.hincrby(key, "wire_bytes", wire_size)
+    pipeline.hincrbyfloat(key, "serialize_seconds", seconds)
+    pipeline.execute()
+
+
+def get_payload_stats(app_name):
+    """Return cumulative request count, raw/wire bytes and serialization time for an app."""
+    cache = frappe.cache()
+    # Raw HGETALL: RedisWrapper.hgetall would unpickle the plain counters
+    pipeline = cache.pipeline()
+    pipeline.hgetall(cache.make_key(f"{PAYLOAD_STATS_CACHE_KEY}:{app_name}"))
+    stats = {k.decode(): v.decode() for k, v in pipeline.execute()[0].items()}
+    requests_ = cint(stats.get("requests"))
+    raw_bytes = cint(stats.get("raw_bytes"))
+    wire_bytes = cint(stats.get("wire_bytes"))
+    seconds = float(stats.get("serialize_seconds") or 0)
+    return {
+        "requests": requests_,
+        "raw_bytes": raw_bytes,
+        "wire_bytes": wire_bytes,
+        "compression_ratio": round(wire_bytes / raw_bytes, 3) if raw_bytes else None,
+        "avg_payload_bytes": raw_bytes // requests_ if requests_ else 0,
+        "avg_serialize_ms": round(seconds * 1000 / requests_, 3) if requests_ else 0,
+    }
+
+
+# --------------------------------------------------------
+# Receiver
+# --------------------------------------------------------
+
+def read_request_payload():
+    """
+    Return the decoded body of a compressed push request, or None for a plain
+    JSON/form request (whose arguments Frappe has already put in form_dict).
+    """
+    request = getattr(frappe.local, "request", None)
+    if not request:
+        return None
+
+    encoding = (request.headers.get("Content-Encoding") or "").strip().lower()
+    if not encoding or encoding == "identity":
+        return None
+    if encoding not in ("gzip", "zstd"):
+        frappe.throw(f"Unsupported Content-Encoding: {encoding}", frappe.ValidationError)
+
+    max_size = cint(frappe.local.conf.get("max_file_size")) or DEFAULT_MAX_BODY_SIZE
+    return loads(decompress(request.get_data(), encoding, max_size))
@@ -0,0 +1,134 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import frappe
+import requests
+from frappe.utils import cint, flt
+from requests.adapters import HTTPAdapter
+
+from mobility_sync.sync.settings import get_app_settings
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_CONNECT_TIMEOUT = 10
+DEFAULT_READ_TIMEOUT = 30
+
+# {(site, app_name): (config, requests.Session)}, shared by every job of this worker process
+_sessions = {}
+_sessions_pid = os.getpid()
+_lock = threading.Lock()
+
+
+def get_app_http_config(app_name):
+    """Return (pool_size, keep_alive, (connect_timeout, read_timeout)) for an app."""
+    row = get_app_settings(app_name) or frappe._dict()
+    return (
+        cint(row.pool_size) or DEFAULT_POOL_SIZE,
+        bool(cint(row.keep_alive)) if row.keep_alive is not None else True,
+        (
+            flt(row.connect_timeout) or DEFAULT_CONNECT_TIMEOUT,
+            flt(row.request_timeout) or DEFAULT_READ_TIMEOUT,
+        ),
+    )
+
+
+def build_session(pool_size, keep_alive):
+    session = requests.Session()
+    # pool_block caps concurrent connections to the app at pool_size
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0, pool_block=True)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    if not keep_alive:
+        session.headers["Connection"] = "close"
+    return session
+
+
+def get_session(app_name):
+    """
+    Return the pooled session for an app.
+
+    Sessions survive across jobs in the same worker. After a fork the parent's
+    sockets are dropped, and a session is rebuilt when its app's pool settings change.
+    """
+    global _sessions_pid
+
+    if _sessions_pid != os.getpid():
+        with _lock:
+            if _sessions_pid != os.getpid():
+                # Never close inherited sessions: the sockets belong to the parent
+                _sessions.clear()
+                _sessions_pid = os.getpid()
+
+    key = (frappe.local.site, app_name)
+    pool_size, keep_alive, _timeout = get_app_http_config(app_name)
+    config = (pool_size, keep_alive)
+
+    cached = _sessions.get(key)
+    if cached and cached[0] == config:
+        return cached[1]
+
+    with _lock:
+        cached = _sessions.get(key)
+        if cached and cached[0] == config:
+            return cached[1]
+        if cached:
+            cached[1].close()
+        session = build_session(pool_size, keep_alive)
+        _sessions[key] = (config, session)
+        return session
+
+
+def reset_session(app_name):
+    """Drop an app's session so the next request opens fresh connections."""
+    with _lock:
+        cached = _sessions.pop((frappe.local.site, app_name), None)
+    if cached:
+        cached[1].close()
+
+
+def post(app_name, url, **kwargs):
+    """
+    POST through the app's pooled session using its configured timeouts.
+
+    A connection error (typically a keep-alive socket the remote already closed)
+    rebuilds the session and is retried once. Timeouts are never retried.
+    """
+    kwargs.setdefault("timeout", get_app_http_config(app_name)[2])
+    try:
+        return get_session(app_name).post(url, **kwargs)
+    except requests.Timeout:
+        raise
+    except requests.ConnectionError:
+        reset_session(app_name)
+        return get_session(app_name).post(url, **kwargs)
+
+
+def _send(session, url, kwargs):
+    try:
+        try:
+            return session.post(url, **kwargs)
+        except requests.Timeout:
+            raise
+        except requests.ConnectionError:
+            # urllib3 has discarded the dead socket; the retry opens a new one
+            return session.post(url, **kwargs)
+    except Exception as e:
+        return e
+
+
+def post_many(calls, max_workers=1):
+    """
+    Send (app_name, url, kwargs) POSTs concurrently, at most `max_workers` in flight.
+
+    Returns a Response, or the exception raised while sending, for each call in order.
+    Sessions and timeouts are resolved up front: worker threads have no frappe.local.
+    """
+    prepared = [
+        (get_session(app_name), url, {"timeout": get_app_http_config(app_name)[2], **kwargs})
+        for app_name, url, kwargs in calls
+    ]
+    if len(prepared) <= 1 or max_workers <= 1:
+        return [_send(*call) for call in prepared]
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(prepared))) as executor:
+        return list(executor.map(lambda call: _send(*call), prepared))
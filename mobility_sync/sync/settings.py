@@ -0,0 +1,138 @@
+import json
+
+import frappe
+
+SYNC_INDEX_CACHE_KEY = "mobility_sync:sync_index"
+FAST_APPLY_CACHE_KEY = "mobility_sync:fast_apply"
+
+# Doctypes written by the framework (or by this app) on almost every request.
+# They are never synced, so handle_doc_event rejects them before touching the cache.
+IGNORED_DOCTYPES = frozenset({
+    "Access Log",
+    "Activity Log",
+    "Connected App",
+    "Console Log",
+    "Data Import",
+    "Deleted Document",
+    "DocShare",
+    "Email Queue",
+    "Email Queue Recipient",
+    "Error Log",
+    "Integration Request",
+    "Mobility Sync Applied Version",
+    "Mobility Sync Backfill",
+    "Mobility Sync Daily Stats",
+    "Mobility Sync Failed Archive",
+    "Mobility Sync Failed Queue",
+    "Mobility Sync Outbox",
+    "Mobility Sync Pull Cursor",
+    "Mobility Sync Reconcile",
+    "Mobility Sync Tombstone",
+    "Notification Log",
+    "OAuth Authorization Code",
+    "OAuth Bearer Token",
+    "OAuth Client",
+    "Prepared Report",
+    "Route History",
+    "Scheduled Job Log",
+    "Scheduled Job Type",
+    "Session Default Settings",
+    "Submission Queue",
+    "Sync Settings",
+    "Token Cache",
+    "Unhandled Email",
+    "Version",
+    "View Log",
+    "Webhook Request Log",
+})
+
+
+def get_sync_settings():
+    """Return the cached Sync Settings document (cleared by the framework on save)."""
+    return frappe.get_cached_doc("Sync Settings")
+
+
+def get_app_settings(app_name):
+    """Return the Sync Settings Apps row of an app from the cached settings."""
+    return next((row for row in get_sync_settings().get("apps") or [] if row.app_name == app_name), None)
+
+
+def parse_apps(value):
+    """Return the list of app names stored as JSON on a Sync Settings Detail row."""
+    if not value:
+        return []
+    try:
+        apps = json.loads(value)
+    except ValueError:
+        return []
+    return [app for app in apps if app] if isinstance(apps, list) else []
+
+
+def _build_sync_index():
+    all_apps = tuple(frappe.get_all(
+        "Sync Settings Apps",
+        filters={"parent": "Sync Settings"},
+        pluck="app_name",
+        order_by="idx asc"
+    ))
+    rows = frappe.get_all(
+        "Sync Settings Detail",
+        filters={"parent": "Sync Settings", "enabled": 1},
+        fields=["sync_doctype", "apps", "pull_only"],
+        order_by="idx asc"
+    )
+
+    index = {}
+    for row in rows:
+        if not row.sync_doctype or row.sync_doctype in IGNORED_DOCTYPES:
+            continue
+        if row.pull_only:
+            # Served on the change feed only; pushed to no app
+            index[row.sync_doctype] = ()
+            continue
+        # An empty selection means "all apps" (see the Choose Apps dialog)
+        index[row.sync_doctype] = tuple(parse_apps(row.apps)) or all_apps
+    return index
+
+
+def get_sync_index():
+    """
+    Return {doctype: (app_name, ...)} for every enabled doctype in Sync Settings.
+    Built once and kept in Redis (and the request-local cache) until Sync Settings is saved.
+    """
+    return frappe.cache().get_value(SYNC_INDEX_CACHE_KEY, generator=_build_sync_index)
+
+
+def _build_fast_apply_index():
+    rows = frappe.get_all(
+        "Sync Settings Detail",
+        filters={"parent": "Sync Settings", "fast_apply": 1},
+        fields=["sync_doctype", "fast_apply_hook"]
+    )
+    return {row.sync_doctype: (row.fast_apply_hook or "").strip() for row in rows if row.sync_doctype}
+
+
+def get_fast_apply_index():
+    """
+    Return {doctype: post-apply hook path (may be empty)} for doctypes received in
+    fast-apply mode. Independent of `enabled`, which is about sending.
+    """
+    return frappe.cache().get_value(FAST_APPLY_CACHE_KEY, generator=_build_fast_apply_index)
+
+
+def clear_sync_index():
+    frappe.cache().delete_value([SYNC_INDEX_CACHE_KEY, FAST_APPLY_CACHE_KEY])
+
+
+def is_doctype_enabled(doctype):
+    """Check if given doctype is enabled in Sync Settings."""
+    if doctype in IGNORED_DOCTYPES:
+        return False
+    return doctype in get_sync_index()
+
+
+def get_enabled_apps(doctype):
+    """Return the apps an enabled doctype is pushed to (empty if not enabled)."""
+    if doctype in IGNORED_DOCTYPES:
+        return ()
+    return get_sync_index().get(doctype) or ()
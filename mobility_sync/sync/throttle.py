@@ -0,0 +1,171 @@
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+
+import frappe
+from frappe.utils import cint, flt
+
+from mobility_sync.sync.settings import get_app_settings, get_sync_settings
+
+TOKEN_BUCKET_KEY = "mobility_sync:rate:{}"
+IN_FLIGHT_KEY = "mobility_sync:in_flight:{}"
+RETRY_AFTER_KEY = "mobility_sync:retry_after:{}"
+RECEIVING_KEY = "mobility_sync:receiving"
+
+# Used when a 429 response does not say how long to back off
+DEFAULT_RETRY_AFTER = 30
+# What this site asks senders to wait when it is receiving too many pushes
+RECEIVE_RETRY_AFTER = 10
+# In-flight counters expire in case a worker dies between acquire and release
+IN_FLIGHT_TTL = 600
+
+# Token bucket refill and take in one round trip. Returns the seconds until a
+# token is available (as a string, Lua numbers are truncated to integers on
+# return); a token is only taken when that wait is within ARGV[4].
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local max_wait = tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens < 1 then
+    wait = (1 - tokens) / rate
+end
+if wait <= max_wait then
+    tokens = tokens - 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 60)
+return tostring(wait)
+"""
+
+
+# --------------------------------------------------------
+# Sender
+# --------------------------------------------------------
+
+def get_rate_config(app_name):
+    """Return (requests_per_second, max_in_flight) of an app; 0 means unlimited."""
+    row = get_app_settings(app_name) or frappe._dict()
+    return flt(row.rate_limit), cint(row.max_in_flight)
+
+
+def take_token(app_name, rate):
+    """Take a rate-limit token if one is available now. Returns 0 when taken, else the seconds until the next one."""
+    cache = frappe.cache()
+    wait = cache.eval(
+        TOKEN_BUCKET_SCRIPT, 1, cache.make_key(TOKEN_BUCKET_KEY.format(app_name)),
+        rate, max(rate, 1), time.time(), 0
+    )
+    return flt(wait.decode() if isinstance(wait, bytes) else wait)
+
+
+def take_slot(key, limit):
+    """Take one of `limit` slots counted in a Redis key shared by all workers; False if none is free."""
+    cache = frappe.cache()
+    key = cache.make_key(key)
+    pipeline = cache.pipeline()
+    pipeline.incr(key)
+    pipeline.expire(key, IN_FLIGHT_TTL)
+    if pipeline.execute()[0] <= limit:
+        return True
+    cache.decr(key)
+    return False
+
+
+def give_slot(key):
+    cache = frappe.cache()
+    cache.decr(cache.make_key(key))
+
+
+def release_slot(app_name):
+    if get_rate_config(app_name)[1] > 0:
+        give_slot(IN_FLIGHT_KEY.format(app_name))
+
+
+def acquire(app_name):
+    """
+    Take permission to send one request to an app, without ever waiting for it.
+
+    Returns None when the request may go out (call release() once it is done), or
+    the number of seconds the caller should defer it instead: the app asked us to
+    back off (429), all its in-flight slots are taken, or its rate limit has no
+    token left. Deferred documents go to the failed queue rather than keeping an
+    RQ worker asleep.
+    """
+    retry_after = get_retry_after(app_name)
+    if retry_after:
+        return retry_after
+
+    rate, max_in_flight = get_rate_config(app_name)
+    if max_in_flight > 0 and not take_slot(IN_FLIGHT_KEY.format(app_name), max_in_flight):
+        return 1
+
+    if rate > 0 and (wait := take_token(app_name, rate)) > 0:
+        release_slot(app_name)
+        return wait
+    return None
+
+
+def release(app_name):
+    release_slot(app_name)
+
+
+def parse_retry_after(resp):
+    """Seconds to back off from a 429 response: the Retry-After header (seconds or HTTP date), or the body's retry_after."""
+    value = (resp.headers.get("Retry-After") or "").strip()
+    if value.isdigit():
+        return int(value)
+    if value:
+        try:
+            return max(0, int(parsedate_to_datetime(value).timestamp() - time.time()))
+        except (TypeError, ValueError):
+            pass
+    try:
+        return cint(resp.json().get("retry_after")) or DEFAULT_RETRY_AFTER
+    except Exception:
+        return DEFAULT_RETRY_AFTER
+
+
+def set_retry_after(app_name, seconds):
+    """Hold back every push to an app for `seconds`."""
+    seconds = max(1, cint(seconds))
+    frappe.cache().set_value(RETRY_AFTER_KEY.format(app_name), time.time() + seconds, expires_in_sec=seconds)
+
+
+def get_retry_after(app_name):
+    """Seconds left before an app that answered 429 may be pushed to again, or 0."""
+    until = frappe.cache().get_value(RETRY_AFTER_KEY.format(app_name), expires=True)
+    return max(0, int(until - time.time())) if until else 0
+
+
+# --------------------------------------------------------
+# Receiver
+# --------------------------------------------------------
+
+@contextmanager
+def receiving():
+    """
+    Guard an incoming push with `Receive Max Concurrent`. Over the limit the
+    request fails with 429, a Retry-After header and a `retry_after` in the
+    response body, which senders honor (see parse_retry_after).
+    """
+    max_concurrent = cint(get_sync_settings().receive_max_concurrent)
+    if max_concurrent <= 0:
+        yield
+        return
+
+    if not take_slot(RECEIVING_KEY, max_concurrent):
+        frappe.local.response["retry_after"] = RECEIVE_RETRY_AFTER
+        # The header is what parse_retry_after (and any HTTP client) reads first
+        if (headers := getattr(frappe.local, "response_headers", None)) is not None:
+            headers["Retry-After"] = str(RECEIVE_RETRY_AFTER)
+        raise frappe.TooManyRequestsError("Too many sync pushes in progress, retry later")
+    try:
+        yield
+    finally:
+        give_slot(RECEIVING_KEY)
@@ -0,0 +1,195 @@
+import frappe
+from frappe.utils import add_to_date, cint, get_traceback, now_datetime
+from frappe.utils.password import decrypt, encrypt, get_decrypted_password, set_encrypted_password
+
+from mobility_sync.sync import metrics, sessions
+
+ACCESS_TOKEN_CACHE_KEY = "mobility_sync:access_token:{}"
+REFRESH_LOCK_KEY = "mobility_sync:token_refresh_lock:{}"
+
+# Refresh once this share of the token lifetime has elapsed
+REFRESH_AHEAD_RATIO = 0.8
+# Cache lifetime for tokens that do not expire
+NON_EXPIRING_TOKEN_TTL = 24 * 60 * 60
+
+
+# --------------------------------------------------------
+# Cache
+# --------------------------------------------------------
+
+def cache_access_token(app_name, access_token, expires_in, issued_at):
+    """Cache an app's access token (encrypted with the site key) along with its refresh/expiry times."""
+    expires_in = cint(expires_in)
+    entry = frappe._dict(
+        token=encrypt(access_token),
+        expires_at=add_to_date(issued_at, seconds=expires_in) if expires_in else None,
+        refresh_at=add_to_date(issued_at, seconds=int(expires_in * REFRESH_AHEAD_RATIO)) if expires_in else None,
+    )
+
+    ttl = NON_EXPIRING_TOKEN_TTL
+    if entry.expires_at:
+        ttl = int((entry.expires_at - now_datetime()).total_seconds())
+    if ttl > 0:
+        frappe.cache().set_value(ACCESS_TOKEN_CACHE_KEY.format(app_name), entry, expires_in_sec=ttl)
+    return entry
+
+
+def load_access_token(app_name):
+    """Read the latest Token Cache of a Connected App from the database and cache it."""
+    token_cache_list = frappe.get_all(
+        "Token Cache",
+        filters={"connected_app": app_name},
+        fields=["name", "expires_in", "modified"],
+        limit=1,
+        order_by="creation desc"
+    )
+    if not token_cache_list:
+        return None
+
+    row = token_cache_list[0]
+    access_token = get_decrypted_password("Token Cache", row.name, "access_token", raise_exception=False)
+    if not access_token:
+        return None
+
+    # `modified` moves with every refresh, `creation` does not
+    return cache_access_token(app_name, access_token, row.expires_in, row.modified)
+
+
+def get_cached_access_token(app_name):
+    return frappe.cache().get_value(ACCESS_TOKEN_CACHE_KEY.format(app_name), expires=True)
+
+
+def clear_access_token_cache(doc, method=None):
+    """doc_events hook: drop an app's cached token when its Token Cache changes outside this app."""
+    if doc.get("connected_app"):
+        frappe.cache().delete_value(ACCESS_TOKEN_CACHE_KEY.format(doc.connected_app))
+
+
+# --------------------------------------------------------
+# Access
+# --------------------------------------------------------
+
+def acquire_refresh_lock(app_name, timeout=120):
+    cache = frappe.cache()
+    return bool(cache.set(cache.make_key(REFRESH_LOCK_KEY.format(app_name)), 1, nx=True, ex=timeout))
+
+
+def release_refresh_lock(app_name):
+    frappe.cache().delete_value(REFRESH_LOCK_KEY.format(app_name))
+
+
+def get_oauth_tokens(app_name):
+    """
+    Return a valid access_token for a Connected App, from cache in the common case.
+
+    Once REFRESH_AHEAD_RATIO of its lifetime has passed, a single refresh job is
+    enqueued while the still-valid token keeps being used. An already expired
+    token is never refreshed inline, since the refresh commits and callers have
+    their own transaction open: the refresh job is enqueued and None is returned,
+    so the push fails and is retried later.
+    """
+    with metrics.timer("get_oauth_tokens", app=app_name):
+        return _get_oauth_tokens(app_name)
+
+
+def _get_oauth_tokens(app_name):
+    entry = get_cached_access_token(app_name) or load_access_token(app_name)
+    if not entry:
+        return None
+
+    now = now_datetime()
+    if entry.expires_at and now >= entry.expires_at:
+        enqueue_refresh(app_name)
+        return None
+
+    if entry.refresh_at and now >= entry.refresh_at:
+        enqueue_refresh(app_name)
+
+    return decrypt(entry.token)
+
+
+def enqueue_refresh(app_name):
+    """Enqueue a token refresh for an app unless one is already queued or running."""
+    if not acquire_refresh_lock(app_name):
+        return
+    frappe.enqueue(
+        "mobility_sync.sync.tokens.refresh_oauth_token",
+        connected_app_name=app_name,
+        queue="long",
+        job_id=f"refresh_oauth_token::{app_name}",
+        timeout=120
+    )
+
+
+def refresh_oauth_token(connected_app_name):
+    """Refresh OAuth token in a separate transaction to avoid locks. Runs as its own job (see enqueue_refresh)."""
+    try:
+        _refresh_oauth_token(connected_app_name)
+    finally:
+        release_refresh_lock(connected_app_name)
+
+
+def _refresh_oauth_token(connected_app_name):
+    retries = 3
+    while retries > 0:
+        try:
+            token_cache_list = frappe.get_all(
+                "Token Cache",
+                filters={"connected_app": connected_app_name},
+                fields=["name"],
+                limit=1,
+                order_by="creation desc"
+            )
+            if not token_cache_list:
+                return
+
+            token_doc = frappe.get_doc("Token Cache", token_cache_list[0].name)
+            refresh_token = token_doc.get_password("refresh_token", raise_exception=False)
+            if not refresh_token:
+                return
+
+            connected_app = frappe.get_doc("Connected App", connected_app_name)
+            refresh_url = connected_app.token_uri
+
+            resp = sessions.post(connected_app_name, refresh_url, data={
+                "grant_type": "refresh_token",
+                "refresh_token": refresh_token,
+                "client_id": connected_app.client_id,
+                "client_secret": connected_app.get_password("client_secret", raise_exception=False),
+            })
+
+            if resp.status_code != 200:
+                frappe.log_error(message = resp.text, title = "Token Refresh Failed")
+                return
+
+            tokens = resp.json()
+            issued_at = now_datetime()
+
+            # Token fields are Password fields: the real values live in __Auth.
+            # Update them without taking row locks on the Token Cache document.
+            frappe.db.begin()
+            set_encrypted_password("Token Cache", token_doc.name, tokens.get("access_token"), "access_token")
+            if tokens.get("refresh_token"):
+                set_encrypted_password("Token Cache", token_doc.name, tokens.get("refresh_token"), "refresh_token")
+            frappe.db.sql("""
+                UPDATE `tabToken Cache`
+                SET expires_in=COALESCE(%s, expires_in),
+                    modified=%s
+                WHERE name=%s
+            """, (tokens.get("expires_in"), issued_at, token_doc.name))
+            frappe.db.commit()
+
+            cache_access_token(
+                connected_app_name,
+                tokens.get("access_token"),
+                tokens.get("expires_in") or token_doc.expires_in,
+                issued_at
+            )
+            return
+
+        except Exception:
+            frappe.db.rollback()
+            retries -= 1
+            if retries == 0:
+                frappe.log_error(message = get_traceback(), title = "Token Refresh Failed After Retry")
+                return
@@ -0,0 +1,65 @@
+import frappe
+from frappe.utils import get_datetime, now_datetime
+
+DUPLICATE = "duplicate"
+STALE = "stale"
+
+
+def get_applied_versions(keys):
+    """Return {(doctype, name): {source_modified, change_id}} of the last change applied to each document, in one query."""
+    keys = list(dict.fromkeys(keys))
+    if not keys:
+        return {}
+
+    placeholders = ", ".join(["(%s, %s)"] * len(keys))
+    rows = frappe.db.sql(f"""
+        SELECT document_type, document_name, source_modified, change_id
+        FROM `tabMobility Sync Applied Version`
+        WHERE (document_type, document_name) IN ({placeholders})
+    """, tuple(value for key in keys for value in key), as_dict=True)
+    return {(row.document_type, row.document_name): row for row in rows}
+
+
+def check_version(applied, version, change_id):
+    """
+    Compare a pushed change with the last version applied to its document.
+
+    Returns DUPLICATE for the very same change again, STALE for a change older
+    than the applied one, or None if it should be applied. Changes without a
+    version (from senders predating version stamps) are always applied.
+    """
+    if not applied or not version:
+        return None
+
+    version = get_datetime(version)
+    if version < applied.source_modified:
+        return STALE
+    if version == applied.source_modified and change_id and change_id == applied.change_id:
+        return DUPLICATE
+    return None
+
+
+def record_applied_version(doctype, name, version, change_id):
+    """Upsert the last applied version of a document, within the current transaction."""
+    if not version:
+        return
+    now = now_datetime()
+    frappe.db.sql("""
+        INSERT INTO `tabMobility Sync Applied Version`
+            (name, creation, modified, owner, modified_by,
+             document_type, document_name, source_modified, change_id)
+        VALUES (%(name)s, %(now)s, %(now)s, %(user)s, %(user)s,
+             %(doctype)s, %(docname)s, %(version)s, %(change_id)s)
+        ON DUPLICATE KEY UPDATE
+            source_modified = VALUES(source_modified),
+            change_id = VALUES(change_id),
+            modified = VALUES(modified)
+    """, {
+        "name": frappe.generate_hash(length=10),
+        "now": now,
+        "user": frappe.session.user,
+        "doctype": doctype,
+        "docname": name,
+        "version": get_datetime(version),
+        "change_id": change_id,
+    })
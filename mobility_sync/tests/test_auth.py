@@ -0,0 +1,84 @@
+# Copyright (c) 2026, Ahmed Zaytoon and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import add_to_date, now_datetime
+
+from mobility_sync.sync.auth import (
+	clear_token_cache,
+	get_token_cache_key,
+	get_token_info,
+	revoke_token,
+	validate_bearer_token,
+)
+
+TOKEN = "mobility-sync-test-token"
+
+
+class TestBearerTokenCache(FrappeTestCase):
+	def tearDown(self):
+		frappe.cache().delete_value(get_token_cache_key(TOKEN))
+
+	def token_row(self, seconds):
+		return frappe._dict(
+			client="test-client",
+			user="Administrator",
+			scopes="all",
+			expiration_time=add_to_date(now_datetime(), seconds=seconds),
+			expires_in=None,
+			creation=now_datetime(),
+		)
+
+	def test_validated_token_is_served_from_cache(self):
+		with patch.object(frappe.db, "get_value", return_value=self.token_row(3600)) as get_value:
+			self.assertEqual(get_token_info(TOKEN).client, "test-client")
+			self.assertEqual(get_token_info(TOKEN).user, "Administrator")
+		get_value.assert_called_once()
+
+	def test_cache_key_never_holds_the_raw_token(self):
+		self.assertNotIn(TOKEN, get_token_cache_key(TOKEN))
+
+	def test_expired_token_is_neither_cached_nor_accepted(self):
+		with patch.object(frappe.db, "get_value", return_value=self.token_row(-60)):
+			self.assertIsNotNone(get_token_info(TOKEN))
+			self.assertIsNone(frappe.cache().get_value(get_token_cache_key(TOKEN)))
+
+			with patch.object(frappe, "get_request_header", return_value=f"Bearer {TOKEN}"):
+				self.assertRaises(frappe.PermissionError, validate_bearer_token)
+
+	def test_revoked_token_is_dropped_from_cache(self):
+		with patch.object(frappe.db, "get_value", return_value=self.token_row(3600)):
+			get_token_info(TOKEN)
+
+		clear_token_cache(frappe._dict(access_token=TOKEN))
+		with patch.object(frappe.db, "get_value", return_value=None):
+			self.assertIsNone(get_token_info(TOKEN))
+
+	def test_token_revoked_through_the_endpoint_is_dropped_from_cache(self):
+		with patch.object(frappe.db, "get_value", return_value=self.token_row(3600)):
+			get_token_info(TOKEN)
+
+		# Frappe revokes with frappe.db.set_value, which fires no doc_events
+		with (
+			patch("frappe.integrations.oauth2.revoke_token") as frappe_revoke_token,
+			patch.dict(frappe.form_dict, {"token": TOKEN}),
+			patch.object(frappe.db, "get_value", return_value=None),
+		):
+			revoke_token()
+			self.assertIsNone(get_token_info(TOKEN))
+		frappe_revoke_token.assert_called_once()
+
+	def test_revoking_a_refresh_token_drops_its_access_token(self):
+		with patch.object(frappe.db, "get_value", return_value=self.token_row(3600)):
+			get_token_info(TOKEN)
+
+		with (
+			patch("frappe.integrations.oauth2.revoke_token"),
+			patch.dict(frappe.form_dict, {"token": "mobility-sync-test-refresh-token"}),
+			patch.object(frappe.db, "get_value", return_value=TOKEN),
+		):
+			revoke_token()
+		self.assertIsNone(frappe.cache().get_value(get_token_cache_key(TOKEN)))
@@ -0,0 +1,45 @@
+# Copyright (c) 2026, Ahmed Zaytoon and Contributors
+# See license.txt
+
+import os
+import tempfile
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from mobility_sync.benchmarks.receiver import FakeReceiver
+from mobility_sync.benchmarks.runner import (
+	BENCHMARK_APP,
+	benchmark_site,
+	compare_with_baseline,
+	direct_push,
+	load_baseline,
+	measure,
+	save_baseline,
+)
+
+
+class TestBenchmarks(FrappeTestCase):
+	def test_direct_push_reaches_the_receiver(self):
+		with FakeReceiver() as receiver, benchmark_site(receiver.url):
+			report = measure("direct_push", direct_push, receiver, count=5, seed=1)
+			failed = frappe.db.count("Mobility Sync Failed Queue", {"app_name": BENCHMARK_APP})
+
+		self.assertEqual(report["events"], 5)
+		self.assertEqual(report["receiver"]["documents"], 5)
+		self.assertEqual(report["receiver"]["statuses"], {200: 5})
+		self.assertEqual(failed, 0)
+
+	def test_baseline_file_can_be_given_and_keeps_other_scenarios(self):
+		report = {"scenario": "small_docs", "docs_per_second": 100, "p99_ms": 10, "db_queries_per_doc": 5}
+		with tempfile.TemporaryDirectory() as directory:
+			path = os.path.join(directory, "baseline.json")
+			save_baseline([dict(report, scenario="direct_push")], path)
+			save_baseline([report], path)
+			baseline = load_baseline(path)
+
+		self.assertEqual(set(baseline), {"direct_push", "small_docs"})
+		self.assertEqual(compare_with_baseline(report, baseline), [])
+		self.assertEqual(
+			compare_with_baseline(dict(report, docs_per_second=50), baseline), ["docs/sec 100 -> 50"]
+		)
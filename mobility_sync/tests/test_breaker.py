@@ -0,0 +1,97 @@
+# Copyright (c) 2026, Ahmed Zaytoon and Contributors
+# See license.txt
+
+import time
+from unittest.mock import patch
+
+import frappe
+import requests
+from frappe.tests.utils import FrappeTestCase
+
+from mobility_sync.sync import breaker
+
+APP = "mobility-sync-test-app"
+
+
+class TestCircuitBreaker(FrappeTestCase):
+	def setUp(self):
+		app_settings = frappe._dict(app_name=APP, breaker_threshold=3, breaker_cooldown=60)
+		patcher = patch("mobility_sync.sync.breaker.get_app_settings", return_value=app_settings)
+		patcher.start()
+		self.addCleanup(patcher.stop)
+		breaker.reset_breaker(APP)
+
+	def tearDown(self):
+		breaker.reset_breaker(APP)
+		frappe.db.rollback()
+
+	def fail(self, times):
+		for _attempt in range(times):
+			breaker.record_failure(APP)
+
+	def end_cooldown(self):
+		# Raw HSET, like the breaker itself: RedisWrapper.hset would pickle the value
+		cache = frappe.cache()
+		pipeline = cache.pipeline()
+		pipeline.hset(cache.make_key(breaker.BREAKER_KEY.format(APP)), "opened_at", time.time() - 61)
+		pipeline.execute()
+
+	def test_opens_after_threshold_consecutive_failures(self):
+		self.fail(2)
+		self.assertEqual(breaker.get_breaker_state(APP).state, breaker.CLOSED)
+		self.assertTrue(breaker.allow_request(APP))
+
+		self.fail(1)
+		self.assertEqual(breaker.get_breaker_state(APP).state, breaker.OPEN)
+		self.assertFalse(breaker.allow_request(APP))
+
+	def test_success_resets_the_failure_count(self):
+		self.fail(2)
+		breaker.record_success(APP)
+		self.fail(2)
+		self.assertEqual(breaker.get_breaker_state(APP).failures, 2)
+		self.assertEqual(breaker.get_breaker_state(APP).state, breaker.CLOSED)
+
+	def test_half_open_admits_a_single_probe(self):
+		self.fail(3)
+		self.end_cooldown()
+		self.assertEqual(breaker.get_breaker_state(APP).state, breaker.HALF_OPEN)
+
+		self.assertTrue(breaker.allow_request(APP))
+		self.assertFalse(breaker.allow_request(APP))
+
+		# A probe that was never sent frees its slot for the next caller
+		breaker.release_probe(APP)
+		self.assertTrue(breaker.allow_request(APP))
+
+	def test_successful_probe_closes_the_circuit(self):
+		self.fail(3)
+		self.end_cooldown()
+		self.assertTrue(breaker.allow_request(APP))
+
+		breaker.record_success(APP)
+		state = breaker.get_breaker_state(APP)
+		self.assertEqual((state.state, state.failures), (breaker.CLOSED, 0))
+		self.assertTrue(breaker.allow_request(APP))
+
+	def test_failed_probe_reopens_the_circuit(self):
+		self.fail(3)
+		self.end_cooldown()
+		self.assertTrue(breaker.allow_request(APP))
+
+		self.fail(1)
+		state = breaker.get_breaker_state(APP)
+		self.assertEqual(state.state, breaker.OPEN)
+		self.assertGreater(state.retry_at, time.time() + 50)
+		self.assertFalse(breaker.allow_request(APP))
+
+	def test_only_unhealthy_responses_count_as_failures(self):
+		def response(status_code):
+			resp = requests.Response()
+			resp.status_code = status_code
+			return resp
+
+		self.assertTrue(breaker.is_remote_failure(requests.ConnectionError()))
+		self.assertTrue(breaker.is_remote_failure(response(503)))
+		self.assertFalse(breaker.is_remote_failure(response(429)))
+		self.assertFalse(breaker.is_remote_failure(response(417)))
@@ -0,0 +1,80 @@
+# Copyright (c) 2026, Ahmed Zaytoon and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from mobility_sync.sync import echo
+from mobility_sync.sync.handlers import prepare_batch
+
+APP = "mobility-sync-test-app"
+
+
+class TestEcho(FrappeTestCase):
+	def setUp(self):
+		patcher = patch.dict(frappe.local.conf, {"host_name": "https://Site-A.example.com"})
+		patcher.start()
+		self.addCleanup(patcher.stop)
+
+	def app_settings(self, app_name):
+		return frappe._dict(provider_url=f"https://{app_name}.example.com/")
+
+	def test_origins_are_lowercased_hosts(self):
+		self.assertEqual(
+			echo.normalize_origin("HTTPS://Site-B.example.com:8000/app"), "site-b.example.com:8000"
+		)
+		self.assertEqual(echo.normalize_origin("site-b.example.com"), "site-b.example.com")
+		self.assertEqual(echo.get_site_origin(), "site-a.example.com")
+
+	def test_change_that_passed_through_this_site_is_an_echo(self):
+		self.assertTrue(echo.is_echo(["site-b.example.com", "site-a.example.com"]))
+		self.assertFalse(echo.is_echo(["site-b.example.com"]))
+		self.assertFalse(echo.is_echo(None))
+
+	def test_change_is_not_sent_back_to_sites_it_came_through(self):
+		with patch("mobility_sync.sync.echo.get_app_settings", side_effect=self.app_settings):
+			apps = echo.filter_apps(["site-b", "site-c"], ["site-b.example.com", "site-a.example.com"])
+			self.assertEqual(apps, ["site-c"])
+			# A local change goes everywhere
+			self.assertEqual(echo.filter_apps(["site-b", "site-c"], None), ["site-b", "site-c"])
+
+	def test_retried_change_is_not_pushed_to_a_site_it_came_through(self):
+		envelope = {
+			"doctype": "ToDo",
+			"name": "echo-test",
+			"doc_method": "on_update",
+			"sync_path": ["site-b.example.com", "site-a.example.com"],
+		}
+		with (
+			patch("mobility_sync.sync.handlers.get_app_origin", return_value="site-b.example.com"),
+			patch("mobility_sync.sync.handlers.record_results") as record_results,
+			patch("mobility_sync.sync.handlers.can_send") as can_send,
+		):
+			envelopes, call = prepare_batch("site-b", [envelope])
+
+		self.assertEqual((envelopes, call), ([], None))
+		can_send.assert_not_called()
+		# Counted as delivered, as the app would skip it anyway
+		record_results.assert_called_once_with("site-b", [("ToDo", "echo-test", "on_update", True)])
+
+	def test_a_change_is_applied_once(self):
+		change_id = frappe.generate_hash(length=20)
+		self.addCleanup(echo.release_change, change_id)
+
+		self.assertTrue(echo.claim_change(change_id))
+		# A copy arriving over a second path
+		self.assertFalse(echo.claim_change(change_id))
+
+		# A failed apply is forgotten so its retry is not skipped
+		echo.release_change(change_id)
+		self.assertTrue(echo.claim_change(change_id))
+
+	def test_inbound_change_tags_only_its_own_document(self):
+		doc = frappe._dict(doctype="ToDo", name="echo-test")
+		with echo.inbound_change("ToDo", "echo-test", "change-1", ["site-b.example.com"]):
+			inbound = echo.get_inbound_change(doc)
+			self.assertEqual((inbound.change_id, inbound.sync_path), ("change-1", ["site-b.example.com"]))
+			self.assertIsNone(echo.get_inbound_change(frappe._dict(doctype="ToDo", name="other")))
+		self.assertIsNone(echo.get_inbound_change(doc))
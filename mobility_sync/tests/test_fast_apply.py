@@ -0,0 +1,71 @@
+# Copyright (c) 2026, Ahmed Zaytoon and Contributors
+# See license.txt
+
+from unittest.mock import MagicMock, patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from mobility_sync.sync.fast_apply import fast_apply_doc, run_post_apply_hooks
+
+NAME = "fast-apply-test"
+
+
+class TestFastApply(FrappeTestCase):
+	def tearDown(self):
+		frappe.flags.mobility_sync_fast_applied = None
+		frappe.db.rollback()
+
+	def get_emails(self):
+		return frappe.get_all(
+			"Contact Email",
+			filters={"parent": NAME, "parenttype": "Contact"},
+			pluck="email_id",
+			order_by="idx",
+		)
+
+	def test_upsert_keeps_the_senders_name_and_unsent_columns(self):
+		fast_apply_doc("ToDo", NAME, "after_insert", {"description": "first", "priority": "High"})
+		fast_apply_doc("ToDo", NAME, "on_update", {"description": "second"})
+
+		row = frappe.db.get_value("ToDo", NAME, ["description", "priority"], as_dict=True)
+		self.assertEqual((row.description, row.priority), ("second", "High"))
+
+	def test_child_rows_are_replaced_only_for_tables_sent(self):
+		fast_apply_doc(
+			"Contact",
+			NAME,
+			"after_insert",
+			{
+				"first_name": "Fast",
+				"email_ids": [{"email_id": "a@example.com"}, {"email_id": "b@example.com"}],
+			},
+		)
+		self.assertEqual(self.get_emails(), ["a@example.com", "b@example.com"])
+
+		fast_apply_doc("Contact", NAME, "on_update", {"first_name": "Faster"})
+		self.assertEqual(self.get_emails(), ["a@example.com", "b@example.com"])
+
+		fast_apply_doc("Contact", NAME, "on_update", {"email_ids": [{"email_id": "c@example.com"}]})
+		self.assertEqual(self.get_emails(), ["c@example.com"])
+
+	def test_trash_deletes_the_document_and_its_rows(self):
+		fast_apply_doc("Contact", NAME, "after_insert", {"email_ids": [{"email_id": "a@example.com"}]})
+		fast_apply_doc("Contact", NAME, "on_trash", {})
+
+		self.assertFalse(frappe.db.exists("Contact", NAME))
+		self.assertEqual(self.get_emails(), [])
+
+	def test_hook_runs_once_per_doctype_with_distinct_names(self):
+		hook = MagicMock()
+		fast_apply_doc("ToDo", NAME, "after_insert", {"description": "first"})
+		fast_apply_doc("ToDo", NAME, "on_update", {"description": "second"})
+
+		with (
+			patch("mobility_sync.sync.fast_apply.get_fast_apply_index", return_value={"ToDo": "test.hook"}),
+			patch.object(frappe, "get_attr", return_value=hook),
+		):
+			run_post_apply_hooks()
+			run_post_apply_hooks()
+
+		hook.assert_called_once_with("ToDo", [NAME])
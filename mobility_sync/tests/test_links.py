@@ -0,0 +1,111 @@
+# Copyright (c) 2026, Ahmed Zaytoon and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+import requests
+from frappe.tests.utils import FrappeTestCase
+
+from mobility_sync.sync.handlers import record_batch_response
+from mobility_sync.sync.links import find_missing_links, order_envelopes
+
+APP = "mobility-sync-test-app"
+
+
+def envelope(name, requires=None, doc_method="on_update"):
+	return {"doctype": "ToDo", "name": name, "doc_method": doc_method, "requires": requires or []}
+
+
+def names(envelopes):
+	return [envelope["name"] for envelope in envelopes]
+
+
+class TestOrderEnvelopes(FrappeTestCase):
+	def test_dependencies_come_first(self):
+		batch = [
+			envelope("child", [["ToDo", "parent"]]),
+			envelope("other"),
+			envelope("parent", [["ToDo", "root"]]),
+			envelope("root"),
+		]
+		self.assertEqual(names(order_envelopes(batch)), ["root", "parent", "child", "other"])
+
+	def test_order_is_kept_without_dependencies_in_the_batch(self):
+		batch = [envelope("b"), envelope("a", [["ToDo", "not-in-batch"]]), envelope("c")]
+		self.assertEqual(names(order_envelopes(batch)), ["b", "a", "c"])
+
+	def test_cycles_keep_every_envelope(self):
+		batch = [envelope("a", [["ToDo", "b"]]), envelope("b", [["ToDo", "a"]]), envelope("c")]
+		ordered = order_envelopes(batch)
+		self.assertEqual(sorted(names(ordered)), ["a", "b", "c"])
+		self.assertEqual(ordered[-1]["name"], "c")
+
+	def test_long_chains_do_not_recurse(self):
+		batch = [envelope(str(index), [["ToDo", str(index + 1)]]) for index in range(5000)]
+		self.assertEqual(names(order_envelopes(batch))[:2], ["4999", "4998"])
+
+
+class TestMissingLinks(FrappeTestCase):
+	def test_reports_only_links_that_do_not_exist(self):
+		data = {"allocated_to": "mobility-sync-nobody@example.com", "role": "System Manager"}
+		self.assertEqual(find_missing_links("ToDo", data), [["User", "mobility-sync-nobody@example.com"]])
+
+
+class TestMissingLinkRepair(FrappeTestCase):
+	def setUp(self):
+		for target, value in (("remember_accepted_encodings", None), ("get_enabled_apps", [APP])):
+			patcher = patch(f"mobility_sync.sync.handlers.{target}", return_value=value)
+			patcher.start()
+			self.addCleanup(patcher.stop)
+
+		patcher = patch(
+			"mobility_sync.sync.handlers.try_build_envelope",
+			side_effect=lambda row: envelope(row.document_name, doc_method=row.doc_method),
+		)
+		patcher.start()
+		self.addCleanup(patcher.stop)
+
+	def tearDown(self):
+		frappe.db.rollback()
+
+	def respond(self, batch, repair_rounds=1):
+		resp = requests.Response()
+		resp.status_code = 200
+		resp._content = frappe.as_json(
+			{
+				"message": {
+					"results": [
+						{"status": "missing_link", "missing": [["ToDo", "dependency"]]},
+						{"status": "success"},
+					]
+				}
+			}
+		).encode()
+		with patch("mobility_sync.sync.handlers.record_results") as record_results:
+			repair = record_batch_response(APP, batch, resp, repair_rounds)
+		return repair, record_results.call_args.args[1]
+
+	def test_missing_documents_are_sent_before_their_dependents(self):
+		batch = [envelope("dependent"), envelope("fine")]
+		repair, outcomes = self.respond(batch)
+
+		self.assertEqual(names(repair), ["dependency", "dependent"])
+		self.assertEqual(repair[0]["doc_method"], "backfill")
+		# Only the dependent waits for the repair batch
+		self.assertEqual(outcomes, [("ToDo", "fine", "on_update", True)])
+
+	def test_dependent_fails_when_the_missing_document_is_not_synced_from_here(self):
+		with patch("mobility_sync.sync.handlers.get_enabled_apps", return_value=()):
+			repair, outcomes = self.respond([envelope("dependent"), envelope("fine")])
+
+		self.assertIsNone(repair)
+		self.assertIn(("ToDo", "dependent", "on_update", False), outcomes)
+
+	def test_no_repair_after_the_last_round(self):
+		repair, outcomes = self.respond([envelope("dependent"), envelope("fine")], repair_rounds=0)
+
+		self.assertIsNone(repair)
+		self.assertEqual(
+			outcomes, [("ToDo", "dependent", "on_update", False), ("ToDo", "fine", "on_update", True)]
+		)
@@ -0,0 +1,78 @@
+# Copyright (c) 2026, Ahmed Zaytoon and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from mobility_sync.sync.mapping import EMPTY_PLAN, _compile_plan, apply_plan, map_document
+
+
+def rule(doctype, source, target=None, exclude=0):
+	return frappe._dict(
+		document_type=doctype, source_fieldname=source, target_fieldname=target, exclude=exclude
+	)
+
+
+RULES = {
+	"Contact": [rule("Contact", "first_name", "given_name"), rule("Contact", "middle_name", exclude=1)],
+	"Contact Email": [
+		rule("Contact Email", "email_id", "email"),
+		rule("Contact Email", "is_primary", exclude=1),
+	],
+}
+
+
+class TestMapping(FrappeTestCase):
+	def contact(self):
+		return {
+			"doctype": "Contact",
+			"name": "mapping-test",
+			"first_name": "Ada",
+			"middle_name": "King",
+			"last_name": "Lovelace",
+			"email_ids": [
+				{"doctype": "Contact Email", "email_id": "ada@example.com", "is_primary": 1, "idx": 1},
+				{"doctype": "Contact Email", "email_id": "ada@example.org", "is_primary": 0, "idx": 2},
+			],
+			"phone_nos": [{"doctype": "Contact Phone", "phone": "123", "idx": 1}],
+		}
+
+	def test_fields_are_renamed_and_dropped(self):
+		plan = _compile_plan("Contact", RULES)
+		data = apply_plan(self.contact(), plan)
+
+		self.assertEqual(data["given_name"], "Ada")
+		self.assertEqual(data["last_name"], "Lovelace")
+		self.assertNotIn("first_name", data)
+		self.assertNotIn("middle_name", data)
+
+	def test_child_table_rows_are_mapped_with_their_own_rules(self):
+		plan = _compile_plan("Contact", RULES)
+		# Only tables whose child doctype has rules are walked
+		self.assertEqual(list(plan["tables"]), ["email_ids"])
+
+		data = apply_plan(self.contact(), plan)
+		self.assertEqual(
+			data["email_ids"],
+			[
+				{"doctype": "Contact Email", "email": "ada@example.com", "idx": 1},
+				{"doctype": "Contact Email", "email": "ada@example.org", "idx": 2},
+			],
+		)
+		self.assertEqual(data["phone_nos"], self.contact()["phone_nos"])
+
+	def test_excluded_field_is_never_renamed(self):
+		rules = {"ToDo": [rule("ToDo", "description", "summary"), rule("ToDo", "description", exclude=1)]}
+		plan = _compile_plan("ToDo", rules)
+
+		self.assertEqual(plan["rename"], {})
+		self.assertEqual(apply_plan({"description": "x", "status": "Open"}, plan), {"status": "Open"})
+
+	def test_doctype_without_rules_is_sent_as_is(self):
+		self.assertIs(_compile_plan("ToDo", RULES), EMPTY_PLAN)
+
+		data = self.contact()
+		with patch("mobility_sync.sync.mapping.get_mapping_plan", return_value=EMPTY_PLAN):
+			self.assertIs(map_document(data), data)
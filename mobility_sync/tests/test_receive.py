@@ -0,0 +1,57 @@
+# Copyright (c) 2026, Ahmed Zaytoon and Contributors
+# See license.txt
+
+from contextlib import nullcontext
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from mobility_sync.sync.api import receive_docs
+from mobility_sync.sync.links import MissingLinkError
+
+
+def apply_change(doctype, name, doc_method, data, *args):
+	"""Stand-in for receive_change that writes a ToDo, then fails for the documents named so."""
+	frappe.get_doc({"doctype": "ToDo", "description": f"receive-test {name}"}).insert()
+	if name == "bad":
+		raise frappe.ValidationError("bad document")
+	if name == "orphan":
+		raise MissingLinkError([["User", "missing@example.com"]])
+	return "success"
+
+
+class TestReceiveDocs(FrappeTestCase):
+	def tearDown(self):
+		frappe.db.rollback()
+
+	def receive(self, names, chunk_size=None):
+		docs = [{"doctype": "ToDo", "name": name, "doc_method": "on_update", "data": {}} for name in names]
+		with (
+			patch("mobility_sync.sync.api.validate_bearer_token"),
+			patch("mobility_sync.sync.api.receiving", nullcontext),
+			patch("mobility_sync.sync.api.read_request_payload", return_value=None),
+			patch("mobility_sync.sync.api.receive_change", side_effect=apply_change),
+			patch("mobility_sync.sync.api.run_post_apply_hooks"),
+			patch.object(frappe.db, "commit"),
+			patch.object(frappe, "log_error"),
+		):
+			return receive_docs(docs, chunk_size)["results"]
+
+	def get_written(self):
+		return sorted(
+			frappe.get_all("ToDo", filters={"description": ("like", "receive-test %")}, pluck="description")
+		)
+
+	def test_bad_document_does_not_fail_the_rest_of_the_batch(self):
+		results = self.receive(["first", "bad", "orphan", "last"], chunk_size=2)
+
+		# One result per document, in the order they were sent
+		self.assertEqual([result["name"] for result in results], ["first", "bad", "orphan", "last"])
+		self.assertEqual(
+			[result["status"] for result in results], ["success", "failed", "missing_link", "success"]
+		)
+		self.assertEqual(results[1]["error"], "bad document")
+		self.assertEqual(results[2]["missing"], [["User", "missing@example.com"]])
+		# The failed documents' partial writes were rolled back, the others kept
+		self.assertEqual(self.get_written(), ["receive-test first", "receive-test last"])
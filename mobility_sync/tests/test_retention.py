@@ -0,0 +1,100 @@
+# Copyright (c) 2026, Ahmed Zaytoon and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import add_days, now_datetime
+
+from mobility_sync.sync.retention import apply_retention
+
+APP = "mobility-sync-retention-test-app"
+
+
+class TestRetention(FrappeTestCase):
+	def setUp(self):
+		settings = frappe._dict(
+			retention_batch_size=2,
+			resolved_retention_days=7,
+			failed_retention_days=30,
+			archive_retention_days=90,
+		)
+		for patcher in (
+			patch("mobility_sync.sync.retention.get_sync_settings", return_value=settings),
+			# Keep every chunk inside the test transaction
+			patch.object(frappe.db, "commit"),
+		):
+			patcher.start()
+			self.addCleanup(patcher.stop)
+
+	def tearDown(self):
+		frappe.db.rollback()
+
+	def add_row(self, name, days_ago, **values):
+		row = frappe.get_doc(
+			{
+				"doctype": "Mobility Sync Failed Queue",
+				"document_type": "ToDo",
+				"document_name": name,
+				"app_name": APP,
+				"doc_method": "on_update",
+				**values,
+			}
+		).insert(ignore_permissions=True)
+		frappe.db.sql(
+			"UPDATE `tabMobility Sync Failed Queue` SET modified = %s WHERE name = %s",
+			(add_days(now_datetime(), -days_ago), row.name),
+		)
+
+	def get_remaining(self):
+		return sorted(
+			frappe.get_all("Mobility Sync Failed Queue", filters={"app_name": APP}, pluck="document_name")
+		)
+
+	def test_only_old_closed_rows_are_removed(self):
+		# Open rows are kept however old they are
+		self.add_row("open", 365)
+		self.add_row("open-abandoned-age", 60, attempts=5)
+		# Closed but younger than their cutoff
+		self.add_row("recent-success", 1, sync_tried=1, retry_success=1)
+		self.add_row("recent-abandoned", 10, sync_tried=1)
+		# Closed and past their cutoff
+		for index in range(3):
+			self.add_row(f"old-success-{index}", 8, sync_tried=1, retry_success=1)
+		self.add_row("old-superseded", 8, sync_tried=1, superseded=1)
+		self.add_row("old-abandoned", 31, sync_tried=1, attempts=5)
+
+		apply_retention()
+
+		self.assertEqual(
+			self.get_remaining(), ["open", "open-abandoned-age", "recent-abandoned", "recent-success"]
+		)
+		archived = frappe.get_all(
+			"Mobility Sync Failed Archive", filters={"app_name": APP}, fields=["document_name", "attempts"]
+		)
+		self.assertEqual([(row.document_name, row.attempts) for row in archived], [("old-abandoned", 5)])
+
+		stats = frappe.get_all(
+			"Mobility Sync Daily Stats",
+			filters={"app_name": APP},
+			fields=[
+				"sum(succeeded) as succeeded",
+				"sum(superseded) as superseded",
+				"sum(abandoned) as abandoned",
+			],
+		)[0]
+		# Removed rows are still counted, across chunks of `Retention Batch Size`
+		self.assertEqual((stats.succeeded, stats.superseded, stats.abandoned), (3, 1, 1))
+
+	def test_zero_retention_days_keeps_everything(self):
+		self.add_row("old-success", 400, sync_tried=1, retry_success=1)
+		self.add_row("old-abandoned", 400, sync_tried=1)
+
+		with patch(
+			"mobility_sync.sync.retention.get_sync_settings",
+			return_value=frappe._dict(resolved_retention_days=0, failed_retention_days=0),
+		):
+			apply_retention()
+
+		self.assertEqual(self.get_remaining(), ["old-abandoned", "old-success"])
@@ -0,0 +1,111 @@
+# Copyright (c) 2026, Ahmed Zaytoon and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+import requests
+from frappe.tests.utils import FrappeTestCase
+from werkzeug.datastructures import Headers
+
+from mobility_sync.sync import throttle
+
+APP = "mobility-sync-test-app"
+
+
+class TestThrottle(FrappeTestCase):
+	def setUp(self):
+		self.app_settings = frappe._dict(app_name=APP, rate_limit=0, max_in_flight=0)
+		patcher = patch("mobility_sync.sync.throttle.get_app_settings", return_value=self.app_settings)
+		patcher.start()
+		self.addCleanup(patcher.stop)
+		self.clear_keys()
+
+	def tearDown(self):
+		self.clear_keys()
+
+	def clear_keys(self):
+		cache = frappe.cache()
+		for key in (
+			throttle.TOKEN_BUCKET_KEY.format(APP),
+			throttle.IN_FLIGHT_KEY.format(APP),
+			throttle.RETRY_AFTER_KEY.format(APP),
+			throttle.RECEIVING_KEY,
+		):
+			cache.delete_value(key)
+
+	def test_token_bucket_defers_instead_of_sleeping(self):
+		self.app_settings.rate_limit = 2
+
+		with patch("time.sleep") as sleep:
+			# A full bucket holds `rate` tokens
+			self.assertIsNone(throttle.acquire(APP))
+			self.assertIsNone(throttle.acquire(APP))
+
+			wait = throttle.acquire(APP)
+		sleep.assert_not_called()
+		self.assertGreater(wait, 0)
+		self.assertLessEqual(wait, 0.5)
+
+	def test_deferred_request_does_not_take_a_token(self):
+		self.app_settings.rate_limit = 1
+		self.assertIsNone(throttle.acquire(APP))
+
+		first = throttle.acquire(APP)
+		second = throttle.acquire(APP)
+		# Nothing was taken by the first refusal, so the wait does not grow
+		self.assertAlmostEqual(second, first, delta=0.1)
+
+	def test_in_flight_cap_counts_unreleased_requests(self):
+		self.app_settings.max_in_flight = 2
+		self.assertIsNone(throttle.acquire(APP))
+		self.assertIsNone(throttle.acquire(APP))
+		self.assertEqual(throttle.acquire(APP), 1)
+
+		throttle.release(APP)
+		self.assertIsNone(throttle.acquire(APP))
+
+	def test_rate_limited_request_gives_back_its_slot(self):
+		self.app_settings.update(rate_limit=1, max_in_flight=1)
+		self.assertIsNone(throttle.acquire(APP))
+		throttle.release(APP)
+
+		self.assertGreater(throttle.acquire(APP), 0)
+		# The refused request did not keep the only in-flight slot
+		self.app_settings.rate_limit = 0
+		self.assertIsNone(throttle.acquire(APP))
+
+	def test_429_holds_back_every_push(self):
+		throttle.set_retry_after(APP, 30)
+		self.assertGreaterEqual(throttle.acquire(APP), 29)
+
+	def test_retry_after_is_read_from_header_then_body(self):
+		def response(headers=None, body=None):
+			resp = requests.Response()
+			resp.status_code = 429
+			resp.headers.update(headers or {})
+			resp._content = frappe.as_json(body or {}).encode()
+			return resp
+
+		self.assertEqual(throttle.parse_retry_after(response({"Retry-After": "12"}, {"retry_after": 5})), 12)
+		self.assertEqual(throttle.parse_retry_after(response(body={"retry_after": 5})), 5)
+		self.assertEqual(throttle.parse_retry_after(response()), throttle.DEFAULT_RETRY_AFTER)
+
+	def test_receiver_over_its_limit_answers_429_with_retry_after(self):
+		settings = frappe._dict(receive_max_concurrent=1)
+		with (
+			patch("mobility_sync.sync.throttle.get_sync_settings", return_value=settings),
+			patch.object(frappe.local, "response", frappe._dict(), create=True),
+			patch.object(frappe.local, "response_headers", Headers(), create=True),
+		):
+			with throttle.receiving():
+				with self.assertRaises(frappe.TooManyRequestsError):
+					with throttle.receiving():
+						pass
+
+			self.assertEqual(frappe.local.response_headers["Retry-After"], str(throttle.RECEIVE_RETRY_AFTER))
+			self.assertEqual(frappe.local.response["retry_after"], throttle.RECEIVE_RETRY_AFTER)
+
+			# The slot is given back once the first push is done
+			with throttle.receiving():
+				pass
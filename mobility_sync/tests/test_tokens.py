@@ -0,0 +1,103 @@
+# Copyright (c) 2026, Ahmed Zaytoon and Contributors
+# See license.txt
+
+from unittest.mock import MagicMock, patch
+
+import frappe
+import requests
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import add_to_date, now_datetime
+from frappe.utils.password import decrypt
+
+from mobility_sync.sync import tokens
+
+APP = "mobility-sync-test-app"
+
+
+class TestOAuthTokens(FrappeTestCase):
+	def tearDown(self):
+		frappe.cache().delete_value(tokens.ACCESS_TOKEN_CACHE_KEY.format(APP))
+		tokens.release_refresh_lock(APP)
+
+	def issue(self, expires_in, seconds_ago=0):
+		return tokens.cache_access_token(
+			APP, "access-token", expires_in, add_to_date(now_datetime(), seconds=-seconds_ago)
+		)
+
+	def test_cached_token_is_used_without_the_database(self):
+		self.issue(3600)
+		with (
+			patch("mobility_sync.sync.tokens.load_access_token") as load_access_token,
+			patch("mobility_sync.sync.tokens.enqueue_refresh") as enqueue_refresh,
+		):
+			self.assertEqual(tokens.get_oauth_tokens(APP), "access-token")
+		load_access_token.assert_not_called()
+		enqueue_refresh.assert_not_called()
+
+	def test_token_near_expiry_is_refreshed_in_the_background(self):
+		self.issue(3600, seconds_ago=3000)
+		with patch("mobility_sync.sync.tokens.enqueue_refresh") as enqueue_refresh:
+			# Still valid, so it keeps being used meanwhile
+			self.assertEqual(tokens.get_oauth_tokens(APP), "access-token")
+		enqueue_refresh.assert_called_once_with(APP)
+
+	def test_expired_token_is_never_returned(self):
+		# Expired entries are not cached, so this one comes from the database
+		expired = self.issue(60, seconds_ago=120)
+		self.assertIsNone(tokens.get_cached_access_token(APP))
+
+		with (
+			patch("mobility_sync.sync.tokens.load_access_token", return_value=expired),
+			patch("mobility_sync.sync.tokens.enqueue_refresh") as enqueue_refresh,
+		):
+			self.assertIsNone(tokens.get_oauth_tokens(APP))
+		enqueue_refresh.assert_called_once_with(APP)
+
+	def test_only_one_refresh_is_queued_at_a_time(self):
+		with patch.object(frappe, "enqueue") as enqueue:
+			tokens.enqueue_refresh(APP)
+			tokens.enqueue_refresh(APP)
+		enqueue.assert_called_once()
+
+	def refresh(self, post):
+		token_doc = MagicMock(expires_in=3600)
+		token_doc.name = "token-cache"
+		token_doc.get_password.return_value = "refresh-token"
+		connected_app = MagicMock(token_uri="https://app.example.com/token", client_id="client")
+
+		with (
+			patch.object(frappe, "get_all", return_value=[frappe._dict(name="token-cache")]),
+			patch.object(
+				frappe,
+				"get_doc",
+				side_effect=lambda doctype, name: token_doc if doctype == "Token Cache" else connected_app,
+			),
+			patch("mobility_sync.sync.tokens.sessions.post", side_effect=post) as session_post,
+			patch("mobility_sync.sync.tokens.set_encrypted_password") as set_encrypted_password,
+			patch.object(frappe, "log_error") as log_error,
+			patch.object(frappe.db, "rollback"),
+		):
+			self.assertTrue(tokens.acquire_refresh_lock(APP))
+			tokens.refresh_oauth_token(APP)
+		return session_post, set_encrypted_password, log_error
+
+	def test_rejected_refresh_keeps_the_stored_token(self):
+		self.issue(3600, seconds_ago=3000)
+		resp = requests.Response()
+		resp.status_code = 401
+		resp._content = b'{"error": "invalid_grant"}'
+
+		_post, set_encrypted_password, log_error = self.refresh(lambda *args, **kwargs: resp)
+
+		set_encrypted_password.assert_not_called()
+		self.assertEqual(log_error.call_args.kwargs["title"], "Token Refresh Failed")
+		self.assertEqual(decrypt(tokens.get_cached_access_token(APP).token), "access-token")
+		# The next push may queue another refresh
+		self.assertTrue(tokens.acquire_refresh_lock(APP))
+
+	def test_refresh_that_keeps_raising_gives_up_after_retries(self):
+		session_post, _set_encrypted_password, log_error = self.refresh(requests.ConnectionError)
+
+		self.assertEqual(session_post.call_count, 3)
+		self.assertEqual(log_error.call_args.kwargs["title"], "Token Refresh Failed After Retry")
+		self.assertTrue(tokens.acquire_refresh_lock(APP))